@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import Comment, LikeDislike, Subscription
+from .models import Comment, CommentLike, LikeDislike, Subscription
 
 
 @admin.register(Comment)
@@ -10,6 +10,13 @@ class CommentAdmin(admin.ModelAdmin):
     search_fields = ("user__username", "video__title", "content")
 
 
+@admin.register(CommentLike)
+class CommentLikeAdmin(admin.ModelAdmin):
+    list_display = ("user", "comment", "timestamp")
+    list_filter = ("timestamp",)
+    search_fields = ("user__username", "comment__content")
+
+
 @admin.register(LikeDislike)
 class LikeDislikeAdmin(admin.ModelAdmin):
     list_display = ("user", "video", "type", "timestamp")
@@ -0,0 +1,141 @@
+"""留言頁快取：熱門影片的前幾頁頂層留言渲染一次，之後「載入更多」與影片頁都只讀快取。
+
+快取內容與觀看者無關：每則留言的「幾分鐘前」與讚/回覆控制項（需登入、含 CSRF token、
+是否已按讚）渲染時只留佔位，輸出前才依目前的請求代入（見 _apply_overlay）。
+每種排序（最新、熱門）的前 COMMENT_CACHE_PAGES 頁在同一個 cache entry 內，以各頁的 cursor 對應；
+更深的頁數、帶 exclude 的請求（通知深連結釘選）與舊 cursor 都直接查資料庫。
+
+留言新增、編輯、刪除與按讚時由 signal 刪除該影片的 entry；使用者改名不主動失效，
+最多落後 COMMENT_CACHE_TIMEOUT。
+"""
+
+import re
+from typing import NamedTuple
+
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef
+from django.template.loader import render_to_string
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+from django.utils.timesince import timesince
+
+from videos.pagination import KeysetPaginator
+
+from .models import Comment, CommentLike
+
+COMMENTS_PER_PAGE = 20
+COMMENT_CACHE_PAGES = 3
+COMMENT_CACHE_TIMEOUT = 60 * 5
+# 模板或 entry 格式變更時加一，舊版 entry 自然過期
+COMMENT_CACHE_VERSION = 2
+# 排序名稱 -> keyset 分頁欄位（熱門分數見 ranking.py）
+COMMENT_SORTS = {"newest": "timestamp", "top": "hot_score"}
+
+_PLACEHOLDER_RE = re.compile(r"<!--comment-(age|actions):(\d+)-->")
+# 回覆控制項每次請求只渲染一次，再以每則留言的 id 與作者代入
+_ID_TOKEN = "__comment_id__"
+_AUTHOR_TOKEN = "__comment_author__"
+
+
+class CommentPage(NamedTuple):
+    html: str
+    has_next: bool
+    next_cursor: str | None
+
+
+def comment_pages_cache_key(video_id, sort):
+    return f"interactions:comment_pages:v{COMMENT_CACHE_VERSION}:{sort}:{video_id}"
+
+
+def annotate_viewer_likes(queryset, user):
+    """標上 liked_by_viewer，未快取的渲染路徑用來顯示讚按鈕狀態。"""
+    if not user.is_authenticated:
+        return queryset
+    return queryset.annotate(liked_by_viewer=Exists(CommentLike.objects.filter(comment=OuterRef("pk"), user=user)))
+
+
+def _top_level_comments(video):
+    return Comment.objects.filter(video=video, parent_comment__isnull=True).select_related("user")
+
+
+def _paginator(comments, sort):
+    return KeysetPaginator(comments, COMMENTS_PER_PAGE, field=COMMENT_SORTS[sort])
+
+
+def _render(comments, video, request, placeholders=False):
+    context = {"comments": comments, "video": video, "request": request, "comment_placeholders": placeholders}
+    return render_to_string("interactions/_comment_list.html", context)
+
+
+def _build_entry(video, sort):
+    """渲染前 COMMENT_CACHE_PAGES 頁；第一頁以空字串為 key，之後每頁以前一頁的 next_cursor 為 key。"""
+    paginator = _paginator(_top_level_comments(video), sort)
+    pages, comments = {}, {}
+    cursor = None
+    for _ in range(COMMENT_CACHE_PAGES):
+        page = paginator.get_page(after=cursor)
+        pages[cursor or ""] = (
+            _render(page.object_list, video, None, placeholders=True),
+            page.has_next(),
+            page.next_cursor,
+        )
+        comments.update((comment.id, (comment.timestamp, comment.user.username)) for comment in page.object_list)
+        cursor = page.next_cursor
+        if not cursor:
+            break
+    return {"pages": pages, "comments": comments}
+
+
+def _apply_overlay(html, comments, video, request):
+    """代入與觀看者有關的部分：留言時間與（登入時的）讚/回覆控制項。
+
+    控制項依「已讚/未讚」各渲染一次；登入者已讚的留言以一次查詢取得。
+    """
+    actions, liked_ids = {False: "", True: ""}, set()
+    if request.user.is_authenticated:
+        for liked in actions:
+            sentinel = {"id": _ID_TOKEN, "user": {"username": _AUTHOR_TOKEN}, "liked_by_viewer": liked}
+            actions[liked] = render_to_string(
+                "interactions/_comment_actions.html", {"comment": sentinel, "video": video}, request=request
+            )
+        liked_ids = set(
+            CommentLike.objects.filter(user=request.user, comment_id__in=list(comments)).values_list(
+                "comment_id", flat=True
+            )
+        )
+
+    def replace(match):
+        kind, comment_id = match.group(1), int(match.group(2))
+        timestamp, username = comments[comment_id]
+        if kind == "age":
+            return escape(timesince(timestamp))
+        html = actions[comment_id in liked_ids]
+        return html.replace(_ID_TOKEN, str(comment_id)).replace(_AUTHOR_TOKEN, escape(username))
+
+    return _PLACEHOLDER_RE.sub(replace, html)
+
+
+def get_comment_page(video, request, after=None, exclude=None, sort="newest"):
+    """取得一頁頂層留言的 HTML（sort 為 COMMENT_SORTS 之一）；命中快取時不查留言也不渲染留言模板。"""
+    if exclude is None:
+        key = comment_pages_cache_key(video.id, sort)
+        entry = cache.get(key)
+        if entry is None:
+            entry = _build_entry(video, sort)
+            cache.set(key, entry, COMMENT_CACHE_TIMEOUT)
+        cached = entry["pages"].get(after or "")
+        if cached is not None:
+            html, has_next, next_cursor = cached
+            return CommentPage(
+                mark_safe(_apply_overlay(html, entry["comments"], video, request)), has_next, next_cursor
+            )
+
+    comments = annotate_viewer_likes(_top_level_comments(video), request.user)
+    if exclude is not None:
+        comments = comments.exclude(pk=exclude)
+    page = _paginator(comments, sort).get_page(after=after)
+    return CommentPage(mark_safe(_render(page.object_list, video, request)), page.has_next(), page.next_cursor)
+
+
+def invalidate_comment_pages(video_id):
+    cache.delete_many([comment_pages_cache_key(video_id, sort) for sort in COMMENT_SORTS])
@@ -1,12 +1,50 @@
 # 標準庫 imports
 import json
 import logging
+from urllib.parse import parse_qs
 
 # 第三方庫 imports
+import redis
+from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
 
+# 本地應用 imports
+from videos.pagination import KeysetPaginator, decode_cursor, encode_cursor
+
+from . import presence
+from .models import Notification, resume_notification_cursor
+from .unread import unread_count
+
 logger = logging.getLogger(__name__)
 
+# 重連時最多補送的通知數；落後更多時改請前端重新載入歷史通知
+REPLAY_LIMIT = 50
+
+
+def missed_notifications(user_id, since):
+    """比 since cursor 新的通知（由舊到新），超過 REPLAY_LIMIT 時回傳 None。
+
+    since 取自前端最後收到的通知（to_client_dict 的 cursor）；合併通知更新時 timestamp 會前移，
+    同一個 id 的新內容也會補送。起點往回重疊一段（見 resume_notification_cursor），
+    補上比 cursor 早 commit 晚的通知；沿 notif_recipient_ts_idx 只掃斷線期間的那一小段。
+    """
+    notifications = Notification.objects.filter(recipient_id=user_id).select_related("payload")
+    paginator = KeysetPaginator(notifications, REPLAY_LIMIT, field="timestamp")
+    page = paginator.get_page(before=resume_notification_cursor(since))
+    if page.has_previous():
+        return None
+    return [notification.to_client_dict() for notification in reversed(page)]
+
+
+def latest_notification_cursor(user_id):
+    latest = (
+        Notification.objects.filter(recipient_id=user_id)
+        .order_by("-timestamp", "-id")
+        .values_list("timestamp", "id")
+        .first()
+    )
+    return encode_cursor(*latest) if latest else None
+
 
 class NotificationConsumer(AsyncWebsocketConsumer):
     """WebSocket 消費者，處理即時通知功能。"""
@@ -19,34 +57,75 @@ class NotificationConsumer(AsyncWebsocketConsumer):
             await self.close()
             return
 
+        self.user_id = user.id
         self.room_group_name = f"user_{user.id}_notifications"
 
         await self.channel_layer.group_add(self.room_group_name, self.channel_name)
+        # 先登記在線再 accept：前端收到連線成功後發生的通知一定會推播過來
+        await self._mark_online()
         await self.accept()
         logger.info("User %s connected to notifications.", user.id)
+        # 已加入群組，斷線期間的通知補送完才會處理群組訊息；補送與即時推播重疊的部分前端依 id 去重
+        since = parse_qs(self.scope.get("query_string", b"").decode()).get("since", [None])[0]
+        if decode_cursor(since):
+            await self._replay_missed(since)
+        # 前端鈴鐺的未讀數只靠這裡與之後的推播，頁面載入不再查歷史通知；
+        # cursor 讓還沒收到任何通知的前端下次重連也有補送的起點
+        count = await database_sync_to_async(unread_count)(user.id)
+        cursor = await database_sync_to_async(latest_notification_cursor)(user.id)
+        await self.send(text_data=json.dumps({"unread_count": count, "cursor": cursor}))
+
+    async def _replay_missed(self, since):
+        """重連補送：送出斷線期間的通知；落後太多時只送 resync 與最新 cursor，由前端重新載入歷史。"""
+        missed = await database_sync_to_async(missed_notifications)(self.user_id, since)
+        if missed is None:
+            cursor = await database_sync_to_async(latest_notification_cursor)(self.user_id)
+            await self.send(text_data=json.dumps({"resync": True, "cursor": cursor}))
+            return
+        for notification in missed:
+            await self.send(text_data=json.dumps({"notification": notification, "replayed": True}))
 
     async def disconnect(self, close_code):
         """處理 WebSocket 斷線。"""
         # Leave room group
         if hasattr(self, "room_group_name"):
             await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
+            try:
+                await presence.mark_offline(self.user_id, self.channel_name)
+            except redis.RedisError:
+                logger.warning("移除使用者 %s 的在線狀態失敗", self.user_id, exc_info=True)
             logger.info("User disconnected from notifications: %s", self.room_group_name)
 
     async def receive(self, text_data):
         """
         接收來自 WebSocket 的訊息。
 
-        注意：通常通知是由伺服器主動發送，而不是接收來自客戶端的訊息。
+        通知由伺服器主動發送；前端只會送 heartbeat，用來延長在線狀態的 TTL（見 presence.py）。
         """
-        # text_data_json = json.loads(text_data)
-        # message = text_data_json['message']
-        # print(f"Received message: {message} from {self.room_group_name}")
-        pass
+        try:
+            message = json.loads(text_data)
+        except json.JSONDecodeError:
+            return
+        if isinstance(message, dict) and message.get("type") == "heartbeat":
+            await self._mark_online()
+
+    async def _mark_online(self):
+        try:
+            await presence.mark_online(self.user_id, self.channel_name)
+        except redis.RedisError:
+            logger.warning("更新使用者 %s 的在線狀態失敗", self.user_id, exc_info=True)
 
     async def send_notification(self, event):
         """接收來自房間群組的訊息並轉發給前端（通知已於來源端持久化，見 services.notify）。
 
         event["notification"] 與歷史通知 API 的單筆形狀一致（Notification.to_client_dict），
-        前端因此共用同一條渲染路徑。
+        前端因此共用同一條渲染路徑。附帶 unread_count 時為加入這則後的未讀數（見 unread.py）。
         """
-        await self.send(text_data=json.dumps({"notification": event["notification"]}))
+        message = {"notification": event["notification"]}
+        if "unread_count" in event:
+            message["unread_count"] = event["unread_count"]
+        await self.send(text_data=json.dumps(message))
+
+    async def send_unread_count(self, event):
+        """連線時與標記已讀後送出目前的未讀數。"""
+        await self.send(text_data=json.dumps({"unread_count": event["unread_count"]}))
@@ -0,0 +1,40 @@
+# Generated by Django 6.0.6 on 2026-10-19 04:38
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_reply_counts(apps, schema_editor):
+    """以單一 UPDATE ... SET reply_count = (SELECT COUNT(*) ...) 回填既有頂層留言的回覆數。"""
+    Comment = apps.get_model("interactions", "Comment")
+    replies = (
+        Comment.objects.filter(parent_comment=OuterRef("pk"))
+        .order_by()
+        .values("parent_comment")
+        .annotate(total=Count("pk"))
+        .values("total")
+    )
+    Comment.objects.filter(parent_comment__isnull=True).update(reply_count=Coalesce(Subquery(replies), 0))
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("interactions", "0011_alter_notification_message"),
+        ("videos", "0012_remove_video_trgm_indexes"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="comment",
+            name="reply_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name="comment",
+            index=models.Index(fields=["video", "parent_comment", "-timestamp"], name="comment_video_parent_ts_idx"),
+        ),
+        migrations.RunPython(backfill_reply_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 6.0.6 on 2026-10-19 04:44
+
+import math
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import ExpressionWrapper, F, FloatField, Func
+from django.db.models.functions import Ln
+
+
+def backfill_hot_scores(apps, schema_editor):
+    """既有留言（此時讚數皆為 0）依時間與回覆數算出初始分數。
+
+    公式為建立此 migration 當時的 interactions.ranking.hot_score_expression，凍結在這裡：
+    之後調整排序公式不會改變這個歷史 migration 的行為。
+    """
+    Comment = apps.get_model("interactions", "Comment")
+    epoch = Func(F("timestamp"), template="EXTRACT(EPOCH FROM %(expressions)s)", output_field=FloatField())
+    engagement = Ln(1 + F("like_count") + 2 * F("reply_count"))
+    Comment.objects.update(
+        hot_score=ExpressionWrapper(epoch + 60 * 60 * 12 / math.log(2) * engagement, output_field=FloatField())
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("interactions", "0012_comment_reply_count"),
+        ("videos", "0012_remove_video_trgm_indexes"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CommentLike",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("timestamp", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="comment",
+            name="hot_score",
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddField(
+            model_name="comment",
+            name="like_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        # 先回填再建索引，回填的 UPDATE 不必同時維護索引
+        migrations.RunPython(backfill_hot_scores, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="comment",
+            index=models.Index(fields=["video", "parent_comment", "-hot_score"], name="comment_video_parent_hot_idx"),
+        ),
+        migrations.AddField(
+            model_name="commentlike",
+            name="comment",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE, related_name="likes", to="interactions.comment"
+            ),
+        ),
+        migrations.AddField(
+            model_name="commentlike",
+            name="user",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE, related_name="comment_likes", to=settings.AUTH_USER_MODEL
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="commentlike",
+            constraint=models.UniqueConstraint(fields=("comment", "user"), name="unique_commentlike_per_comment_user"),
+        ),
+    ]
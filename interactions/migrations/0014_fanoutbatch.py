@@ -0,0 +1,37 @@
+# Generated by Django 6.0.6 on 2026-10-19 04:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("interactions", "0013_comment_like_hot_score"),
+        ("videos", "0012_remove_video_trgm_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FanoutBatch",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("first_subscriber_id", models.IntegerField()),
+                ("end_subscriber_id", models.IntegerField(blank=True, null=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("completed_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "video",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, related_name="fanout_batches", to="videos.video"
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("video", "first_subscriber_id"), name="unique_fanout_batch_per_video_range"
+                    )
+                ],
+            },
+        ),
+    ]
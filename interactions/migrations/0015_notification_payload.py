@@ -0,0 +1,48 @@
+# Generated by Django 6.0.6 on 2026-10-19 04:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("interactions", "0014_fanoutbatch"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="NotificationPayload",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("data", models.JSONField()),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name="notification",
+            name="message",
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="fanoutbatch",
+            name="payload",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                to="interactions.notificationpayload",
+            ),
+        ),
+        migrations.AddField(
+            model_name="notification",
+            name="payload",
+            field=models.ForeignKey(
+                blank=True,
+                db_index=False,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="notifications",
+                to="interactions.notificationpayload",
+            ),
+        ),
+    ]
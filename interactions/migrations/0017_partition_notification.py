@@ -0,0 +1,93 @@
+from django.db import migrations
+
+# 把 interactions_notification 轉成依 timestamp 每月分區的分區表（見 interactions/partitions.py）。
+# 模型 state 不變：分區表的主鍵必須包含分區鍵，資料庫中改為 (id, timestamp)，Django 端仍以 id 為主鍵。
+# 舊資料整表複製進新表後才建主鍵、索引與外鍵，索引與約束沿用原本的名稱。
+PARTITION_SQL = """
+ALTER TABLE interactions_notification RENAME TO interactions_notification_unpartitioned;
+
+CREATE TABLE interactions_notification (
+    LIKE interactions_notification_unpartitioned INCLUDING DEFAULTS INCLUDING CONSTRAINTS
+) PARTITION BY RANGE ("timestamp");
+
+-- 既有資料所在月份到本月起三個月（其後由 maintain_notification_partitions 每日補建）
+DO $$
+DECLARE
+    first_month timestamp := date_trunc('month', coalesce(
+        (SELECT min("timestamp") FROM interactions_notification_unpartitioned), now()) AT TIME ZONE 'UTC');
+    last_month timestamp := date_trunc('month', now() AT TIME ZONE 'UTC') + interval '3 months';
+    month timestamp;
+BEGIN
+    FOR month IN SELECT generate_series(first_month, last_month, interval '1 month') LOOP
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF interactions_notification FOR VALUES FROM (%L) TO (%L)',
+            'interactions_notification_p' || to_char(month, 'YYYY_MM'),
+            month AT TIME ZONE 'UTC',
+            (month + interval '1 month') AT TIME ZONE 'UTC'
+        );
+    END LOOP;
+END $$;
+
+CREATE TABLE interactions_notification_default PARTITION OF interactions_notification DEFAULT;
+
+INSERT INTO interactions_notification SELECT * FROM interactions_notification_unpartitioned;
+DROP TABLE interactions_notification_unpartitioned;
+
+ALTER TABLE interactions_notification ALTER COLUMN id ADD GENERATED BY DEFAULT AS IDENTITY;
+SELECT setval(pg_get_serial_sequence('interactions_notification', 'id'), coalesce(max(id), 0) + 1, false)
+FROM interactions_notification;
+
+ALTER TABLE interactions_notification
+    ADD CONSTRAINT interactions_notification_pkey PRIMARY KEY (id, "timestamp");
+CREATE INDEX interactions_notification_recipient_id_1336116d ON interactions_notification (recipient_id);
+CREATE INDEX interactions_notification_sender_id_a032e224 ON interactions_notification (sender_id);
+CREATE INDEX interactions_notification_is_read_7f846b58 ON interactions_notification (is_read);
+CREATE INDEX notif_recipient_ts_idx ON interactions_notification (recipient_id, "timestamp" DESC);
+ALTER TABLE interactions_notification
+    ADD CONSTRAINT interactions_notification_recipient_id_1336116d_fk_auth_user_id
+    FOREIGN KEY (recipient_id) REFERENCES auth_user (id) DEFERRABLE INITIALLY DEFERRED;
+ALTER TABLE interactions_notification
+    ADD CONSTRAINT interactions_notification_sender_id_a032e224_fk_auth_user_id
+    FOREIGN KEY (sender_id) REFERENCES auth_user (id) DEFERRABLE INITIALLY DEFERRED;
+ALTER TABLE interactions_notification
+    ADD CONSTRAINT interactions_notific_payload_id_d8c54ab2_fk_interacti
+    FOREIGN KEY (payload_id) REFERENCES interactions_notificationpayload (id) DEFERRABLE INITIALLY DEFERRED;
+"""
+
+UNPARTITION_SQL = """
+CREATE TABLE interactions_notification_unpartitioned (
+    LIKE interactions_notification INCLUDING DEFAULTS INCLUDING CONSTRAINTS
+);
+INSERT INTO interactions_notification_unpartitioned SELECT * FROM interactions_notification;
+DROP TABLE interactions_notification;
+ALTER TABLE interactions_notification_unpartitioned RENAME TO interactions_notification;
+
+ALTER TABLE interactions_notification ALTER COLUMN id ADD GENERATED BY DEFAULT AS IDENTITY;
+SELECT setval(pg_get_serial_sequence('interactions_notification', 'id'), coalesce(max(id), 0) + 1, false)
+FROM interactions_notification;
+
+ALTER TABLE interactions_notification ADD CONSTRAINT interactions_notification_pkey PRIMARY KEY (id);
+CREATE INDEX interactions_notification_recipient_id_1336116d ON interactions_notification (recipient_id);
+CREATE INDEX interactions_notification_sender_id_a032e224 ON interactions_notification (sender_id);
+CREATE INDEX interactions_notification_is_read_7f846b58 ON interactions_notification (is_read);
+CREATE INDEX notif_recipient_ts_idx ON interactions_notification (recipient_id, "timestamp" DESC);
+ALTER TABLE interactions_notification
+    ADD CONSTRAINT interactions_notification_recipient_id_1336116d_fk_auth_user_id
+    FOREIGN KEY (recipient_id) REFERENCES auth_user (id) DEFERRABLE INITIALLY DEFERRED;
+ALTER TABLE interactions_notification
+    ADD CONSTRAINT interactions_notification_sender_id_a032e224_fk_auth_user_id
+    FOREIGN KEY (sender_id) REFERENCES auth_user (id) DEFERRABLE INITIALLY DEFERRED;
+ALTER TABLE interactions_notification
+    ADD CONSTRAINT interactions_notific_payload_id_d8c54ab2_fk_interacti
+    FOREIGN KEY (payload_id) REFERENCES interactions_notificationpayload (id) DEFERRABLE INITIALLY DEFERRED;
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("interactions", "0016_notification_count"),
+    ]
+
+    operations = [
+        migrations.RunSQL(sql=PARTITION_SQL, reverse_sql=UNPARTITION_SQL),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 6.0.6 on 2026-10-19 05:17
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("interactions", "0017_partition_notification"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="notification",
+            name="is_read",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name="notification",
+            index=models.Index(
+                condition=models.Q(("is_read", False)),
+                fields=["recipient", "-timestamp"],
+                name="notif_recipient_unread_idx",
+            ),
+        ),
+    ]
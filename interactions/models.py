@@ -1,8 +1,17 @@
+# 標準庫 imports
+from datetime import timedelta
+
 # Django imports
 from django.contrib.auth.models import User
 from django.db import models
+from django.db.models import Q
 from django.utils import timezone
 
+# 本地應用 imports
+from videos.pagination import decode_cursor, encode_cursor
+
+from .ranking import initial_hot_score
+
 
 class Comment(models.Model):
     """
@@ -15,12 +24,46 @@ class Comment(models.Model):
     # max_length 只作用在驗證層（form/full_clean），PostgreSQL 欄位仍是 text
     content = models.TextField(max_length=5000)
     timestamp = models.DateTimeField(default=timezone.now, db_index=True)
+    # 頂層留言的回覆數，回覆新增/刪除時以 F() 原子增減（見 signals），列表不必每頁 COUNT 回覆
+    reply_count = models.PositiveIntegerField(default=0)
+    like_count = models.PositiveIntegerField(default=0)
+    # 「熱門留言」排序分數，讚/回覆數變動時與計數在同一個 UPDATE 重算（見 ranking.py）
+    hot_score = models.FloatField(default=0.0)
+
+    class Meta:
+        indexes = [
+            # 留言與回覆的 keyset 分頁：WHERE video_id = ... AND parent_comment_id IS NULL / = ...
+            # ORDER BY timestamp, id，任何深度的「載入更多」都沿索引往下掃
+            models.Index(fields=["video", "parent_comment", "-timestamp"], name="comment_video_parent_ts_idx"),
+            models.Index(fields=["video", "parent_comment", "-hot_score"], name="comment_video_parent_hot_idx"),
+        ]
 
     def __str__(self):
         if self.parent_comment:
             return f"Reply by {self.user.username} to {self.parent_comment.user.username} on {self.video.title}"
         return f"Comment by {self.user.username} on {self.video.title}"
 
+    def save(self, *args, **kwargs):
+        if self._state.adding and not self.hot_score:
+            self.hot_score = initial_hot_score(self.timestamp)
+        super().save(*args, **kwargs)
+
+
+class CommentLike(models.Model):
+    """
+    留言按讚，每位使用者對每則留言最多一次。
+    """
+
+    comment = models.ForeignKey(Comment, on_delete=models.CASCADE, related_name="likes")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="comment_likes")
+    timestamp = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=["comment", "user"], name="unique_commentlike_per_comment_user")]
+
+    def __str__(self):
+        return f"{self.user.username} likes comment {self.comment_id}"
+
 
 class LikeDislike(models.Model):
     """
@@ -68,6 +111,44 @@ class Subscription(models.Model):
         return f"{self.subscriber.username} subscribes to {self.subscribed_to.username}"
 
 
+class FanoutBatch(models.Model):
+    """
+    新影片通知 fan-out 的一段訂閱者範圍 [first_subscriber_id, end_subscriber_id)。
+
+    規劃時建立，處理該段的子任務在寫入通知的同一個 transaction 內標記 completed_at，
+    重試或重複投遞的子任務看到已完成就跳過，不會重複通知。
+    """
+
+    video = models.ForeignKey("videos.Video", on_delete=models.CASCADE, related_name="fanout_batches")
+    first_subscriber_id = models.IntegerField()
+    # 不含；最後一段為 None（到最大 id 為止）
+    end_subscriber_id = models.IntegerField(null=True, blank=True)
+    # 整次 fan-out 共用的通知內容，規劃時建立
+    payload = models.ForeignKey("NotificationPayload", null=True, blank=True, on_delete=models.CASCADE)
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["video", "first_subscriber_id"], name="unique_fanout_batch_per_video_range")
+        ]
+
+    def __str__(self):
+        return f"Fan-out of video {self.video_id} from subscriber {self.first_subscriber_id}"
+
+
+class NotificationPayload(models.Model):
+    """
+    多位收件者共用的通知內容：新影片 fan-out 只寫一份，每列通知以 FK 參照，不再各存一份 JSON。
+    """
+
+    data = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Notification payload {self.id}: {str(self.data)[:50]}"
+
+
 class Notification(models.Model):
     """
     通知模型，記錄系統發送給使用者的通知。
@@ -77,12 +158,25 @@ class Notification(models.Model):
     # Add a sender field. It can be null if the notification is system-generated
     # or doesn't have a specific sender.
     sender = models.ForeignKey(User, on_delete=models.CASCADE, related_name="sent_notifications", null=True, blank=True)
-    # 結構化通知 payload（dict）；早期純文字訊息已由 migration 轉成 JSON 字串
-    message = models.JSONField()
+    # 結構化通知 payload（dict）；早期純文字訊息已由 migration 轉成 JSON 字串。
+    # fan-out 通知不存這欄，改參照共用的 payload（見 message_data）
+    message = models.JSONField(null=True, blank=True)
+    # 不建索引：只依收件者查詢，fan-out 大量寫入時少維護一個索引
+    payload = models.ForeignKey(
+        NotificationPayload,
+        null=True,
+        blank=True,
+        on_delete=models.CASCADE,
+        related_name="notifications",
+        db_index=False,
+    )
     # Optional link to content
     link = models.URLField(max_length=200, blank=True, null=True)
-    is_read = models.BooleanField(default=False, db_index=True)
+    # 不單獨建索引：未讀查詢走 notif_recipient_unread_idx
+    is_read = models.BooleanField(default=False)
     timestamp = models.DateTimeField(default=timezone.now)
+    # 合併進這列的通知數（見 services.notify）；message 為其中最新一則
+    count = models.PositiveIntegerField(default=1)
 
     # Optional: Add a type for different kinds of notifications
     # NOTIFICATION_TYPES = (
@@ -100,18 +194,49 @@ class Notification(models.Model):
 
     class Meta:
         ordering = ["-timestamp"]
-        indexes = [models.Index(fields=["recipient", "-timestamp"], name="notif_recipient_ts_idx")]
+        indexes = [
+            models.Index(fields=["recipient", "-timestamp"], name="notif_recipient_ts_idx"),
+            # 部分索引只含未讀通知：未讀數重算與全部標記已讀只掃這些列，不隨已讀的歷史通知成長
+            models.Index(
+                fields=["recipient", "-timestamp"], condition=Q(is_read=False), name="notif_recipient_unread_idx"
+            ),
+        ]
 
     def __str__(self):
-        return f"Notification for {self.recipient.username}: {str(self.message)[:50]}"
+        return f"Notification for {self.recipient.username}: {str(self.message_data)[:50]}"
+
+    @property
+    def message_data(self):
+        """通知內容：共用 payload 優先，個別通知（留言、訂閱等）取自己的 message。"""
+        return self.payload.data if self.payload_id else self.message
 
     def to_client_dict(self):
         """歷史通知 API 與 WebSocket 推播共用的序列化形狀，讓前端只有一條渲染路徑。"""
         return {
             "id": self.id,
-            "message": self.message,
+            "message": self.message_data,
             "link": self.link,
             "is_read": self.is_read,
+            "count": self.count,
             # USE_TZ=True 下 timestamp 必為 aware UTC，isoformat 直接得到 +00:00 結尾
             "timestamp": self.timestamp.isoformat(),
+            # 歷史 API 的 since 與 WebSocket 重連補送都以此為起點（合併通知更新時會跟著前移，
+            # 實際查詢時會往回重疊一段，見 resume_notification_cursor）
+            "cursor": encode_cursor(self.timestamp, self.id),
         }
+
+
+# timestamp 在 commit 之前就決定（fan-out 的 COPY、合併通知的 UPDATE），時間較晚的列可能先 commit 被前端看到，
+# 較早的列稍後才 commit；續傳時往回重疊這段時間重掃，重複的通知由前端依 id 去重
+NOTIFICATION_CURSOR_OVERLAP = timedelta(seconds=30)
+
+
+def resume_notification_cursor(cursor):
+    """把前端最後收到的 cursor 往回推 NOTIFICATION_CURSOR_OVERLAP，作為 since 查詢與重連補送的起點。
+
+    cursor 不合法時回傳 None。
+    """
+    key = decode_cursor(cursor)
+    if key is None:
+        return None
+    return encode_cursor(key[0] - NOTIFICATION_CURSOR_OVERLAP, 0)
@@ -0,0 +1,144 @@
+"""Notification 依月份分區：PostgreSQL 原生 range partitioning，分區鍵為 timestamp（UTC 月份）。
+
+分區名稱為 interactions_notification_pYYYY_MM；還沒建立分區的月份落在 DEFAULT 分區。
+maintain_notification_partitions（beat 每日排程）預先建立未來 NOTIFICATION_PARTITIONS_AHEAD 個月的分區，
+並整個移除早於 NOTIFICATION_RETENTION_MONTHS 的分區：清除過期通知是 metadata 操作而不是大量 DELETE，
+每個分區的 notif_recipient_ts_idx 也維持小而常駐記憶體。通知移除後，同樣過期的 FanoutBatch 與
+不再被參照的 NotificationPayload 一併清除；被移除的未讀通知所屬使用者的未讀數計數器也會失效（見 unread.py）。
+
+資料表由 migration 0017 轉成分區表。分區表的唯一約束必須包含分區鍵，資料庫中的主鍵是 (id, timestamp)；
+Django 端仍以 id 為主鍵（id 由 identity 產生，本身仍然唯一）。
+"""
+
+import logging
+import re
+from datetime import UTC, datetime
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import FanoutBatch, Notification, NotificationPayload
+from .unread import invalidate_unread_counts
+
+logger = logging.getLogger(__name__)
+
+NOTIFICATION_RETENTION_MONTHS = 6
+NOTIFICATION_PARTITIONS_AHEAD = 3
+
+PARENT_TABLE = Notification._meta.db_table
+DEFAULT_PARTITION = f"{PARENT_TABLE}_default"
+_PARTITION_RE = re.compile(rf"^{PARENT_TABLE}_p(\d{{4}})_(\d{{2}})$")
+
+
+def month_start(moment):
+    return moment.astimezone(UTC).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(month, months):
+    years, index = divmod(month.month - 1 + months, 12)
+    return month.replace(year=month.year + years, month=index + 1)
+
+
+def partition_name(month):
+    return f"{PARENT_TABLE}_p{month:%Y_%m}"
+
+
+def existing_partitions():
+    """目前掛在 Notification 上的月份分區：{名稱: 月份起點}，不含 DEFAULT。"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = %s::regclass",
+            [PARENT_TABLE],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    partitions = {}
+    for name in names:
+        match = _PARTITION_RE.match(name)
+        if match:
+            partitions[name] = datetime(int(match.group(1)), int(match.group(2)), 1, tzinfo=UTC)
+    return partitions
+
+
+def create_partition(month):
+    """建立 month 的分區：先建成一般資料表、搬入 DEFAULT 中屬於該月的列，再 ATTACH。
+
+    ATTACH 只對父表取 SHARE UPDATE EXCLUSIVE 鎖，不像 CREATE TABLE ... PARTITION OF 會擋住讀寫；
+    DEFAULT 若還留有該月的列，ATTACH 會失敗，所以要先搬走。搬移前先鎖住 DEFAULT（擋寫入、不擋讀取），
+    避免搬完到 ATTACH 之間又有該月的列寫進 DEFAULT；只鎖 DEFAULT，寫入其他月份不受影響。
+    """
+    quote = connection.ops.quote_name
+    name, end = partition_name(month), add_months(month, 1)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE TABLE {quote(name)} (LIKE {quote(PARENT_TABLE)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+        )
+        cursor.execute(f"LOCK TABLE {quote(DEFAULT_PARTITION)} IN SHARE ROW EXCLUSIVE MODE")
+        cursor.execute(
+            f"WITH moved AS (DELETE FROM {quote(DEFAULT_PARTITION)} "
+            f'WHERE "timestamp" >= %s AND "timestamp" < %s RETURNING *) '
+            f"INSERT INTO {quote(name)} SELECT * FROM moved",
+            [month, end],
+        )
+        cursor.execute(
+            f"ALTER TABLE {quote(PARENT_TABLE)} ATTACH PARTITION {quote(name)} FOR VALUES FROM (%s) TO (%s)",
+            [month, end],
+        )
+    return name
+
+
+def ensure_notification_partitions(now=None):
+    """建立本月起 NOTIFICATION_PARTITIONS_AHEAD 個月內缺少的分區，回傳新建的分區名稱。"""
+    current = month_start(now or timezone.now())
+    existing = existing_partitions()
+    months = [add_months(current, offset) for offset in range(NOTIFICATION_PARTITIONS_AHEAD + 1)]
+    return [create_partition(month) for month in months if partition_name(month) not in existing]
+
+
+def drop_expired_notification_partitions(now=None):
+    """移除整個月份都早於保留期限的分區，並清掉 DEFAULT 中過期的列與其他過期資料；回傳移除的分區名稱。"""
+    quote = connection.ops.quote_name
+    cutoff = add_months(month_start(now or timezone.now()), -NOTIFICATION_RETENTION_MONTHS)
+    dropped, unread_recipients = [], set()
+    for name, month in sorted(existing_partitions().items(), key=lambda item: item[1]):
+        if add_months(month, 1) > cutoff:
+            continue
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f"ALTER TABLE {quote(PARENT_TABLE)} DETACH PARTITION {quote(name)}")
+            # 分區已脫離父表、不會再有寫入；走分區上的未讀部分索引
+            cursor.execute(f"SELECT DISTINCT recipient_id FROM {quote(name)} WHERE NOT is_read")
+            unread_recipients.update(row[0] for row in cursor.fetchall())
+            cursor.execute(f"DROP TABLE {quote(name)}")
+        dropped.append(name)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {quote(DEFAULT_PARTITION)} WHERE "timestamp" < %s RETURNING recipient_id, is_read', [cutoff]
+        )
+        rows = cursor.fetchall()
+    if rows:
+        logger.info("已從 DEFAULT 分區清除 %s 則過期通知", len(rows))
+    unread_recipients.update(recipient_id for recipient_id, is_read in rows if not is_read)
+    # 計數器在移除之後才失效：移除前重算的值含有已刪除的通知
+    invalidate_unread_counts(unread_recipients)
+    prune_expired_fanout_data(cutoff)
+    return dropped
+
+
+def prune_expired_fanout_data(cutoff):
+    """清除 cutoff 之前建立的 FanoutBatch，以及 cutoff 之前建立、已沒有 FanoutBatch 參照的 NotificationPayload。
+
+    fan-out 通知在 payload 建立後就寫入，早於 cutoff 的 payload 所參照的通知已隨分區移除。
+    不走 QuerySet.delete()：它會為 CASCADE 逐一查詢參照的通知，而 Notification.payload 沒有索引。
+    """
+    batches, _ = FanoutBatch.objects.filter(created_at__lt=cutoff).delete()
+    payload_table = connection.ops.quote_name(NotificationPayload._meta.db_table)
+    batch_table = connection.ops.quote_name(FanoutBatch._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {payload_table} p WHERE p.created_at < %s "
+            f"AND NOT EXISTS (SELECT 1 FROM {batch_table} b WHERE b.payload_id = p.id)",
+            [cutoff],
+        )
+        payloads = cursor.rowcount
+    if batches or payloads:
+        logger.info("已清除 %s 個過期 fan-out 段落與 %s 份通知內容", batches, payloads)
@@ -0,0 +1,58 @@
+"""在線狀態：記錄哪些使用者目前有開著的通知 WebSocket，推播只送給在線的人。
+
+每位使用者一個 Redis set（presence:user:<id>），成員是該使用者各個連線的 channel name；
+consumer 連線時加入、斷線時移除，前端每 PRESENCE_HEARTBEAT_INTERVAL 送一次 heartbeat
+延長 key 的 TTL。process 當掉沒跑到 disconnect 的連線，最多 PRESENCE_TTL 後隨 key 過期。
+
+離線使用者不推播，登入後由歷史通知 API 取得已持久化的 Notification。
+Redis 不可用時視為全部在線（寧可多推，不漏推）。
+"""
+
+import logging
+
+import redis
+
+from youtube_service.redis_client import get_async_redis, get_redis
+
+logger = logging.getLogger(__name__)
+
+# 前端 heartbeat 間隔（static/js/notifications.js 需一致）；TTL 容許漏掉兩次 heartbeat
+PRESENCE_HEARTBEAT_INTERVAL = 30
+PRESENCE_TTL = PRESENCE_HEARTBEAT_INTERVAL * 3
+
+
+def presence_key(user_id):
+    return f"presence:user:{user_id}"
+
+
+async def mark_online(user_id, channel_name):
+    """連線或 heartbeat：加入（或重新加入已過期的）連線並延長 TTL。"""
+    key = presence_key(user_id)
+    async with get_async_redis().pipeline(transaction=False) as pipe:
+        pipe.sadd(key, channel_name)
+        pipe.expire(key, PRESENCE_TTL)
+        await pipe.execute()
+
+
+async def mark_offline(user_id, channel_name):
+    await get_async_redis().srem(presence_key(user_id), channel_name)
+
+
+def online_user_ids(user_ids):
+    """回傳 user_ids 中在線的子集合；一次 pipeline 查完整批。"""
+    user_ids = list(user_ids)
+    if not user_ids:
+        return set()
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        for user_id in user_ids:
+            pipe.exists(presence_key(user_id))
+        flags = pipe.execute()
+    except redis.RedisError:
+        logger.warning("讀取在線狀態失敗，改為推播給所有人", exc_info=True)
+        return set(user_ids)
+    return {user_id for user_id, online in zip(user_ids, flags, strict=True) if online}
+
+
+def is_online(user_id):
+    return user_id in online_user_ids([user_id])
@@ -0,0 +1,33 @@
+"""留言熱門排序：分數在互動發生時就地更新並存在有索引的欄位，排序分頁是單純的索引掃描。
+
+分數 = 留言時間（epoch 秒）+ HOT_SCORE_DOUBLING_SECONDS × log2(1 + 讚數 + REPLY_WEIGHT × 回覆數)。
+時間項讓新留言自然排在前面，互動每翻倍相當於晚發 HOT_SCORE_DOUBLING_SECONDS；
+分數不隨「現在」改變，不需要週期性重算，只有讚/回覆數變動的那一列需要更新。
+"""
+
+import math
+
+from django.db.models import ExpressionWrapper, F, FloatField, Func
+from django.db.models.functions import Ln
+
+HOT_SCORE_DOUBLING_SECONDS = 60 * 60 * 12
+# 回覆比按讚更能代表討論熱度
+REPLY_WEIGHT = 2
+
+
+def initial_hot_score(timestamp):
+    """還沒有任何互動的留言：分數只有時間項。"""
+    return timestamp.timestamp()
+
+
+def hot_score_expression(like_count=None, reply_count=None):
+    """在 UPDATE 中重算分數的 SQL 表達式。
+
+    同一個 UPDATE 內 F() 讀到的是更新前的值，遞增讚/回覆數時要傳入遞增後的表達式，
+    例如 hot_score_expression(like_count=F("like_count") + 1)；未傳入時取欄位目前的值。
+    """
+    like_count = F("like_count") if like_count is None else like_count
+    reply_count = F("reply_count") if reply_count is None else reply_count
+    epoch = Func(F("timestamp"), template="EXTRACT(EPOCH FROM %(expressions)s)", output_field=FloatField())
+    engagement = Ln(1 + like_count + REPLY_WEIGHT * reply_count)
+    return ExpressionWrapper(epoch + HOT_SCORE_DOUBLING_SECONDS / math.log(2) * engagement, output_field=FloatField())
@@ -1,6 +1,74 @@
+# 標準庫 imports
+import logging
+
+# 第三方庫 imports
+import redis
+
+# Django imports
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
 # 本地應用 imports
+from youtube_service.redis_client import get_redis
+
 from .models import Notification
-from .tasks import send_channel_notification
+from .presence import is_online
+from .tasks import notification_message, push_coalesced_notification, send_channel_notification
+from .unread import adjust_unread_count, unread_count
+
+logger = logging.getLogger(__name__)
+
+# 合併視窗：同一收件者、同一對象的同類通知在視窗內併成一列，並最多再推播一次更新
+NOTIFY_COALESCE_WINDOW = 60 * 10
+# 類型 -> 合併對象（payload 中的欄位，None 表示同類全部合併）；不在表中的類型逐則通知
+COALESCE_GROUPS = {
+    "new_comment_on_video": "video_id",
+    "new_reply": "parent_comment_id",
+    "new_subscription": None,
+}
+
+
+def coalesce_key(recipient_id, payload):
+    """合併視窗的 Redis key（值為視窗內那一列通知的 id）；不合併的類型回傳 None。"""
+    notification_type = payload.get("type")
+    if notification_type not in COALESCE_GROUPS:
+        return None
+    field = COALESCE_GROUPS[notification_type]
+    target = payload.get(field) if field else ""
+    return f"notify:coalesce:{recipient_id}:{notification_type}:{target}"
+
+
+def _coalesce(key, recipient_id, payload, sender):
+    """併入視窗內已存在的通知列；回傳 True 表示已處理，False 表示要另建新列。
+
+    每個視窗的第一則由呼叫端建立並立即推播；之後的通知只就地更新那一列（計數加一、內容換成最新一則、
+    重新標為未讀），更新後的狀態在視窗結束時由 push_coalesced_notification 推播一次。
+    """
+    conn = get_redis()
+    if conn.set(key, "", nx=True, ex=NOTIFY_COALESCE_WINDOW):
+        return False
+    notification_id = conn.get(key)
+    if not notification_id:
+        # 視窗剛開、第一列還沒寫回 id（或 key 剛好過期）
+        return False
+    fields = {
+        "count": F("count") + 1,
+        "message": payload,
+        "sender": sender,
+        "link": payload.get("url"),
+        "timestamp": timezone.now(),
+    }
+    if Notification.objects.filter(id=notification_id, is_read=True).update(is_read=False, **fields):
+        # 已讀的那一列重新變成未讀；commit 後才加，rollback 不會讓計數偏高
+        transaction.on_commit(lambda: adjust_unread_count(recipient_id, 1))
+    elif not Notification.objects.filter(id=notification_id).update(**fields):
+        # 第一列已刪除或其 transaction 已 rollback
+        return False
+    remaining = conn.ttl(key)
+    if remaining > 0 and conn.set(f"{key}:flush", "", nx=True, ex=remaining):
+        push_coalesced_notification.apply_async(args=[int(notification_id)], countdown=remaining)
+    return True
 
 
 def notify(recipient, payload, *, sender=None):
@@ -8,18 +76,50 @@ def notify(recipient, payload, *, sender=None):
 
     message 欄位直接存 payload（jsonb，前端通知面板渲染用），link 取 payload 的 url；
     推播內容與歷史通知 API 同形狀（to_client_dict），前端共用同一條渲染路徑。
+    收件者不在線時不推播（見 presence.py），上線後由歷史通知 API 取得。
+    未讀數計數器加一（見 unread.py）與推播都在呼叫端的 transaction commit 之後，rollback 時不會發生。
+
+    COALESCE_GROUPS 中的類型在 NOTIFY_COALESCE_WINDOW 內併成一列（「X 有 42 則新留言」），
+    熱門頻道的通知列數與推播量不再隨互動數線性成長；此時回傳 None。Redis 不可用時逐則通知。
     """
     if not recipient.is_active:
         return None
 
+    key = coalesce_key(recipient.id, payload)
+    if key is not None:
+        try:
+            if _coalesce(key, recipient.id, payload, sender):
+                return None
+        except redis.RedisError:
+            logger.warning("通知合併失敗，改為逐則通知", exc_info=True)
+            key = None
+
     notification = Notification.objects.create(
         recipient=recipient,
         sender=sender,
         message=payload,
         link=payload.get("url"),
     )
-    send_channel_notification.delay(
-        f"user_{recipient.id}_notifications",
-        {"type": "send_notification", "notification": notification.to_client_dict()},
-    )
+    if key is not None:
+        try:
+            get_redis().set(key, notification.id, xx=True, keepttl=True)
+        except redis.RedisError:
+            logger.warning("寫入通知合併視窗失敗", exc_info=True)
+    transaction.on_commit(lambda: _count_and_push(notification))
     return notification
+
+
+def _count_and_push(notification):
+    unread = adjust_unread_count(notification.recipient_id, 1)
+    if is_online(notification.recipient_id):
+        send_channel_notification.delay(
+            f"user_{notification.recipient_id}_notifications", notification_message(notification, unread)
+        )
+
+
+def push_unread_count(user_id):
+    """把目前的未讀數推播給使用者開著的每個分頁（標記已讀後同步其他分頁的鈴鐺）。"""
+    if is_online(user_id):
+        send_channel_notification.delay(
+            f"user_{user_id}_notifications", {"type": "send_unread_count", "unread_count": unread_count(user_id)}
+        )
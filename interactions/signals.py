@@ -1,13 +1,19 @@
 # 標準庫 imports
 import logging
 
+# 第三方庫 imports
+import redis
+
 # Django imports
-from django.db.models.signals import post_save
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from django.urls import reverse
 
 # 本地應用 imports
-from .models import Comment
+from .comment_pages import invalidate_comment_pages
+from .models import Comment, CommentLike, LikeDislike, Subscription
+from .ranking import hot_score_expression
 from .services import notify
 
 logger = logging.getLogger(__name__)
@@ -64,3 +70,94 @@ def new_comment_or_reply_handler(sender, instance, created, **kwargs):
             },
             sender=instance.user,
         )
+
+
+@receiver(post_save, sender=Comment)
+def increment_reply_count(sender, instance, created, **kwargs):
+    if created and instance.parent_comment_id:
+        reply_count = F("reply_count") + 1
+        Comment.objects.filter(pk=instance.parent_comment_id).update(
+            reply_count=reply_count, hot_score=hot_score_expression(reply_count=reply_count)
+        )
+
+
+@receiver(post_delete, sender=Comment)
+def decrement_reply_count(sender, instance, **kwargs):
+    """頂層留言連同回覆一起刪除時，UPDATE 對象已不存在，影響 0 列。"""
+    if instance.parent_comment_id:
+        reply_count = F("reply_count") - 1
+        Comment.objects.filter(pk=instance.parent_comment_id, reply_count__gt=0).update(
+            reply_count=reply_count, hot_score=hot_score_expression(reply_count=reply_count)
+        )
+
+
+@receiver(post_save, sender=CommentLike)
+def increment_like_count(sender, instance, created, **kwargs):
+    if created:
+        like_count = F("like_count") + 1
+        Comment.objects.filter(pk=instance.comment_id).update(
+            like_count=like_count, hot_score=hot_score_expression(like_count=like_count)
+        )
+
+
+@receiver(post_delete, sender=CommentLike)
+def decrement_like_count(sender, instance, **kwargs):
+    like_count = F("like_count") - 1
+    Comment.objects.filter(pk=instance.comment_id, like_count__gt=0).update(
+        like_count=like_count, hot_score=hot_score_expression(like_count=like_count)
+    )
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_pages_on_change(sender, instance, **kwargs):
+    """留言新增/編輯/刪除（含回覆數變動）後丟棄該影片的留言頁快取；須在回覆數更新之後執行。"""
+    invalidate_comment_pages(instance.video_id)
+
+
+@receiver(post_save, sender=CommentLike)
+@receiver(post_delete, sender=CommentLike)
+def invalidate_comment_pages_on_like(sender, instance, **kwargs):
+    """讚數顯示在快取的留言頁上，熱門排序也跟著變；留言連同讚被刪除時由留言本身的 signal 處理。"""
+    video_id = Comment.objects.filter(pk=instance.comment_id).values_list("video_id", flat=True).first()
+    if video_id is not None:
+        invalidate_comment_pages(video_id)
+
+
+@receiver(post_save, sender=Comment)
+def record_comment_for_trending(sender, instance, created, **kwargs):
+    from videos.trending import record_event  # 函式內 import，避免跨 app 的模組層級循環相依
+
+    if created:
+        record_event(instance.video_id, "comment")
+
+
+@receiver(post_save, sender=LikeDislike)
+def record_vote_for_trending(sender, instance, created, **kwargs):
+    """讚計入熱度；vote_video 唯一的更新路徑是讚/踩互換，故「更新成踩」代表原本的讚被收回。"""
+    from videos.trending import record_event
+
+    if instance.type == LikeDislike.LIKE:
+        record_event(instance.video_id, "like")
+    elif not created:
+        record_event(instance.video_id, "unlike")
+
+
+@receiver(post_delete, sender=LikeDislike)
+def record_unvote_for_trending(sender, instance, **kwargs):
+    from videos.trending import record_event
+
+    if instance.type == LikeDislike.LIKE:
+        record_event(instance.video_id, "unlike")
+
+
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def invalidate_timeline_on_subscription_change(sender, instance, **kwargs):
+    """訂閱清單變了，訂閱頁 timeline 整份重建（新訂閱頻道的既有影片也要出現）。"""
+    from videos.feeds import invalidate_timeline  # 函式內 import，避免跨 app 的模組層級循環相依
+
+    try:
+        invalidate_timeline(instance.subscriber_id)
+    except redis.RedisError:
+        logger.exception("刪除使用者 %s 的 timeline 失敗", instance.subscriber_id)
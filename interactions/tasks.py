@@ -1,22 +1,30 @@
 # 標準庫 imports
+import asyncio
 import logging
 from itertools import batched
 
 # 第三方庫 imports
+import redis
 from asgiref.sync import async_to_sync
-from celery import shared_task
+from celery import group, shared_task
 from channels.layers import get_channel_layer
 
 # Django imports
+from django.db import DatabaseError, connection, transaction
 from django.urls import reverse
+from django.utils import timezone
 
 # 本地應用 imports
-from .models import Notification, Subscription
+from .models import FanoutBatch, Notification, NotificationPayload, Subscription
+from .presence import online_user_ids
+from .unread import adjust_unread_counts, unread_count
 
 logger = logging.getLogger(__name__)
 
-# 每批持久化與推播的訂閱者數量
+# fan-out 每段（一個子任務）的訂閱者數量，也是每次 COPY 與推播的批量
 NOTIFY_BATCH_SIZE = 500
+# 一批推播內同時進行的 group_send 上限；每個 send 都要從 channel layer 的連線池取一條 Redis 連線
+PUSH_CONCURRENCY = 50
 
 
 @shared_task
@@ -29,47 +37,189 @@ def send_channel_notification(group_name, message_content):
         logger.exception("Failed to send notification to group %s", group_name)
 
 
-@shared_task
-def notify_subscribers_of_new_video(video_id):
-    """新影片發布的訂閱者通知 fan-out：分批 bulk_create 持久化後，逐一推播給在線使用者。"""
-    from videos.models import Video  # 函式內 import，避免跨 app 的模組層級循環相依
+def notification_message(notification, unread=None):
+    """推播給 consumer 的 group 訊息；unread 為加入這則後的未讀數，未知時省略，由前端自行加一。"""
+    message = {"type": "send_notification", "notification": notification.to_client_dict()}
+    if unread is not None:
+        message["unread_count"] = unread
+    return message
 
-    try:
-        video = Video.objects.select_related("uploader").get(id=video_id)
-    except Video.DoesNotExist:
-        logger.error("新影片通知失敗：找不到影片 ID %s", video_id)
-        return
 
-    if video.visibility != "public":
+@shared_task
+def push_coalesced_notification(notification_id):
+    """合併視窗結束時推播合併後的通知（見 services.notify）；收件者不在線或通知已刪除時略過。"""
+    notification = Notification.objects.filter(id=notification_id).first()
+    if notification is None or notification.recipient_id not in online_user_ids([notification.recipient_id]):
         return
+    send_channel_notification(
+        f"user_{notification.recipient_id}_notifications",
+        notification_message(notification, unread_count(notification.recipient_id)),
+    )
 
-    video_url = reverse("videos:video_detail", kwargs={"video_id": video.id})
-    payload = {
+
+@shared_task
+def maintain_notification_partitions():
+    """建立未來月份的 Notification 分區並移除過期分區（由 CELERY_BEAT_SCHEDULE 每日排程，見 partitions.py）。"""
+    from .partitions import drop_expired_notification_partitions, ensure_notification_partitions
+
+    created = ensure_notification_partitions()
+    dropped = drop_expired_notification_partitions()
+    if created or dropped:
+        logger.info("通知分區維護完成：新建 %s，移除 %s", created, dropped)
+    return {"created": created, "dropped": dropped}
+
+
+async def _group_send_all(channel_layer, messages):
+    """在同一個 event loop 內並行推播 [(group, message), ...]；回傳與 messages 對齊的結果，失敗的位置為例外。"""
+    semaphore = asyncio.Semaphore(PUSH_CONCURRENCY)
+
+    async def send(group_name, message):
+        async with semaphore:
+            await channel_layer.group_send(group_name, message)
+
+    return await asyncio.gather(
+        *(send(group_name, message) for group_name, message in messages), return_exceptions=True
+    )
+
+
+def _active_subscriber_ids(uploader):
+    return (
+        Subscription.objects.filter(subscribed_to=uploader, subscriber__is_active=True)
+        .order_by("subscriber_id")
+        .values_list("subscriber_id", flat=True)
+    )
+
+
+def _new_video_payload(video):
+    return {
         "type": "new_video",
         "video_title": video.title,
         "video_id": video.id,
         "uploader_name": video.uploader.username,
         "uploader_id": video.uploader.id,
         "thumbnail_url": video.thumbnail.url if video.thumbnail else None,
-        "url": video_url,
+        "url": reverse("videos:video_detail", kwargs={"video_id": video.id}),
     }
-    channel_layer = get_channel_layer()
 
-    subscriber_ids = (
-        Subscription.objects.filter(subscribed_to=video.uploader, subscriber__is_active=True)
-        .values_list("subscriber_id", flat=True)
-        .iterator(chunk_size=NOTIFY_BATCH_SIZE)
-    )
-    for batch in batched(subscriber_ids, NOTIFY_BATCH_SIZE, strict=False):
-        notifications = Notification.objects.bulk_create(
-            Notification(recipient_id=subscriber_id, sender=video.uploader, message=payload, link=video_url)
-            for subscriber_id in batch
-        )
-        for notification in notifications:
-            try:
-                async_to_sync(channel_layer.group_send)(
-                    f"user_{notification.recipient_id}_notifications",
-                    {"type": "send_notification", "notification": notification.to_client_dict()},
+
+def _copy_notifications(recipient_ids, sender_id, payload_id, link):
+    """以 COPY 寫入參照同一 payload 的通知列；省去 INSERT 的逐列參數綁定與 RETURNING。
+
+    須在 transaction 內呼叫；不回傳 id，需要通知物件時另外查詢。
+    COPY 不會套用 Django 端的欄位預設值，新增非 null 欄位時要一併列在這裡。
+    """
+    table = connection.ops.quote_name(Notification._meta.db_table)
+    timestamp = timezone.now()
+    with connection.cursor() as cursor:
+        with cursor.copy(
+            f"COPY {table} (recipient_id, sender_id, payload_id, link, is_read, timestamp, count) FROM STDIN"
+        ) as copy:
+            for recipient_id in recipient_ids:
+                copy.write_row((recipient_id, sender_id, payload_id, link, False, timestamp, 1))
+
+
+@shared_task
+def notify_subscribers_of_new_video(video_id):
+    """新影片發布的訂閱者 fan-out 協調任務：把訂閱者依 id 切成每段 NOTIFY_BATCH_SIZE 人，
+    以 Celery group 分派給 notify_subscriber_range 並行處理。
+
+    切分結果存成 FanoutBatch；本任務重跑（acks_late 重新投遞）時沿用已存的切分，
+    只重新分派尚未完成的段落，訂閱者增減不會讓段落錯位而重複通知。
+    通知內容只存一份 NotificationPayload，由各段共用。
+    """
+    from videos.models import Video  # 函式內 import，避免跨 app 的模組層級循環相依
+
+    with transaction.atomic():
+        # 鎖住影片列，同一部影片的協調任務不會同時規劃
+        video = Video.objects.select_for_update().filter(id=video_id).first()
+        if video is None:
+            logger.error("新影片通知失敗：找不到影片 ID %s", video_id)
+            return
+        if video.visibility != "public":
+            return
+
+        batches = list(FanoutBatch.objects.filter(video=video).order_by("first_subscriber_id"))
+        if not batches:
+            subscriber_ids = _active_subscriber_ids(video.uploader_id).iterator(chunk_size=NOTIFY_BATCH_SIZE)
+            starts = [batch[0] for batch in batched(subscriber_ids, NOTIFY_BATCH_SIZE, strict=False)]
+            if starts:
+                payload = NotificationPayload.objects.create(data=_new_video_payload(video))
+                batches = FanoutBatch.objects.bulk_create(
+                    FanoutBatch(video=video, first_subscriber_id=start, end_subscriber_id=end, payload=payload)
+                    for start, end in zip(starts, [*starts[1:], None], strict=True)
                 )
-            except Exception:
-                logger.exception("推播新影片通知給使用者 %s 失敗", notification.recipient_id)
+
+    pending = [batch.id for batch in batches if batch.completed_at is None]
+    if pending:
+        group(notify_subscriber_range.s(batch_id) for batch_id in pending).apply_async()
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=30)
+def notify_subscriber_range(self, batch_id):
+    """處理一段訂閱者：持久化通知並寫入 timeline，再推播給在線使用者。
+
+    通知以 COPY 寫入、參照協調任務建立的共用 payload，
+    並與 FanoutBatch.completed_at 在同一個 transaction 寫入：搶到標記的任務才寫入，
+    重試或重複投遞的任務看到已完成直接跳過。推播在 commit 之後、只送給在線使用者（見 presence.py），
+    以 _group_send_all 在一個 event loop 內並行；失敗只影響即時性，補看走已持久化的通知。
+    """
+    from videos import feeds  # 函式內 import，避免跨 app 的模組層級循環相依
+
+    batch = FanoutBatch.objects.select_related("video__uploader__profile", "payload").filter(id=batch_id).first()
+    if batch is None or batch.completed_at is not None:
+        return
+    video = batch.video
+    if video.visibility != "public":
+        return
+
+    video_url = reverse("videos:video_detail", kwargs={"video_id": video.id})
+    subscriber_ids = _active_subscriber_ids(video.uploader_id).filter(subscriber_id__gte=batch.first_subscriber_id)
+    if batch.end_subscriber_id is not None:
+        subscriber_ids = subscriber_ids.filter(subscriber_id__lt=batch.end_subscriber_id)
+
+    try:
+        with transaction.atomic():
+            # 條件式 UPDATE 兼作鎖：同一段的另一個任務會等到這裡 commit/rollback 才知道有沒有搶到
+            claimed = FanoutBatch.objects.filter(id=batch.id, completed_at__isnull=True).update(
+                completed_at=timezone.now()
+            )
+            if not claimed:
+                return
+            payload = batch.payload
+            if payload is None:
+                # 加上 payload 之前規劃的段落
+                payload = NotificationPayload.objects.create(data=_new_video_payload(video))
+            recipient_ids = list(subscriber_ids)
+            _copy_notifications(recipient_ids, video.uploader_id, payload.id, video_url)
+    except DatabaseError as exc:
+        raise self.retry(exc=exc) from exc
+
+    # 大頻道不寫入訂閱者 timeline，訂閱頁讀取時再拉（見 videos.feeds.TimelinePaginator）
+    profile = getattr(video.uploader, "profile", None)
+    if profile is None or profile.subscriber_count < feeds.TIMELINE_PULL_THRESHOLD:
+        try:
+            feeds.push_to_timelines(video, recipient_ids)
+        except redis.RedisError:
+            logger.exception("寫入影片 %s 的訂閱者 timeline 失敗", video.id)
+
+    unread = adjust_unread_counts(recipient_ids, 1)
+    online = online_user_ids(recipient_ids)
+    if not online:
+        return
+    # COPY 不回傳 id，只為要推播的人查回通知（客戶端以 id 標記已讀）
+    notifications = list(Notification.objects.filter(payload=payload, recipient_id__in=online))
+    for notification in notifications:
+        notification.payload = payload
+    results = async_to_sync(_group_send_all)(
+        get_channel_layer(),
+        [
+            (
+                f"user_{notification.recipient_id}_notifications",
+                notification_message(notification, unread[notification.recipient_id]),
+            )
+            for notification in notifications
+        ],
+    )
+    for notification, result in zip(notifications, results, strict=True):
+        if isinstance(result, Exception):
+            logger.error("推播新影片通知給使用者 %s 失敗", notification.recipient_id, exc_info=result)
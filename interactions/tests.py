@@ -1,29 +1,55 @@
+import asyncio
 import json
+import math
 from datetime import timedelta
 from unittest.mock import AsyncMock, MagicMock, patch
 
+import redis
 from channels.layers import get_channel_layer
 from channels.routing import URLRouter
 from channels.testing import WebsocketCommunicator
 from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
 from django.db.utils import IntegrityError
 from django.test import TestCase, TransactionTestCase, override_settings
 from django.urls import reverse
 from django.utils import timezone
 
 from videos.models import Video
+from videos.tests.base import eager_celery_tasks
+from youtube_service.redis_client import get_redis
 
 from .forms import CommentForm
-from .models import Comment, LikeDislike, Notification, Subscription
+from .models import Comment, CommentLike, FanoutBatch, LikeDislike, Notification, NotificationPayload, Subscription
+from .partitions import (
+    DEFAULT_PARTITION,
+    NOTIFICATION_PARTITIONS_AHEAD,
+    NOTIFICATION_RETENTION_MONTHS,
+    drop_expired_notification_partitions,
+    ensure_notification_partitions,
+    month_start,
+    partition_name,
+)
+from .presence import PRESENCE_TTL, presence_key
+from .ranking import HOT_SCORE_DOUBLING_SECONDS
 from .routing import websocket_urlpatterns
-from .tasks import notify_subscribers_of_new_video
+from .services import notify
+from .tasks import notify_subscriber_range, notify_subscribers_of_new_video, push_coalesced_notification
+from .unread import adjust_unread_count, unread_count, unread_key
 
 TEST_PASSWORD = "password123"
 TEST_VIDEO_CONTENT = b"video content"
 TEST_VIDEO_CONTENT_TYPE = "video/mp4"
 
 
+def mark_online(user):
+    """模擬使用者開著通知 WebSocket（見 presence.py）。"""
+    get_redis().sadd(presence_key(user.id), "test-channel")
+    get_redis().expire(presence_key(user.id), PRESENCE_TTL)
+
+
 class CommentModelTests(TestCase):
     """Test cases for Comment model functionality."""
 
@@ -451,6 +477,7 @@ class ToggleSubscriptionViewTests(TestCase):
         self.channel_owner = User.objects.create_user(username="channel_owner_interactions", password=TEST_PASSWORD)
         self.channel_owner_profile = self.channel_owner.profile
         self.client.login(username="subscriber_interactions", password=TEST_PASSWORD)
+        mark_online(self.channel_owner)
 
     def _post_toggle_subscription_ajax(self, user_to_subscribe_id):
         return self.client.post(
@@ -512,8 +539,9 @@ class ToggleSubscriptionViewTests(TestCase):
 
     @patch("interactions.services.send_channel_notification.delay")
     def test_subscribe_persists_notification_and_pushes(self, mock_delay):
-        """訂閱後應先持久化 Notification，再排程 WebSocket 推播（persist-then-push）。"""
-        response = self._post_toggle_subscription_ajax(self.channel_owner.id)
+        """訂閱後應先持久化 Notification，commit 後再排程 WebSocket 推播（persist-then-push）。"""
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self._post_toggle_subscription_ajax(self.channel_owner.id)
 
         self.assertEqual(response.status_code, 200)
         json_response = json.loads(response.content)
@@ -555,6 +583,9 @@ class SignalHandlerTests(TestCase):
         self.subscriber = User.objects.create_user(username="subscriber_sig", password=TEST_PASSWORD)
         self.commenter = User.objects.create_user(username="commenter_sig", password=TEST_PASSWORD)
         Subscription.objects.create(subscriber=self.subscriber, subscribed_to=self.uploader)
+        # 合併視窗存在 Redis，不隨測試資料庫 rollback
+        get_redis().flushdb()
+        mark_online(self.uploader)
 
     def _create_video(self, title, visibility="public"):
         dummy_file = SimpleUploadedFile(f"{title}.mp4", TEST_VIDEO_CONTENT, TEST_VIDEO_CONTENT_TYPE)
@@ -570,7 +601,8 @@ class SignalHandlerTests(TestCase):
     @patch("interactions.services.send_channel_notification.delay")
     def test_comment_persists_notification_for_uploader(self, mock_send):
         video = self._create_video("Video for Comment")
-        comment = Comment.objects.create(video=video, user=self.commenter, content="Nice video!")
+        with self.captureOnCommitCallbacks(execute=True):
+            comment = Comment.objects.create(video=video, user=self.commenter, content="Nice video!")
 
         notification = Notification.objects.get(recipient=self.uploader)
         self.assertEqual(notification.sender, self.commenter)
@@ -584,7 +616,8 @@ class SignalHandlerTests(TestCase):
     def test_reply_persists_notification_for_parent_author(self, mock_send):
         video = self._create_video("Video for Reply")
         parent = Comment.objects.create(video=video, user=self.uploader, content="Original comment")
-        reply = Comment.objects.create(video=video, user=self.commenter, content="Reply!", parent_comment=parent)
+        with self.captureOnCommitCallbacks(execute=True):
+            reply = Comment.objects.create(video=video, user=self.commenter, content="Reply!", parent_comment=parent)
 
         notification = Notification.objects.get(recipient=self.uploader)
         self.assertEqual(notification.link, f"/videos/{video.id}/?comment={parent.id}#comment-{reply.id}")
@@ -593,6 +626,15 @@ class SignalHandlerTests(TestCase):
         self.assertEqual(payload["parent_comment_id"], parent.id)
         mock_send.assert_called_once()
 
+    @patch("interactions.services.send_channel_notification.delay")
+    def test_offline_recipient_is_not_pushed(self, mock_send):
+        """收件者不在線：通知照樣持久化，但不排程推播。"""
+        get_redis().delete(presence_key(self.uploader.id))
+        video = self._create_video("Video for Offline Uploader")
+        Comment.objects.create(video=video, user=self.commenter, content="Hello?")
+        self.assertTrue(Notification.objects.filter(recipient=self.uploader).exists())
+        mock_send.assert_not_called()
+
     @patch("interactions.services.send_channel_notification.delay")
     def test_own_comment_does_not_notify(self, mock_send):
         """上傳者在自己影片留言不應通知自己。"""
@@ -601,6 +643,45 @@ class SignalHandlerTests(TestCase):
         mock_send.assert_not_called()
         self.assertEqual(Notification.objects.count(), 0)
 
+    @patch("interactions.services.push_coalesced_notification.apply_async")
+    @patch("interactions.services.send_channel_notification.delay")
+    def test_comments_within_window_coalesce(self, mock_send, mock_flush):
+        """視窗內同一部影片的留言併成一列：第一則立即推播，其餘在視窗結束時推播一次更新。"""
+        video = self._create_video("Busy Video")
+        others = [User.objects.create_user(username=f"busy_fan_{i}", password=TEST_PASSWORD) for i in range(2)]
+        quiet = self._create_video("Quiet Video")
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(video=video, user=self.commenter, content="First!")
+            Notification.objects.filter(recipient=self.uploader).update(is_read=True)
+            for user in others:
+                Comment.objects.create(video=video, user=user, content=f"From {user.username}")
+            Comment.objects.create(video=quiet, user=self.commenter, content="Hi")
+
+        notification = Notification.objects.get(recipient=self.uploader, message__video_id=video.id)
+        self.assertEqual(notification.count, 3)
+        self.assertFalse(notification.is_read)
+        self.assertEqual(notification.sender, others[-1])
+        self.assertEqual(notification.message["commenter_name"], others[-1].username)
+        self.assertEqual(Notification.objects.filter(recipient=self.uploader).count(), 2)
+        self.assertEqual(mock_send.call_count, 2)
+        mock_flush.assert_called_once()
+        self.assertEqual(mock_flush.call_args.kwargs["args"], [notification.id])
+
+        with patch("interactions.tasks.send_channel_notification") as mock_push:
+            push_coalesced_notification(notification.id)
+        self.assertEqual(mock_push.call_args.args[1]["notification"]["count"], 3)
+
+    @patch("interactions.services.send_channel_notification.delay")
+    def test_redis_failure_falls_back_to_individual_notifications(self, mock_send):
+        video = self._create_video("Video Without Redis")
+        with (
+            patch("interactions.services.get_redis", side_effect=redis.ConnectionError),
+            self.assertLogs("interactions.services", level="WARNING"),
+        ):
+            Comment.objects.create(video=video, user=self.commenter, content="One")
+            Comment.objects.create(video=video, user=self.commenter, content="Two")
+        self.assertEqual(Notification.objects.filter(recipient=self.uploader).count(), 2)
+
 
 class NotifySubscribersOfNewVideoTaskTests(TestCase):
     """notify_subscribers_of_new_video fan-out 任務測試"""
@@ -613,6 +694,9 @@ class NotifySubscribersOfNewVideoTaskTests(TestCase):
         )
         Subscription.objects.create(subscriber=self.subscriber, subscribed_to=self.uploader)
         Subscription.objects.create(subscriber=self.inactive_subscriber, subscribed_to=self.uploader)
+        mark_online(self.subscriber)
+        # 子任務以 Celery group 分派，測試中就地執行
+        self.enterContext(eager_celery_tasks())
 
     def _create_video(self, title, visibility="public"):
         dummy_file = SimpleUploadedFile(f"{title}.mp4", TEST_VIDEO_CONTENT, TEST_VIDEO_CONTENT_TYPE)
@@ -630,7 +714,8 @@ class NotifySubscribersOfNewVideoTaskTests(TestCase):
         notification = Notification.objects.get(recipient=self.subscriber)
         self.assertEqual(notification.sender, self.uploader)
         self.assertEqual(notification.link, f"/videos/{video.id}/")
-        payload = notification.message
+        self.assertIsNone(notification.message)
+        payload = notification.payload.data
         self.assertEqual(payload["type"], "new_video")
         self.assertEqual(payload["video_id"], video.id)
 
@@ -643,6 +728,79 @@ class NotifySubscribersOfNewVideoTaskTests(TestCase):
         # 推播內容與歷史通知 API 同形狀（見 Notification.to_client_dict）
         self.assertEqual(message_content["notification"], notification.to_client_dict())
 
+    @patch("interactions.tasks.PUSH_CONCURRENCY", 2)
+    @patch("interactions.tasks.get_channel_layer")
+    def test_batch_pushes_concurrently_with_bound(self, mock_get_channel_layer):
+        for i in range(5):
+            fan = User.objects.create_user(username=f"fanout_fan_{i}", password=TEST_PASSWORD)
+            Subscription.objects.create(subscriber=fan, subscribed_to=self.uploader)
+            mark_online(fan)
+        in_flight, peak, sent = 0, 0, []
+
+        async def group_send(group_name, message):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            if group_name == f"user_{self.subscriber.id}_notifications":
+                raise ConnectionError("redis down")
+            sent.append(group_name)
+
+        mock_get_channel_layer.return_value = MagicMock(group_send=group_send)
+        video = self._create_video("Concurrent Fanout Video")
+        with self.assertLogs("interactions.tasks", level="ERROR"):
+            notify_subscribers_of_new_video(video.id)
+
+        # 上限內並行，單一推播失敗不影響其他人
+        self.assertEqual(peak, 2)
+        self.assertEqual(len(sent), 5)
+        self.assertEqual(Notification.objects.count(), 6)
+
+    @patch("interactions.tasks.NOTIFY_BATCH_SIZE", 2)
+    @patch("interactions.tasks.get_channel_layer", MagicMock())
+    def test_subscribers_split_into_idempotent_ranges(self):
+        fans = [User.objects.create_user(username=f"range_fan_{i}", password=TEST_PASSWORD) for i in range(4)]
+        for fan in fans:
+            Subscription.objects.create(subscriber=fan, subscribed_to=self.uploader)
+        video = self._create_video("Ranged Fanout Video")
+        notify_subscribers_of_new_video(video.id)
+
+        batches = FanoutBatch.objects.filter(video=video).order_by("first_subscriber_id")
+        self.assertEqual(batches.count(), 3)
+        self.assertTrue(all(batch.completed_at for batch in batches))
+        self.assertEqual(Notification.objects.count(), 5)
+        # 各段的通知都參照同一份 payload
+        payload = NotificationPayload.objects.get()
+        self.assertEqual(Notification.objects.filter(payload=payload).count(), 5)
+
+        # 協調任務重跑（期間有新訂閱者）與子任務重複投遞都不會重複通知
+        late = User.objects.create_user(username="range_fan_late", password=TEST_PASSWORD)
+        Subscription.objects.create(subscriber=late, subscribed_to=self.uploader)
+        notify_subscribers_of_new_video(video.id)
+        notify_subscriber_range(batches[0].id)
+        self.assertEqual(FanoutBatch.objects.filter(video=video).count(), 3)
+        self.assertEqual(Notification.objects.count(), 5)
+
+    @patch("interactions.tasks.get_channel_layer", MagicMock())
+    def test_unfinished_range_is_redispatched(self):
+        video = self._create_video("Retried Fanout Video")
+        FanoutBatch.objects.create(video=video, first_subscriber_id=self.subscriber.id)
+        notify_subscribers_of_new_video(video.id)
+        self.assertEqual(Notification.objects.get().recipient, self.subscriber)
+        self.assertIsNotNone(FanoutBatch.objects.get().completed_at)
+
+    @patch("interactions.tasks.get_channel_layer")
+    def test_offline_subscribers_are_not_pushed(self, mock_get_channel_layer):
+        mock_layer = MagicMock()
+        mock_layer.group_send = AsyncMock()
+        mock_get_channel_layer.return_value = mock_layer
+        get_redis().delete(presence_key(self.subscriber.id))
+
+        notify_subscribers_of_new_video(self._create_video("Offline Fanout Video").id)
+        self.assertTrue(Notification.objects.filter(recipient=self.subscriber).exists())
+        mock_layer.group_send.assert_not_called()
+
     @patch("interactions.tasks.get_channel_layer")
     def test_private_video_no_notification(self, mock_get_channel_layer):
         video = self._create_video("Private Fanout Video", visibility="private")
@@ -671,15 +829,30 @@ class GetCommentsViewTests(TestCase):
         self.assertEqual(response.status_code, 200)
         data = json.loads(response.content)
         self.assertTrue(data["has_next"])
-        self.assertEqual(data["next_page"], 2)
         self.assertEqual(data["html"].count('class="comment"'), 20)
 
-        response = self.client.get(reverse("interactions:get_comments", args=[self.video.id]), {"page": 2})
+        response = self.client.get(
+            reverse("interactions:get_comments", args=[self.video.id]), {"after": data["next_cursor"]}
+        )
         data = json.loads(response.content)
         self.assertFalse(data["has_next"])
-        self.assertIsNone(data["next_page"])
+        self.assertIsNone(data["next_cursor"])
         self.assertEqual(data["html"].count('class="comment"'), 5)
 
+    def test_get_comments_cursor_stable_under_new_comments(self):
+        for i in range(21):
+            Comment.objects.create(video=self.video, user=self.user, content=f"Comment {i}")
+        data = self.client.get(reverse("interactions:get_comments", args=[self.video.id])).json()
+
+        # 翻頁期間新增的留言不會讓下一頁重複出現上一頁的最後一則
+        Comment.objects.create(video=self.video, user=self.user, content="Late comment")
+        response = self.client.get(
+            reverse("interactions:get_comments", args=[self.video.id]), {"after": data["next_cursor"]}
+        )
+        html = response.json()["html"]
+        self.assertEqual(html.count('class="comment"'), 1)
+        self.assertIn("Comment 0", html)
+
     def test_get_comments_excludes_replies_and_pinned(self):
         root = Comment.objects.create(video=self.video, user=self.user, content="Root comment")
         Comment.objects.create(video=self.video, user=self.user, content="Reply content", parent_comment=root)
@@ -701,6 +874,123 @@ class GetCommentsViewTests(TestCase):
         self.assertEqual(response.status_code, 404)
 
 
+class CommentPageCacheTests(TestCase):
+    """留言頁快取：前幾頁只查一次資料庫，觀看者相關的部分每次請求代入。"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="cache_commenter", password=TEST_PASSWORD)
+        dummy_file = SimpleUploadedFile("cached.mp4", TEST_VIDEO_CONTENT, TEST_VIDEO_CONTENT_TYPE)
+        self.video = Video.objects.create(title="Cached Video", uploader=self.user, video_file=dummy_file)
+        for i in range(25):
+            Comment.objects.create(video=self.video, user=self.user, content=f"Comment {i}")
+        self.url = reverse("interactions:get_comments", args=[self.video.id])
+
+    def test_warm_pages_skip_comment_queries(self):
+        first = self.client.get(self.url).json()
+        # 每個請求只剩取影片本身的一次查詢
+        with self.assertNumQueries(2):
+            self.assertEqual(self.client.get(self.url).json(), first)
+            second = self.client.get(self.url, {"after": first["next_cursor"]}).json()
+        self.assertEqual(second["html"].count('class="comment"'), 5)
+        self.assertFalse(second["has_next"])
+
+    def test_viewer_overlay(self):
+        html = self.client.get(self.url).json()["html"]
+        self.assertNotIn("reply-form-actual", html)
+        self.assertNotIn("<!--comment-", html)
+        self.assertIn("0\xa0minutes ago", html)
+
+        self.client.login(username="cache_commenter", password=TEST_PASSWORD)
+        html = self.client.get(self.url).json()["html"]
+        self.assertEqual(html.count("reply-form-actual"), 20)
+        self.assertIn("csrfmiddlewaretoken", html)
+        self.assertIn('aria-label="Reply to cache_commenter"', html)
+
+    def test_new_comment_and_delete_invalidate(self):
+        self.client.get(self.url)
+        newest = Comment.objects.create(video=self.video, user=self.user, content="Fresh comment")
+        self.assertIn("Fresh comment", self.client.get(self.url).json()["html"])
+
+        Comment.objects.create(video=self.video, user=self.user, content="A reply", parent_comment=newest)
+        self.assertIn("View 1 reply", self.client.get(self.url).json()["html"])
+
+        newest.delete()
+        self.assertNotIn("Fresh comment", self.client.get(self.url).json()["html"])
+
+
+class TopCommentsTests(TestCase):
+    """熱門留言：讚/回覆數變動時就地更新分數，依分數排序分頁。"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="top_commenter", password=TEST_PASSWORD)
+        self.fan = User.objects.create_user(username="top_fan", password=TEST_PASSWORD)
+        dummy_file = SimpleUploadedFile("top.mp4", TEST_VIDEO_CONTENT, TEST_VIDEO_CONTENT_TYPE)
+        self.video = Video.objects.create(title="Top Video", uploader=self.user, video_file=dummy_file)
+        now = timezone.now()
+        self.old = Comment.objects.create(
+            video=self.video, user=self.user, content="Old popular", timestamp=now - timedelta(hours=6)
+        )
+        self.new = Comment.objects.create(video=self.video, user=self.user, content="New quiet", timestamp=now)
+        self.url = reverse("interactions:get_comments", args=[self.video.id])
+
+    def old_ranks_first(self, sort="top"):
+        html = self.client.get(self.url, {"sort": sort}).json()["html"]
+        return html.index("Old popular") < html.index("New quiet")
+
+    def test_scores_follow_likes_and_replies(self):
+        self.assertAlmostEqual(self.new.hot_score, self.new.timestamp.timestamp())
+        CommentLike.objects.create(comment=self.old, user=self.fan)
+        Comment.objects.create(video=self.video, user=self.fan, content="Reply", parent_comment=self.old)
+        self.old.refresh_from_db()
+        self.assertEqual((self.old.like_count, self.old.reply_count), (1, 1))
+        # log2(1 + 1 + 2 × 1) = 2 次翻倍
+        self.assertAlmostEqual(self.old.hot_score, self.old.timestamp.timestamp() + 2 * HOT_SCORE_DOUBLING_SECONDS)
+
+        CommentLike.objects.get(comment=self.old, user=self.fan).delete()
+        self.old.refresh_from_db()
+        self.assertEqual(self.old.like_count, 0)
+        self.assertAlmostEqual(
+            self.old.hot_score, self.old.timestamp.timestamp() + math.log2(3) * HOT_SCORE_DOUBLING_SECONDS
+        )
+
+    def test_top_sort_ranks_engaged_comments_first(self):
+        self.assertFalse(self.old_ranks_first("newest"))
+        self.assertFalse(self.old_ranks_first())
+        CommentLike.objects.create(comment=self.old, user=self.fan)
+        # 按讚讓快取失效，熱門排序立即反映
+        self.assertTrue(self.old_ranks_first())
+        self.assertFalse(self.old_ranks_first("newest"))
+
+    def test_top_sort_paginates_by_score_cursor(self):
+        for i in range(25):
+            Comment.objects.create(video=self.video, user=self.user, content=f"Filler {i}")
+        first = self.client.get(self.url, {"sort": "top"}).json()
+        second = self.client.get(self.url, {"sort": "top", "after": first["next_cursor"]}).json()
+        self.assertEqual(first["html"].count('class="comment"') + second["html"].count('class="comment"'), 27)
+        self.assertIn("Old popular", second["html"])
+
+    def test_like_endpoint_toggles(self):
+        self.client.login(username="top_fan", password=TEST_PASSWORD)
+        url = reverse("interactions:like_comment", args=[self.new.id])
+        self.assertEqual(self.client.post(url).json(), {"status": "success", "liked": True, "like_count": 1})
+        html = self.client.get(self.url).json()["html"]
+        self.assertIn(f'comment-like-btn active" data-comment-id="{self.new.id}"', html)
+        self.assertIn(f'comment-like-btn" data-comment-id="{self.old.id}"', html)
+
+        self.assertEqual(self.client.post(url).json(), {"status": "success", "liked": False, "like_count": 0})
+        self.assertFalse(CommentLike.objects.exists())
+
+    def test_like_requires_login_and_access(self):
+        url = reverse("interactions:like_comment", args=[self.new.id])
+        self.assertEqual(self.client.post(url).status_code, 302)
+        self.video.visibility = "private"
+        self.video.save()
+        self.client.login(username="top_fan", password=TEST_PASSWORD)
+        self.assertEqual(self.client.post(url).status_code, 404)
+
+
 class GetRepliesViewTests(TestCase):
     """Test cases for the paginated get_replies endpoint."""
 
@@ -726,18 +1016,29 @@ class GetRepliesViewTests(TestCase):
         self.assertEqual(response.status_code, 200)
         data = json.loads(response.content)
         self.assertTrue(data["has_next"])
-        self.assertEqual(data["next_page"], 2)
         self.assertEqual(data["html"].count('class="comment"'), 10)
         # 回覆由舊到新（對話順序）
         self.assertIn("Reply 0", data["html"])
         self.assertNotIn(f"Reply {len(replies) - 1}", data["html"])
 
-        response = self.client.get(reverse("interactions:get_replies", args=[self.root.id]), {"page": 2})
+        response = self.client.get(
+            reverse("interactions:get_replies", args=[self.root.id]), {"after": data["next_cursor"]}
+        )
         data = json.loads(response.content)
         self.assertFalse(data["has_next"])
         self.assertEqual(data["html"].count('class="comment"'), 2)
         self.assertIn("Reply 11", data["html"])
 
+    def test_reply_count_follows_replies(self):
+        reply = Comment.objects.create(video=self.video, user=self.user, content="A reply", parent_comment=self.root)
+        Comment.objects.create(video=self.video, user=self.user, content="Another", parent_comment=self.root)
+        self.root.refresh_from_db()
+        self.assertEqual(self.root.reply_count, 2)
+
+        reply.delete()
+        self.root.refresh_from_db()
+        self.assertEqual(self.root.reply_count, 1)
+
     def test_get_replies_of_reply_returns_404(self):
         reply = Comment.objects.create(video=self.video, user=self.user, content="A reply", parent_comment=self.root)
         response = self.client.get(reverse("interactions:get_replies", args=[reply.id]))
@@ -796,6 +1097,125 @@ class GetNotificationsViewTests(TestCase):
         response = self.client.get(reverse("interactions:get_notifications"))
         self.assertEqual(response.status_code, 302)
 
+    def _get(self, **params):
+        return self.client.get(reverse("interactions:get_notifications"), params)
+
+    def test_after_cursor_pages_to_older_notifications(self):
+        Notification.objects.bulk_create(
+            Notification(
+                recipient=self.user, message=f"Notification {i}", timestamp=timezone.now() + timedelta(seconds=i)
+            )
+            for i in range(60)
+        )
+        first = self._get().json()["data"]
+        second = self._get(after=first["next_cursor"]).json()["data"]
+        self.assertEqual(
+            [n["message"] for n in second["notifications"]], [f"Notification {i}" for i in range(9, -1, -1)]
+        )
+        self.assertIsNone(second["next_cursor"])
+
+    def test_since_returns_only_newer_notifications(self):
+        now = timezone.now()
+        Notification.objects.create(recipient=self.user, message="Old", timestamp=now - timedelta(hours=2))
+        seen = Notification.objects.create(recipient=self.user, message="Seen", timestamp=now - timedelta(hours=1))
+        newest = self._get().json()["data"]["newest_cursor"]
+        fresh = Notification.objects.create(recipient=self.user, message="Fresh")
+
+        data = self._get(since=newest).json()["data"]
+        # cursor 那一則落在重疊範圍內會再回傳一次，更早的不會
+        self.assertEqual([n["id"] for n in data["notifications"]], [fresh.id, seen.id])
+        self.assertFalse(data["has_newer"])
+
+    def test_since_overlaps_rows_committed_after_cursor(self):
+        """timestamp 比 cursor 早、但較晚 commit 的通知仍會在下次 since 同步時取得（重複的由前端去重）"""
+        fresh = Notification.objects.create(recipient=self.user, message="Fresh")
+        cursor = self._get().json()["data"]["newest_cursor"]
+        late = Notification.objects.create(
+            recipient=self.user, message="Late", timestamp=fresh.timestamp - timedelta(seconds=1)
+        )
+
+        data = self._get(since=cursor).json()["data"]
+        self.assertEqual([n["id"] for n in data["notifications"]], [fresh.id, late.id])
+        self.assertEqual(data["newest_cursor"], cursor)
+
+    def test_unchanged_history_returns_not_modified(self):
+        get_redis().delete(unread_key(self.user.id))
+        notification = Notification.objects.create(recipient=self.user, message="Cached")
+        etag = self._get()["ETag"]
+        response = self.client.get(reverse("interactions:get_notifications"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        # 標記已讀與新通知都會讓 ETag 改變
+        self.client.post(reverse("interactions:mark_notification_as_read", args=[notification.id]))
+        read_etag = self._get()["ETag"]
+        self.assertNotEqual(read_etag, etag)
+        notify(self.user, {"type": "announcement", "text": "New"})
+        self.assertNotEqual(self._get()["ETag"], read_etag)
+
+
+class NotificationPartitionTests(TestCase):
+    """Notification 月份分區的建立與過期移除（見 partitions.py）。"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="partition_user", password=TEST_PASSWORD)
+
+    def partition_of(self, notification):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT tableoid::regclass::text FROM interactions_notification WHERE id = %s", [notification.id]
+            )
+            return cursor.fetchone()[0]
+
+    def test_rows_route_to_monthly_partition(self):
+        notification = Notification.objects.create(recipient=self.user, message="Now")
+        self.assertEqual(self.partition_of(notification), partition_name(month_start(notification.timestamp)))
+
+    def test_new_partition_takes_rows_from_default(self):
+        future = timezone.now() + timedelta(days=366 * 2)
+        early = Notification.objects.create(recipient=self.user, message="Early", timestamp=future)
+        self.assertEqual(self.partition_of(early), DEFAULT_PARTITION)
+
+        created = ensure_notification_partitions(now=future)
+        self.assertEqual(len(created), NOTIFICATION_PARTITIONS_AHEAD + 1)
+        self.assertEqual(self.partition_of(early), partition_name(month_start(future)))
+        self.assertEqual(ensure_notification_partitions(now=future), [])
+
+    def test_expired_partitions_are_dropped(self):
+        old = timezone.now() - timedelta(days=31 * (NOTIFICATION_RETENTION_MONTHS + 2))
+        ensure_notification_partitions(now=old)
+        Notification.objects.create(recipient=self.user, message="Old", timestamp=old)
+        recent = Notification.objects.create(recipient=self.user, message="Recent")
+        # 外鍵為 DEFERRABLE：同一個 transaction 內剛寫入的列還有待檢查的 trigger，先執行才能 DROP 分區
+        with connection.cursor() as cursor:
+            cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+
+        get_redis().set(unread_key(self.user.id), 2)
+
+        dropped = drop_expired_notification_partitions()
+        self.assertIn(partition_name(month_start(old)), dropped)
+        self.assertNotIn(partition_name(month_start(recent.timestamp)), dropped)
+        self.assertEqual(list(Notification.objects.filter(recipient=self.user)), [recent])
+        # 被移除的未讀通知不再計入
+        self.assertEqual(unread_count(self.user.id), 1)
+
+    def test_expired_fanout_data_is_pruned(self):
+        old = timezone.now() - timedelta(days=31 * (NOTIFICATION_RETENTION_MONTHS + 2))
+        video = Video.objects.create(
+            title="Partition Video",
+            uploader=self.user,
+            video_file=SimpleUploadedFile("partition.mp4", TEST_VIDEO_CONTENT, TEST_VIDEO_CONTENT_TYPE),
+        )
+        expired = NotificationPayload.objects.create(data={"type": "new_video"})
+        FanoutBatch.objects.create(video=video, first_subscriber_id=1, payload=expired)
+        live = NotificationPayload.objects.create(data={"type": "new_video"})
+        FanoutBatch.objects.create(video=video, first_subscriber_id=2, payload=live)
+        NotificationPayload.objects.filter(id=expired.id).update(created_at=old)
+        FanoutBatch.objects.filter(payload=expired).update(created_at=old)
+
+        drop_expired_notification_partitions()
+        self.assertEqual(list(NotificationPayload.objects.all()), [live])
+        self.assertEqual(list(FanoutBatch.objects.values_list("payload_id", flat=True)), [live.id])
+
 
 class MarkNotificationViewTests(TestCase):
     """Test cases for mark_notification_as_read and mark_all views."""
@@ -842,6 +1262,56 @@ class MarkNotificationViewTests(TestCase):
         self.assertEqual(data["status"], "noop")
 
 
+class UnreadCountTests(TestCase):
+    """未讀通知數計數器與其推播（見 unread.py）。"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="unread_user", password=TEST_PASSWORD)
+        self.client.login(username="unread_user", password=TEST_PASSWORD)
+        get_redis().flushdb()
+        mark_online(self.user)
+
+    def test_counter_rebuilt_from_database_then_adjusted(self):
+        Notification.objects.create(recipient=self.user, message="Unread")
+        self.assertEqual(unread_count(self.user.id), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(unread_count(self.user.id), 1)
+        self.assertEqual(adjust_unread_count(self.user.id, -5), 0)
+
+        # 冷 key 不從 0 起算，留給下次讀取重算
+        get_redis().delete(unread_key(self.user.id))
+        self.assertIsNone(adjust_unread_count(self.user.id, 1))
+        self.assertFalse(get_redis().exists(unread_key(self.user.id)))
+
+    @patch("interactions.services.send_channel_notification.delay")
+    def test_notify_and_mark_read_push_counts(self, mock_send):
+        unread_count(self.user.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            notification = notify(self.user, {"type": "announcement", "text": "Hello"})
+        self.assertEqual(mock_send.call_args.args[1]["unread_count"], 1)
+
+        self.client.post(reverse("interactions:mark_notification_as_read", args=[notification.id]))
+        self.assertEqual(mock_send.call_args.args[1], {"type": "send_unread_count", "unread_count": 0})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            notify(self.user, {"type": "announcement", "text": "Again"})
+            notify(self.user, {"type": "announcement", "text": "And again"})
+        self.assertEqual(mock_send.call_args.args[1]["unread_count"], 2)
+        self.client.post(reverse("interactions:mark_all_notifications_as_read"))
+        self.assertEqual(mock_send.call_args.args[1], {"type": "send_unread_count", "unread_count": 0})
+        self.assertEqual(unread_count(self.user.id), 0)
+
+    @patch("interactions.services.send_channel_notification.delay")
+    def test_rolled_back_notify_leaves_count_and_push_untouched(self, mock_send):
+        unread_count(self.user.id)
+        with self.captureOnCommitCallbacks(execute=True), self.assertRaises(IntegrityError):
+            with transaction.atomic():
+                notify(self.user, {"type": "announcement", "text": "Rolled back"})
+                raise IntegrityError
+        mock_send.assert_not_called()
+        self.assertEqual(unread_count(self.user.id), 0)
+
+
 class PrivateVideoInteractionAccessTests(TestCase):
     """互動端點對 private 影片的存取控制：僅上傳者本人可用，其他人一律 404。"""
 
@@ -957,10 +1427,12 @@ class NotificationConsumerTests(TransactionTestCase):
     def setUp(self):
         self.user = User.objects.create_user(username="ws_owner", password=TEST_PASSWORD)
         self.other_user = User.objects.create_user(username="ws_other", password=TEST_PASSWORD)
+        # 未讀數計數器存在 Redis，不隨測試資料庫清空
+        get_redis().flushdb()
 
-    def _communicator(self, user):
+    def _communicator(self, user, path="/ws/notifications/"):
         """以指定使用者身分建立連往通知端點的 communicator（走實際 routing）。"""
-        communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), "/ws/notifications/")
+        communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), path)
         communicator.scope["user"] = user
         return communicator
 
@@ -971,10 +1443,14 @@ class NotificationConsumerTests(TransactionTestCase):
         self.assertFalse(connected)
 
     async def test_own_connection_receives_group_notification(self):
-        """連線後收到發送端（services/tasks 的 group_send）格式的推播並轉發給前端。"""
+        """連線時先收到未讀數，之後收到發送端（services/tasks 的 group_send）格式的推播並轉發給前端。"""
+        existing = await Notification.objects.acreate(recipient=self.user, message="Unread before connecting")
         communicator = self._communicator(self.user)
         connected, _ = await communicator.connect()
         self.assertTrue(connected)
+        self.assertEqual(
+            await communicator.receive_json_from(), {"unread_count": 1, "cursor": existing.to_client_dict()["cursor"]}
+        )
 
         # 與 Notification.to_client_dict() 同形狀（歷史 API 與推播共用的資料契約）
         notification = {
@@ -982,23 +1458,84 @@ class NotificationConsumerTests(TransactionTestCase):
             "message": {"type": "new_video", "video_title": "Test Video"},
             "link": "/videos/1/",
             "is_read": False,
+            "count": 1,
             "timestamp": "2026-06-11T00:00:00+00:00",
+            "cursor": "1781136000000000_1",
         }
         await get_channel_layer().group_send(
             f"user_{self.user.id}_notifications",
-            {"type": "send_notification", "notification": notification},
+            {"type": "send_notification", "notification": notification, "unread_count": 2},
         )
 
         response = await communicator.receive_json_from()
-        self.assertEqual(response, {"notification": notification})
+        self.assertEqual(response, {"notification": notification, "unread_count": 2})
+
+        await communicator.disconnect()
+
+    async def test_reconnect_replays_missed_notifications(self):
+        """帶 since 重連：先依序補送斷線期間的通知（含 cursor 前重疊的一段），再送未讀數。"""
+        await Notification.objects.acreate(
+            recipient=self.user, message="Long ago", timestamp=timezone.now() - timedelta(hours=1)
+        )
+        seen = await Notification.objects.acreate(recipient=self.user, message="Seen")
+        missed = [
+            await Notification.objects.acreate(
+                recipient=self.user, message=f"Missed {i}", timestamp=seen.timestamp + timedelta(seconds=i + 1)
+            )
+            for i in range(2)
+        ]
+        since = seen.to_client_dict()["cursor"]
+        communicator = self._communicator(self.user, f"/ws/notifications/?since={since}")
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+
+        # seen 落在重疊範圍內會再送一次，前端依 id 去重；超出範圍的舊通知不補送
+        for notification in [seen, *missed]:
+            response = await communicator.receive_json_from()
+            self.assertEqual(response, {"notification": notification.to_client_dict(), "replayed": True})
+        response = await communicator.receive_json_from()
+        self.assertEqual(response, {"unread_count": 4, "cursor": missed[-1].to_client_dict()["cursor"]})
+
+        await communicator.disconnect()
+
+    @patch("interactions.consumers.REPLAY_LIMIT", 1)
+    async def test_large_gap_requests_resync(self):
+        seen = await Notification.objects.acreate(recipient=self.user, message="Seen")
+        for i in range(2):
+            latest = await Notification.objects.acreate(
+                recipient=self.user, message=f"Missed {i}", timestamp=seen.timestamp + timedelta(seconds=i + 1)
+            )
+        communicator = self._communicator(self.user, f"/ws/notifications/?since={seen.to_client_dict()['cursor']}")
+        await communicator.connect()
+
+        response = await communicator.receive_json_from()
+        self.assertEqual(response, {"resync": True, "cursor": latest.to_client_dict()["cursor"]})
+        self.assertEqual((await communicator.receive_json_from())["unread_count"], 3)
+
+        await communicator.disconnect()
+
+    async def test_presence_follows_connection_and_heartbeat(self):
+        """連線時登記在線、heartbeat 延長 TTL、斷線後移除。"""
+        key = presence_key(self.user.id)
+        communicator = self._communicator(self.user)
+        await communicator.connect()
+        await communicator.receive_json_from()
+        self.assertTrue(get_redis().exists(key))
+
+        get_redis().expire(key, 1)
+        await communicator.send_json_to({"type": "heartbeat"})
+        await communicator.receive_nothing()
+        self.assertGreater(get_redis().ttl(key), 1)
 
         await communicator.disconnect()
+        self.assertFalse(get_redis().exists(key))
 
     async def test_connection_isolated_from_other_users_group(self):
         """連線只會加入自己的群組：推播到他人群組時不應收到任何訊息。"""
         communicator = self._communicator(self.other_user)
         connected, _ = await communicator.connect()
         self.assertTrue(connected)
+        await communicator.receive_json_from()
 
         await get_channel_layer().group_send(
             f"user_{self.user.id}_notifications",
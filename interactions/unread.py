@@ -0,0 +1,102 @@
+"""未讀通知數：每位使用者一個 Redis 計數器，頁面載入與 WebSocket 連線不必查資料庫。
+
+key 不存在時由資料庫 COUNT 重算並寫回（TTL UNREAD_COUNT_TTL）。新通知與標記已讀以 Lua 腳本
+只在 key 存在時加減：冷 key 上從 0 起算會少算，不如等下次讀取時重算。
+重算與遞增剛好同時發生時可能差一則，最多持續到 TTL 到期或使用者全部標記已讀。
+過期通知分區被移除時，受影響使用者的計數器直接刪除，下次讀取時重算。
+Redis 不可用時直接查資料庫。
+"""
+
+import logging
+from functools import cache
+
+import redis
+
+from youtube_service.redis_client import get_redis
+
+from .models import Notification
+
+logger = logging.getLogger(__name__)
+
+UNREAD_COUNT_TTL = 60 * 60
+
+# KEYS[1] 計數器，ARGV[1] 增量；key 不存在時回傳 nil 且不建立，結果不低於 0
+_INCR_IF_EXISTS = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return nil
+end
+local value = redis.call('INCRBY', KEYS[1], ARGV[1])
+if value < 0 then
+    redis.call('SET', KEYS[1], 0, 'KEEPTTL')
+    value = 0
+end
+return value
+"""
+
+
+def unread_key(user_id):
+    return f"notifications:unread:{user_id}"
+
+
+@cache
+def _incr_script():
+    return get_redis().register_script(_INCR_IF_EXISTS)
+
+
+def _count_from_db(user_id):
+    return Notification.objects.filter(recipient_id=user_id, is_read=False).count()
+
+
+def unread_count(user_id):
+    try:
+        cached = get_redis().get(unread_key(user_id))
+    except redis.RedisError:
+        logger.warning("讀取未讀通知數失敗，改查資料庫", exc_info=True)
+        return _count_from_db(user_id)
+    if cached is not None:
+        return int(cached)
+    count = _count_from_db(user_id)
+    try:
+        get_redis().set(unread_key(user_id), count, ex=UNREAD_COUNT_TTL)
+    except redis.RedisError:
+        logger.warning("寫入未讀通知數失敗", exc_info=True)
+    return count
+
+
+def adjust_unread_counts(user_ids, delta):
+    """一次 pipeline 調整多位使用者的計數；回傳 {user_id: 新值}，計數器不存在或 Redis 失敗時值為 None。"""
+    user_ids = list(user_ids)
+    if not user_ids:
+        return {}
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        for user_id in user_ids:
+            _incr_script()(keys=[unread_key(user_id)], args=[delta], client=pipe)
+        values = pipe.execute()
+    except redis.RedisError:
+        logger.warning("更新未讀通知數失敗", exc_info=True)
+        return dict.fromkeys(user_ids)
+    return dict(zip(user_ids, values, strict=True))
+
+
+def adjust_unread_count(user_id, delta):
+    return adjust_unread_counts([user_id], delta)[user_id]
+
+
+def reset_unread_count(user_id):
+    """全部標記已讀：計數直接歸零，不必等下次重算。"""
+    try:
+        get_redis().set(unread_key(user_id), 0, ex=UNREAD_COUNT_TTL)
+    except redis.RedisError:
+        logger.warning("重設未讀通知數失敗", exc_info=True)
+
+
+def invalidate_unread_counts(user_ids):
+    """刪除這些使用者的計數器（未讀通知被整批移除時），下次讀取時由資料庫重算。"""
+    keys = [unread_key(user_id) for user_id in set(user_ids)]
+    if not keys:
+        return
+    try:
+        get_redis().delete(*keys)
+    except redis.RedisError:
+        logger.warning("清除未讀通知數失敗", exc_info=True)
@@ -1,26 +1,29 @@
+import hashlib
 import logging
 
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
-from django.core.paginator import Paginator
-from django.db.models import Count
 from django.http import Http404, JsonResponse
 from django.shortcuts import get_object_or_404, redirect
 from django.template.loader import render_to_string
 from django.urls import reverse
-from django.views.decorators.http import require_POST
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_POST
 from django_ratelimit.decorators import ratelimit
 
 from videos.models import Video
+from videos.pagination import KeysetPaginator, encode_cursor
 
+from .comment_pages import COMMENT_SORTS, annotate_viewer_likes, get_comment_page
 from .forms import CommentForm
-from .models import Comment, LikeDislike, Notification, Subscription
-from .services import notify
+from .models import Comment, CommentLike, LikeDislike, Notification, Subscription, resume_notification_cursor
+from .services import notify, push_unread_count
+from .unread import adjust_unread_count, reset_unread_count, unread_count
 
 logger = logging.getLogger(__name__)
 
-COMMENTS_PER_PAGE = 20
 REPLIES_PER_PAGE = 10
+NOTIFICATIONS_PER_PAGE = 50
 
 
 @ratelimit(key="user", rate="30/m", method="POST", block=True)
@@ -84,59 +87,65 @@ def add_comment(request, video_id):
 
 
 def get_comments(request, video_id):
-    """回傳影片頂層留言的分頁 HTML（前端 Load more 用）。"""
+    """回傳影片頂層留言的分頁 HTML（前端 Load more 用），?after=<cursor> 取下一頁、?sort=top 依熱門排序；前幾頁走快取。"""
     video = get_object_or_404(Video, id=video_id)
     if not video.is_accessible_by(request.user):
         raise Http404("影片不存在或無權限訪問")
-    comments = (
-        Comment.objects.filter(video=video, parent_comment__isnull=True)
-        .select_related("user")
-        .annotate(num_replies=Count("replies"))
-        .order_by("-timestamp")
-    )
 
     # 釘選留言（通知深連結）已在頁面最上方渲染，載入更多時跳過避免重複
     exclude_id = request.GET.get("exclude")
-    if exclude_id and exclude_id.isdigit():
-        comments = comments.exclude(pk=exclude_id)
-
-    paginator = Paginator(comments, COMMENTS_PER_PAGE)
-    page = paginator.get_page(request.GET.get("page"))
-    html = render_to_string(
-        "interactions/_comment_list.html", {"comments": page.object_list, "video": video, "request": request}
+    exclude = int(exclude_id) if exclude_id and exclude_id.isdigit() else None
+
+    sort = request.GET.get("sort")
+    page = get_comment_page(
+        video,
+        request,
+        after=request.GET.get("after"),
+        exclude=exclude,
+        sort=sort if sort in COMMENT_SORTS else "newest",
     )
     return JsonResponse(
-        {
-            "status": "success",
-            "html": html,
-            "has_next": page.has_next(),
-            "next_page": page.next_page_number() if page.has_next() else None,
-        }
+        {"status": "success", "html": page.html, "has_next": page.has_next, "next_cursor": page.next_cursor}
     )
 
 
 def get_replies(request, comment_id):
-    """回傳頂層留言底下回覆的分頁 HTML（前端展開回覆用），由舊到新排序。"""
+    """回傳頂層留言底下回覆的分頁 HTML（前端展開回覆用），由舊到新排序，?after=<cursor> 取下一頁。"""
     comment = get_object_or_404(Comment.objects.select_related("video"), id=comment_id, parent_comment__isnull=True)
     if not comment.video.is_accessible_by(request.user):
         raise Http404("留言不存在或無權限訪問")
-    replies = comment.replies.select_related("user").order_by("timestamp")
-    paginator = Paginator(replies, REPLIES_PER_PAGE)
-    page = paginator.get_page(request.GET.get("page"))
+    # 帶上 video 條件，與頂層留言共用 (video, parent_comment, timestamp) 索引
+    replies = annotate_viewer_likes(
+        Comment.objects.filter(video_id=comment.video_id, parent_comment=comment).select_related("user"), request.user
+    )
+    page = KeysetPaginator(replies, REPLIES_PER_PAGE, field="timestamp", descending=False).get_page(
+        after=request.GET.get("after")
+    )
     html = render_to_string(
         "interactions/_comment_list.html",
         {"comments": page.object_list, "video": comment.video, "request": request},
     )
     return JsonResponse(
-        {
-            "status": "success",
-            "html": html,
-            "has_next": page.has_next(),
-            "next_page": page.next_page_number() if page.has_next() else None,
-        }
+        {"status": "success", "html": html, "has_next": page.has_next(), "next_cursor": page.next_cursor}
     )
 
 
+@ratelimit(key="user", rate="60/m", method="POST", block=True)
+@login_required
+@require_POST
+def like_comment(request, comment_id):
+    """切換留言的讚；讚數與熱門分數由 signal 在同一個 UPDATE 維護。"""
+    comment = get_object_or_404(Comment.objects.select_related("video"), id=comment_id)
+    if not comment.video.is_accessible_by(request.user):
+        raise Http404("留言不存在或無權限訪問")
+
+    like, created = CommentLike.objects.get_or_create(comment=comment, user=request.user)
+    if not created:
+        like.delete()
+    comment.refresh_from_db(fields=["like_count"])
+    return JsonResponse({"status": "success", "liked": created, "like_count": comment.like_count})
+
+
 @ratelimit(key="user", rate="60/m", method="POST", block=True)
 @login_required
 @require_POST
@@ -242,13 +251,54 @@ def toggle_subscription(request, user_id_to_subscribe):
         return redirect("users:channel", username=user_to_subscribe_to.username)
 
 
+def _notifications_etag(request):
+    """最新一則通知的 (timestamp, id) 加上未讀數與查詢參數。
+
+    有新通知、合併通知就地更新（timestamp 前移）或標記已讀時才會改變；
+    只查一筆（沿 notif_recipient_ts_idx）加一次 Redis，比序列化整頁便宜。
+    """
+    latest = (
+        Notification.objects.filter(recipient=request.user)
+        .order_by("-timestamp", "-id")
+        .values_list("timestamp", "id")
+        .first()
+    )
+    marker = encode_cursor(*latest) if latest else "none"
+    params = hashlib.md5(request.GET.urlencode().encode(), usedforsecurity=False).hexdigest()[:12]
+    return f"{marker}-{unread_count(request.user.id)}-{params}"
+
+
 @login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_notifications_etag)
 def get_notifications(request):
-    notifications = Notification.objects.filter(recipient=request.user).order_by("-timestamp")[:50]
-
-    data = [notification.to_client_dict() for notification in notifications]
+    """歷史通知，由新到舊以 (timestamp, id) keyset 分頁；內容沒變時回 304（見 _notifications_etag）。
+
+    ?after=<cursor> 取更舊的一頁。?since=<cursor> 增量同步：只回比 cursor 新的通知中最接近的一頁，
+    has_newer 表示還有更新的要以回傳的 newest_cursor 再取；合併通知更新時 timestamp 會前移，同樣會被同步到。
+    since 會往回重疊一段（見 resume_notification_cursor），前端依 id 去重。
+    """
+    notifications = Notification.objects.filter(recipient=request.user).select_related("payload")
+    paginator = KeysetPaginator(notifications, NOTIFICATIONS_PER_PAGE, field="timestamp")
+    since = request.GET.get("since")
+    if since:
+        page = paginator.get_page(before=resume_notification_cursor(since))
+        next_cursor, has_newer = None, page.has_previous()
+    else:
+        page = paginator.get_page(after=request.GET.get("after"))
+        next_cursor, has_newer = page.next_cursor, False
 
-    return JsonResponse({"status": "success", "data": {"notifications": data}})
+    return JsonResponse(
+        {
+            "status": "success",
+            "data": {
+                "notifications": [notification.to_client_dict() for notification in page],
+                "next_cursor": next_cursor,
+                "newest_cursor": paginator.cursor_for(page[0]) if page else since,
+                "has_newer": has_newer,
+            },
+        }
+    )
 
 
 @login_required
@@ -256,8 +306,10 @@ def get_notifications(request):
 def mark_notification_as_read(request, notification_id):
     notification = get_object_or_404(Notification, id=notification_id, recipient=request.user)
     if not notification.is_read:
-        notification.is_read = True
-        notification.save(update_fields=["is_read"])
+        # 條件式 UPDATE：同一則通知的並行請求只有一次會讓未讀數減一
+        if Notification.objects.filter(id=notification.id, is_read=False).update(is_read=True):
+            adjust_unread_count(request.user.id, -1)
+            push_unread_count(request.user.id)
         return JsonResponse({"status": "success", "message": "Notification marked as read."})
     return JsonResponse({"status": "noop", "message": "Notification was already read."})
 
@@ -268,5 +320,7 @@ def mark_all_notifications_as_read(request):
     updated_count = Notification.objects.filter(recipient=request.user, is_read=False).update(is_read=True)
 
     if updated_count > 0:
+        reset_unread_count(request.user.id)
+        push_unread_count(request.user.id)
         return JsonResponse({"status": "success", "message": f"{updated_count} notifications marked as read."})
     return JsonResponse({"status": "noop", "message": "No unread notifications to mark."})
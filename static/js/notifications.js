@@ -3,6 +3,18 @@
 // 或者直接在腳本中嵌入，但前者更安全
 
 var wsReconnectAttempts = 0;
+// 在線狀態 heartbeat 間隔，需與 interactions/presence.py 的 PRESENCE_HEARTBEAT_INTERVAL 一致
+var PRESENCE_HEARTBEAT_MS = 30000;
+var presenceHeartbeat = null;
+// 最後收到的通知 cursor（見 Notification.to_client_dict）；重連時帶給伺服器，只補送斷線期間的通知
+var lastNotificationCursor = null;
+
+function rememberNotificationCursor(cursor) {
+    // cursor 為「微秒時間戳_id」，以時間部分比較新舊
+    if (cursor && (!lastNotificationCursor || parseInt(cursor, 10) >= parseInt(lastNotificationCursor, 10))) {
+        lastNotificationCursor = cursor;
+    }
+}
 
 function initializeNotificationWebSocket(userId) {
     if (!userId) {
@@ -12,29 +24,71 @@ function initializeNotificationWebSocket(userId) {
 
     const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
     // 身分由 session 決定，URL 不帶 user_id；userId 僅作為「未登入不連線」的 guard
-    const wsPath = `${protocol}//${window.location.host}/ws/notifications/`;
+    let wsPath = `${protocol}//${window.location.host}/ws/notifications/`;
+    if (lastNotificationCursor) {
+        wsPath += `?since=${encodeURIComponent(lastNotificationCursor)}`;
+    }
 
     const notificationSocket = new WebSocket(wsPath);
 
     notificationSocket.onopen = function(e) {
         console.log("Notification WebSocket connection established.");
         wsReconnectAttempts = 0;
+        // 伺服器只推播給在線使用者；定期 heartbeat 讓在線狀態不過期
+        clearInterval(presenceHeartbeat);
+        presenceHeartbeat = setInterval(function() {
+            if (notificationSocket.readyState === WebSocket.OPEN) {
+                notificationSocket.send(JSON.stringify({ type: 'heartbeat' }));
+            }
+        }, PRESENCE_HEARTBEAT_MS);
     };
 
     notificationSocket.onmessage = function(e) {
         // data.notification 與歷史通知 API 的單筆形狀一致（見 services.notify），
-        // 直接交給 formatNotificationHTML 共用同一條渲染路徑
+        // 直接交給 formatNotificationHTML 共用同一條渲染路徑；
+        // data.unread_count 是伺服器端的未讀數（連線時、標記已讀後與隨通知送出，見 interactions/unread.py）
         const data = JSON.parse(e.data);
         console.log("Notification received via WebSocket:", data);
 
+        if (data.resync) {
+            // 斷線太久、伺服器不逐則補送：下次打開面板時重新載入歷史通知
+            historicalNotificationsLoaded = false;
+            rememberNotificationCursor(data.cursor);
+            return;
+        }
+
+        if (!data.notification) {
+            rememberNotificationCursor(data.cursor);
+            if (typeof data.unread_count === 'number') {
+                unreadNotificationCount = data.unread_count;
+                updateUnreadCountDisplay();
+            }
+            return;
+        }
+
+        // 合併通知（見 services.notify）會以同一個 id 推播更新：移除舊項目再置頂，
+        // 舊項目本來就未讀時不重複計入未讀數
+        const existing = document.querySelector(
+            `#notification-dropdown-list [data-notification-id="${data.notification.id}"]`);
+        const wasUnread = existing !== null && existing.classList.contains('unread');
+        if (existing) {
+            existing.remove();
+        }
         addNotificationToDropdown(data.notification, true); // Prepend new WS notifications
+        rememberNotificationCursor(data.notification.cursor);
 
-        unreadNotificationCount++;
+        // 補送的通知（data.replayed）之後伺服器會送出完整的未讀數，這裡不必自行累加
+        if (typeof data.unread_count === 'number') {
+            unreadNotificationCount = data.unread_count;
+        } else if (!wasUnread && !data.replayed) {
+            unreadNotificationCount++;
+        }
         updateUnreadCountDisplay(); // Update bell icon indicator
     };
 
     notificationSocket.onclose = function(e) {
         console.error('Notification WebSocket closed. Code:', e.code);
+        clearInterval(presenceHeartbeat);
         if (e.code !== 1000) {
             var delay = Math.min(1000 * Math.pow(2, wsReconnectAttempts), 30000);
             wsReconnectAttempts++;
@@ -52,6 +106,8 @@ function initializeNotificationWebSocket(userId) {
 // --- 通知指示器和下拉列表相關函數 ---
 let unreadNotificationCount = 0;
 const MAX_DROPDOWN_NOTIFICATIONS = 15; // Max notifications to show in dropdown
+// 歷史通知只在第一次打開面板時載入；未讀數由 WebSocket 提供，頁面載入不查歷史
+let historicalNotificationsLoaded = false;
 
 // Function to get CSRF token
 function getCookie(name) {
@@ -184,6 +240,8 @@ function formatNotificationHTML(notification) {
     let link = notification.link || (payload && payload.url) || '#';
     let typeForClass = notificationType || 'generic-notification';
     let thumbnailHTML = "";
+    // 合併通知的則數；內容為其中最新一則
+    const count = notification.count || 1;
 
     if (typeof payload === 'object' && payload !== null) {
         if ((!notification.link || notification.link === '#') && payload.video_id) {
@@ -210,17 +268,17 @@ function formatNotificationHTML(notification) {
                 thumbnailHTML = `<img class="notification-thumbnail" src="${escapeHTML(payload.thumbnail_url)}" alt="影片縮圖">`;
             }
         } else if (notificationType === 'new_reply') {
-            title = "您的留言有新回覆！";
+            title = count > 1 ? `您的留言有 ${count} 則新回覆！` : "您的留言有新回覆！";
             detailsHTML = buildCommentNotificationHTML(
                 payload.replier_name || 'N/A', payload.video_title || 'N/A',
                 '回覆了您', payload.comment_content || '');
         } else if (notificationType === 'new_comment_on_video') {
-            title = "您的影片有新留言！";
+            title = count > 1 ? `您的影片有 ${count} 則新留言！` : "您的影片有新留言！";
             detailsHTML = buildCommentNotificationHTML(
                 payload.commenter_name || 'N/A', payload.video_title || 'N/A',
                 '留言', payload.comment_content || '');
         } else if (notificationType === 'new_subscription') {
-            title = "有新的訂閱者！";
+            title = count > 1 ? `有 ${count} 位新的訂閱者！` : "有新的訂閱者！";
             detailsHTML = `
                 <span class="notification-detail-line">
                     <span class="notification-detail-value"><strong>${escapeHTML(payload.subscriber_name)}</strong> 訂閱了您的頻道</span>
@@ -324,19 +382,16 @@ async function fetchAndDisplayHistoricalNotifications() {
         const dropdownList = document.getElementById('notification-dropdown-list');
         if(dropdownList) dropdownList.innerHTML = ''; // Clear previous items before loading new ones
 
-        let currentUnreadCount = 0;
         // Reverse the array from server (newest-first) to process oldest-first.
         // Then, use prepend in addNotificationToDropdown (by passing true).
         // This ensures that when iterating oldest-first and prepending,
         // the newest items correctly end up at the top of the dropdown.
+        // 未讀數不從這 50 則推算，以伺服器推播的計數為準
         notifications.reverse().forEach(notification => {
             addNotificationToDropdown(notification, true); // true for prepend
-            if (!notification.is_read) {
-                currentUnreadCount++;
-            }
         });
-        unreadNotificationCount = currentUnreadCount;
-        updateUnreadCountDisplay();
+        rememberNotificationCursor(data.data.newest_cursor);
+        historicalNotificationsLoaded = true;
 
     } catch (error) {
         console.error('Error fetching historical notifications:', error);
@@ -431,6 +486,9 @@ function toggleNotificationDropdown() {
             void dropdown.offsetHeight; // This is a common trick to trigger reflow
             dropdown.classList.add('visible'); // Add class to trigger transition in
             console.log("Dropdown showing: added 'visible' class.");
+            if (!historicalNotificationsLoaded) {
+                fetchAndDisplayHistoricalNotifications();
+            }
             // clearNotificationIndicator(); // Old way
             markAllNotificationsAsReadAPI(); // New: Mark all as read when dropdown is opened
         }
@@ -512,7 +570,6 @@ document.addEventListener('DOMContentLoaded', function() {
     // For testing, you might declare: let currentLoggedInUserId = 'your_user_id'; at the top of this script or in HTML.
     if (typeof currentLoggedInUserId !== 'undefined' && currentLoggedInUserId) {
         initializeNotificationWebSocket(currentLoggedInUserId);
-        fetchAndDisplayHistoricalNotifications(); // Fetch historical notifications
     } else {
         // 嘗試從元素讀取 (作為備案)
         const userIdElement = document.getElementById('current-user-id-data'); // 假設您有一個元素儲存ID
@@ -520,9 +577,8 @@ document.addEventListener('DOMContentLoaded', function() {
             // Make currentLoggedInUserId globally available if found this way
             window.currentLoggedInUserId = userIdElement.dataset.userId;
             initializeNotificationWebSocket(window.currentLoggedInUserId);
-            fetchAndDisplayHistoricalNotifications(); // Fetch historical notifications
         } else {
-            console.log("Current user ID not found. Notification WebSocket and historical fetch not initialized.");
+            console.log("Current user ID not found. Notification WebSocket not initialized.");
         }
     }
 });
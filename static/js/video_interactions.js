@@ -34,10 +34,12 @@ function updateRepliesToggleText(btn, expanded) {
     }
 }
 
-function loadReplies(commentId, page, replace) {
+function loadReplies(commentId, cursor, replace) {
     var container = document.getElementById('replies-to-' + commentId);
     var base = document.getElementById('comments-list').dataset.repliesUrlBase;
-    var url = base.replace('/0/', '/' + commentId + '/') + '?page=' + page;
+    var url = base.replace('/0/', '/' + commentId + '/');
+    // cursor 為上一頁最後一則回覆的位置（keyset 分頁）；展開時從頭載入
+    if (cursor) url += '?after=' + encodeURIComponent(cursor);
 
     fetch(url)
         .then(function(response) { return response.json(); })
@@ -54,10 +56,11 @@ function loadReplies(commentId, page, replace) {
                 container.insertAdjacentHTML('beforeend',
                     '<button type="button" class="button button-secondary button-small show-more-replies">Show more replies</button>');
                 container.querySelector('.show-more-replies').addEventListener('click', function() {
-                    loadReplies(commentId, data.next_page, false);
+                    loadReplies(commentId, data.next_cursor, false);
                 });
             }
             bindReplyForms(container);
+            bindCommentLikes(container);
             container.style.display = 'block';
         })
         .catch(function(error) {
@@ -82,18 +85,49 @@ function bindRepliesToggles(scope) {
                 updateRepliesToggleText(btn, true);
             } else {
                 btn.dataset.loaded = 'true';
-                loadReplies(commentId, 1, true);
+                loadReplies(commentId, null, true);
                 updateRepliesToggleText(btn, true);
             }
         });
     });
 }
 
+function bindCommentLikes(scope) {
+    var base = document.getElementById('comments-list').dataset.likeUrlBase;
+    scope.querySelectorAll('.comment-like-btn').forEach(function(btn) {
+        if (btn.dataset.listenerAttached) return;
+        btn.dataset.listenerAttached = 'true';
+        btn.addEventListener('click', function() {
+            var commentId = btn.dataset.commentId;
+            btn.disabled = true;
+            fetch(base.replace('/0/', '/' + commentId + '/'), {
+                method: 'POST',
+                headers: { 'X-CSRFToken': window.csrftoken, 'X-Requested-With': 'XMLHttpRequest' }
+            })
+            .then(function(response) { return response.json(); })
+            .then(function(data) {
+                if (data.status === 'success') {
+                    btn.classList.toggle('active', data.liked);
+                    var count = document.getElementById('comment-like-count-' + commentId);
+                    if (count) count.textContent = data.like_count;
+                } else {
+                    showToast('Error: ' + data.message);
+                }
+            })
+            .catch(function(error) {
+                console.error('Error liking comment:', error);
+                showToast('An unexpected error occurred.');
+            })
+            .finally(function() { btn.disabled = false; });
+        });
+    });
+}
+
 function initLoadMoreComments() {
     var btn = document.getElementById('load-more-comments');
     if (!btn) return;
     btn.addEventListener('click', function() {
-        var url = btn.dataset.url + '?page=' + btn.dataset.nextPage;
+        var url = btn.dataset.url + '?after=' + encodeURIComponent(btn.dataset.nextCursor) + '&sort=' + btn.dataset.sort;
         if (btn.dataset.exclude) url += '&exclude=' + btn.dataset.exclude;
         btn.disabled = true;
         fetch(url)
@@ -107,8 +141,9 @@ function initLoadMoreComments() {
                 commentsList.insertAdjacentHTML('beforeend', data.html);
                 bindReplyForms(commentsList);
                 bindRepliesToggles(commentsList);
+                bindCommentLikes(commentsList);
                 if (data.has_next) {
-                    btn.dataset.nextPage = data.next_page;
+                    btn.dataset.nextCursor = data.next_cursor;
                     btn.disabled = false;
                 } else {
                     btn.remove();
@@ -157,6 +192,7 @@ function handleCommentSubmission(form, isReply) {
                         parentReplies.insertAdjacentHTML('beforeend', data.comment_html);
                         parentReplies.style.display = 'block';
                         bindReplyForms(parentReplies);
+                        bindCommentLikes(parentReplies);
                         var toggleBtn = document.querySelector('.replies-toggle-btn[data-comment-id="' + data.parent_comment_id + '"]');
                         if (toggleBtn) {
                             toggleBtn.dataset.count = parseInt(toggleBtn.dataset.count || '0', 10) + 1;
@@ -170,6 +206,7 @@ function handleCommentSubmission(form, isReply) {
                     var newComment = document.getElementById('comment-' + data.comment_id);
                     if (newComment) {
                         bindReplyForms(newComment);
+                        bindCommentLikes(newComment);
                         bindRepliesToggles(newComment);
                     }
                 }
@@ -279,6 +316,7 @@ document.addEventListener('DOMContentLoaded', function() {
 
     bindReplyForms(document);
     bindRepliesToggles(document);
+    bindCommentLikes(document);
     initLoadMoreComments();
     initVoteForm();
     initSubscribeForm();
@@ -1,5 +1,5 @@
 from django.contrib.auth.models import User
-from django.db import models
+from django.db import models, transaction
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 
@@ -20,8 +20,15 @@ class UserProfile(models.Model):
         return self.subscriber_count
 
     def refresh_subscriber_count(self):
+        from videos.feeds import TIMELINE_PULL_THRESHOLD  # 函式內 import，避免跨 app 的模組層級循環相依
+        from videos.tasks import invalidate_subscriber_timelines
+
+        previous = self.subscriber_count
         self.subscriber_count = Subscription.objects.filter(subscribed_to=self.user).count()
         self.save(update_fields=["subscriber_count"])
+        if previous >= TIMELINE_PULL_THRESHOLD > self.subscriber_count:
+            # 跌回門檻以下：當大頻道期間的影片不在訂閱者的 timeline 中，讓它們重建
+            transaction.on_commit(lambda: invalidate_subscriber_timelines.delay(self.user_id))
 
 
 @receiver(post_save, sender=User)
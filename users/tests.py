@@ -720,7 +720,7 @@ class UserChannelViewTests(TestCase):
 
     def test_user_channel_view_pagination(self):
         """
-        測試頻道頁分頁：與其他列表頁一致，每頁 12 部影片。
+        測試頻道頁分頁：與其他列表頁一致，每頁 12 部影片，以 cursor 翻頁。
         """
         for i in range(13):
             Video.objects.create(
@@ -735,9 +735,13 @@ class UserChannelViewTests(TestCase):
         self.assertEqual(len(response.context["user_videos"]), 12)
         self.assertEqual(response.context["page_obj"].paginator.count, 13)
 
-        response = self.client.get(reverse("users:channel", kwargs={"username": "channelowner"}), {"page": 2})
+        next_cursor = response.context["page_obj"].next_cursor
+        response = self.client.get(
+            reverse("users:channel", kwargs={"username": "channelowner"}), {"after": next_cursor}
+        )
         self.assertEqual(response.status_code, 200)
         self.assertEqual(len(response.context["user_videos"]), 1)
+        self.assertFalse(response.context["page_obj"].has_next())
 
     def test_user_channel_view_displays_videos(self):
         """
@@ -1,13 +1,13 @@
 from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
 from django.db import IntegrityError, transaction
 from django.shortcuts import redirect, render
 from django_ratelimit.decorators import ratelimit
 
 from interactions.models import Subscription
 from videos.models import Video
+from videos.pagination import KeysetPaginator
 
 from .forms import UserEditForm, UserLoginForm, UserProfileForm, UserRegistrationForm
 from .models import UserProfile
@@ -105,7 +105,7 @@ def user_channel_view(request, username):
         # Corrected to use UserProfile to find the user, then get videos
         profile_owner_profile = UserProfile.objects.get(user__username=username)
         profile_owner = profile_owner_profile.user
-        user_videos = Video.objects.filter(uploader=profile_owner).select_related("uploader").order_by("-upload_date")
+        user_videos = Video.objects.filter(uploader=profile_owner).select_related("uploader")
         # 訪客只能看到 public 影片；private/unlisted 只在本人查看自己頻道時列出
         if request.user != profile_owner:
             user_videos = user_videos.listable()
@@ -118,8 +118,11 @@ def user_channel_view(request, username):
     if request.user.is_authenticated and request.user != profile_owner:
         is_subscribed = Subscription.objects.filter(subscriber=request.user, subscribed_to=profile_owner).exists()
 
-    # 與其他列表頁一致的分頁（首頁/搜尋/分類/標籤皆為每頁 12 部）
-    page_obj = Paginator(user_videos, 12).get_page(request.GET.get("page"))
+    # 與其他列表頁一致的 keyset 分頁（每頁 12 部）；頻道頁顯示的影片總數走快取（本人與訪客看到的數量不同，分開快取）
+    viewer = "owner" if request.user == profile_owner else "visitor"
+    page_obj = KeysetPaginator(user_videos, 12, count_key=f"channel:{profile_owner.id}:{viewer}").get_page(
+        after=request.GET.get("after"), before=request.GET.get("before")
+    )
 
     return render(
         request,
@@ -0,0 +1,107 @@
+"""影片卡片快取：列表頁只需要卡片欄位，以 cache.get_many 一次取回整頁。
+
+兩層快取：
+- 卡片資料：feed（見 videos/feeds.py）只存影片 id，顯示前以這裡把 id 還原成 Video instance。
+- 卡片 HTML：每部影片渲染好的卡片片段，列表模板以 {% video_cards %} 一次取回整頁，
+  暖快取時不再逐張 include 模板、解析 thumbnail.url 與上傳者名稱。
+
+cache miss 的部分才查資料庫/渲染並回填。影片或上傳者變更時由 signal 刪除對應卡片。
+"""
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+from django.utils.timesince import timesince
+
+from .models import Video
+
+# views_count 以 queryset.update 累加、不觸發 signal，卡片上的觀看數最多落後這麼久
+CARD_CACHE_TIMEOUT = 60 * 5
+
+# 卡片模板或片段格式變更時加一，舊版片段自然過期，不需手動清快取
+FRAGMENT_VERSION = 1
+# 片段樣式 -> (模板, 額外 context)
+FRAGMENT_VARIANTS = {
+    "grid": ("videos/_video_card.html", {"show_uploader": True}),
+    "channel": ("videos/_video_card.html", {"show_uploader": False}),
+    "upnext": ("videos/_upnext_card.html", {}),
+}
+# 「幾分鐘前」隨時間變化，不能跟著片段快取；渲染時留佔位，輸出時才代入
+_AGE_PLACEHOLDER = "<!--video-age-->"
+
+_CARD_FIELDS = ("id", "title", "thumbnail", "views_count", "upload_date", "visibility", "category_id", "uploader_id")
+
+
+def card_cache_key(video_id):
+    return f"videos:card:{video_id}"
+
+
+def serialize_card(video):
+    data = {field: getattr(video, field) for field in _CARD_FIELDS}
+    data["thumbnail"] = video.thumbnail.name or ""
+    data["uploader_username"] = video.uploader.username
+    return data
+
+
+def _build_video(data):
+    """由卡片資料建出 Video instance；未快取的欄位為 deferred，真的存取時才會查詢。"""
+    # from_db 要求 values 依 model 欄位定義順序排列
+    field_names = [field.attname for field in Video._meta.concrete_fields if field.attname in data]
+    video = Video.from_db("default", field_names, [data[name] for name in field_names])
+    video.uploader = User.from_db("default", ["id", "username"], [data["uploader_id"], data["uploader_username"]])
+    return video
+
+
+def get_video_cards(video_ids):
+    """依 video_ids 順序回傳 Video instance；已不存在的影片直接略過。"""
+    keys = {video_id: card_cache_key(video_id) for video_id in video_ids}
+    cached = cache.get_many(keys.values())
+
+    missing = [video_id for video_id, key in keys.items() if key not in cached]
+    if missing:
+        fresh = {
+            card_cache_key(video.id): serialize_card(video)
+            for video in Video.objects.filter(id__in=missing).select_related("uploader")
+        }
+        cache.set_many(fresh, CARD_CACHE_TIMEOUT)
+        cached.update(fresh)
+
+    return [_build_video(cached[key]) for key in keys.values() if key in cached]
+
+
+def fragment_cache_key(video_id, variant):
+    return f"videos:card_html:v{FRAGMENT_VERSION}:{variant}:{video_id}"
+
+
+def render_video_cards(videos, variant="grid"):
+    """渲染一整頁影片卡片；已快取的片段以一次 get_many 取回，只渲染 miss 的部分。"""
+    template_name, extra_context = FRAGMENT_VARIANTS[variant]
+    videos = list(videos)
+    keys = [fragment_cache_key(video.id, variant) for video in videos]
+    cached = cache.get_many(keys)
+
+    fresh = {}
+    for video, key in zip(videos, keys, strict=True):
+        if key not in cached:
+            context = {"video": video, "age": mark_safe(_AGE_PLACEHOLDER), **extra_context}
+            fresh[key] = render_to_string(template_name, context)
+    if fresh:
+        cache.set_many(fresh, CARD_CACHE_TIMEOUT)
+        cached.update(fresh)
+
+    return mark_safe(
+        "".join(
+            cached[key].replace(_AGE_PLACEHOLDER, escape(timesince(video.upload_date)))
+            for video, key in zip(videos, keys, strict=True)
+        )
+    )
+
+
+def invalidate_cards(video_ids):
+    keys = []
+    for video_id in video_ids:
+        keys.append(card_cache_key(video_id))
+        keys.extend(fragment_cache_key(video_id, variant) for variant in FRAGMENT_VARIANTS)
+    cache.delete_many(keys)
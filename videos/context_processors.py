@@ -1,6 +1,40 @@
+import time
+
+from django.core.cache import cache
+
 from .models import Category
 
+# 分類清單每個 HTML 回應都要用、又極少變動：先查 process 內副本，過期才查 Redis，Redis 沒有才查資料庫。
+# 分類新增/修改/刪除 commit 後由 signal 清掉 Redis 與當前 process 的副本；其他 process 最多晚這麼久看到變更
+NAV_CATEGORIES_LOCAL_TIMEOUT = 30
+# Redis 副本的 TTL 只是兜底：失效與並行請求的回寫交錯而寫回舊清單時，最多留這麼久
+NAV_CATEGORIES_CACHE_TIMEOUT = 60 * 5
+NAV_CATEGORIES_CACHE_KEY = "videos:nav_categories"
+
+# (過期時間, 分類 list)；整個 tuple 一次替換，多執行緒下不會讀到一半
+_local_nav_categories = (0.0, None)
+
+
+def get_nav_categories():
+    global _local_nav_categories
+    expires_at, nav_categories = _local_nav_categories
+    if nav_categories is not None and time.monotonic() < expires_at:
+        return nav_categories
+
+    nav_categories = cache.get(NAV_CATEGORIES_CACHE_KEY)
+    if nav_categories is None:
+        nav_categories = list(Category.objects.order_by("name"))
+        cache.set(NAV_CATEGORIES_CACHE_KEY, nav_categories, timeout=NAV_CATEGORIES_CACHE_TIMEOUT)
+    _local_nav_categories = (time.monotonic() + NAV_CATEGORIES_LOCAL_TIMEOUT, nav_categories)
+    return nav_categories
+
+
+def invalidate_nav_categories():
+    global _local_nav_categories
+    _local_nav_categories = (0.0, None)
+    cache.delete(NAV_CATEGORIES_CACHE_KEY)
+
 
 def categories(request):
     """提供側欄與分類列使用的全站分類清單。"""
-    return {"nav_categories": Category.objects.order_by("name")}
+    return {"nav_categories": get_nav_categories()}
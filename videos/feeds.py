@@ -0,0 +1,294 @@
+"""首頁、分類頁與訂閱頁的預先計算 feed。
+
+最新公開影片的 id 依上傳時間存在 Redis sorted set（score 為上傳時間的整數微秒），
+由 signal 在影片發布、可見度/分類變更、刪除時增量維護；讀取時只查 Redis 與卡片快取
+（見 videos/cards.py），不碰資料庫。feed 只保留最新 FEED_MAX_LENGTH 部，
+翻到更深的頁面或 Redis 不可用時退回資料庫 keyset 分頁。
+
+訂閱頁是每位使用者各自的 timeline（fan-out on write）：新影片轉檔完成、
+notify_subscribers_of_new_video 分段（notify_subscriber_range）通知訂閱者時一併寫入各訂閱者的 timeline。
+訂閱數超過 TIMELINE_PULL_THRESHOLD 的頻道不寫入（一次要寫數十萬份），
+改在讀取時從資料庫拉這些頻道的最新影片與 timeline 合併（fan-out on read）。
+頻道訂閱數跌回門檻以下時，它當大頻道期間的影片不在任何 timeline 中、也不再被拉取，
+所以刪除其訂閱者的 timeline，下次讀取時從資料庫重建（見 tasks.invalidate_subscriber_timelines）。
+"""
+
+import logging
+from functools import cache
+
+import redis
+from django.db.models import Q
+
+from youtube_service.redis_client import get_redis
+
+from .cards import get_video_cards
+from .models import Video
+from .pagination import KeysetPage, KeysetPaginator, decode_cursor, to_epoch_micros
+
+logger = logging.getLogger(__name__)
+
+LATEST_FEED_KEY = "feed:latest"
+FEED_MAX_LENGTH = 1000
+# 增量維護若因 Redis 暫時失敗而漏掉，feed 過期後下次讀取會整份重建
+FEED_TTL = 60 * 60 * 24
+
+TIMELINE_MAX_LENGTH = 500
+# 不活躍使用者的 timeline 過期後不再被 fan-out 寫入（只寫已存在的 timeline），下次造訪時重建
+TIMELINE_TTL = 60 * 60 * 24 * 7
+# 訂閱數達此門檻的頻道改為讀取時拉取，不 fan-out 寫入每位訂閱者的 timeline
+TIMELINE_PULL_THRESHOLD = 10_000
+
+# score 為 -inf 的佔位成員：讓「沒有影片的 feed」與「尚未建立的 feed」可以區分，避免空分類每次都重建
+_SENTINEL = "_"
+
+# feed 已建立才增量加入並裁切長度；feed 不存在時留給下次讀取整份重建，避免建出只有一筆的 feed
+_ADD_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    redis.call('ZADD', KEYS[1], ARGV[1], ARGV[2])
+    redis.call('ZREMRANGEBYRANK', KEYS[1], 1, -(tonumber(ARGV[3]) + 1))
+end
+"""
+
+
+@cache
+def _add_script():
+    return get_redis().register_script(_ADD_SCRIPT)
+
+
+def category_feed_key(category_id):
+    return f"feed:category:{category_id}"
+
+
+def timeline_key(user_id):
+    return f"timeline:{user_id}"
+
+
+def _member(video_id):
+    """補零讓同一 score 的成員字典序等於 id 數值序，與資料庫 (-upload_date, -id) 排序一致。"""
+    return f"{video_id:012d}"
+
+
+def _video_ids(members):
+    return [int(member) for member in members if member != _SENTINEL]
+
+
+def feed_keys_for(video):
+    keys = [LATEST_FEED_KEY]
+    if video.category_id:
+        keys.append(category_feed_key(video.category_id))
+    return keys
+
+
+def _push(pipe, key, video, max_length):
+    _add_script()(keys=[key], args=[to_epoch_micros(video.upload_date), _member(video.id), max_length], client=pipe)
+
+
+def sync_video(video, category_ids=()):
+    """依影片目前狀態更新 feed：可列出就加入首頁與所屬分類 feed，並從 category_ids 中其他分類的 feed 移除。
+
+    新影片不需傳 category_ids；編輯時傳入所有分類 id，才能把換分類或轉為非公開的影片從舊 feed 移除。
+    """
+    keep = set(feed_keys_for(video)) if video.is_listable else set()
+    stale = {LATEST_FEED_KEY, *(category_feed_key(category_id) for category_id in category_ids)} - keep
+    pipe = get_redis().pipeline(transaction=False)
+    for key in stale:
+        pipe.zrem(key, _member(video.id))
+    for key in keep:
+        _push(pipe, key, video, FEED_MAX_LENGTH)
+    pipe.execute()
+
+
+def remove_video(video_id, category_id=None):
+    """從首頁與所屬分類的 feed 移除影片（刪除時）。"""
+    pipe = get_redis().pipeline(transaction=False)
+    pipe.zrem(LATEST_FEED_KEY, _member(video_id))
+    if category_id:
+        pipe.zrem(category_feed_key(category_id), _member(video_id))
+    pipe.execute()
+
+
+def rebuild_feed(key, queryset, max_length=None, ttl=None):
+    """以資料庫內容整份重建 feed；長度與 TTL 預設為首頁/分類 feed 的設定。"""
+    max_length = max_length or FEED_MAX_LENGTH
+    ttl = ttl or FEED_TTL
+    rows = queryset.order_by("-upload_date", "-id").values_list("id", "upload_date")[:max_length]
+    mapping = {_SENTINEL: float("-inf")}
+    mapping.update({_member(video_id): to_epoch_micros(upload_date) for video_id, upload_date in rows})
+    pipe = get_redis().pipeline()
+    pipe.delete(key)
+    pipe.zadd(key, mapping)
+    pipe.expire(key, ttl)
+    pipe.execute()
+
+
+def push_to_timelines(video, subscriber_ids):
+    """把新影片寫入一批訂閱者的 timeline（fan-out 每批呼叫一次，一個 pipeline 一次往返）。"""
+    pipe = get_redis().pipeline(transaction=False)
+    for subscriber_id in subscriber_ids:
+        _push(pipe, timeline_key(subscriber_id), video, TIMELINE_MAX_LENGTH)
+    pipe.execute()
+
+
+def invalidate_timeline(user_id):
+    """訂閱/取消訂閱後 timeline 內容整個過時，刪除後下次讀取重建。"""
+    get_redis().delete(timeline_key(user_id))
+
+
+def invalidate_timelines(user_ids):
+    """一次刪除多位使用者的 timeline（頻道跌破 TIMELINE_PULL_THRESHOLD 時），下次讀取重建。"""
+    keys = [timeline_key(user_id) for user_id in user_ids]
+    if keys:
+        get_redis().delete(*keys)
+
+
+class FeedPaginator:
+    """以 feed 服務的 keyset 分頁器；cursor 格式與 KeysetPaginator 相同，兩者可無縫互換。
+
+    queryset 是 feed 的資料庫定義（重建與退回查詢皆以它為準），需只含可列出的影片。
+    """
+
+    def __init__(self, key, queryset, per_page):
+        self.key = key
+        self.per_page = per_page
+        self.fallback = KeysetPaginator(queryset, per_page)
+
+    @property
+    def count(self):
+        return self.fallback.count
+
+    def cursor_for(self, obj):
+        return self.fallback.cursor_for(obj)
+
+    def get_page(self, after=None, before=None):
+        try:
+            page = self._get_feed_page(after, before)
+        except redis.RedisError:
+            logger.warning("讀取 feed %s 失敗，改查資料庫", self.key, exc_info=True)
+            page = None
+        if page is None:
+            return self.fallback.get_page(after=after, before=before)
+        return page
+
+    def _get_feed_page(self, after, before):
+        """回傳 None 表示 feed 無法服務這一頁（cursor 已不在 feed 內，或已翻過 feed 保留的範圍）。"""
+        client = get_redis()
+        size = client.zcard(self.key)
+        if size == 0:
+            rebuild_feed(self.key, self.fallback.queryset)
+            size = client.zcard(self.key)
+        truncated = size - 1 >= FEED_MAX_LENGTH
+
+        after_key, before_key = decode_cursor(after), decode_cursor(before)
+
+        if before_key and not after_key:
+            rank = client.zrevrank(self.key, _member(before_key[1]))
+            if rank is None:
+                return None
+            start = max(0, rank - self.per_page)
+            video_ids = _video_ids(client.zrevrange(self.key, start, rank - 1)) if rank else []
+            return KeysetPage(get_video_cards(video_ids), self, has_next=True, has_previous=start > 0)
+
+        start = 0
+        if after_key:
+            rank = client.zrevrank(self.key, _member(after_key[1]))
+            if rank is None:
+                return None
+            start = rank + 1
+        video_ids = _video_ids(client.zrevrange(self.key, start, start + self.per_page))
+        if truncated and len(video_ids) <= self.per_page:
+            return None
+        has_next = len(video_ids) > self.per_page
+        videos = get_video_cards(video_ids)[: self.per_page]
+        return KeysetPage(videos, self, has_next=has_next, has_previous=after_key is not None)
+
+
+def subscribed_videos(user, pulled):
+    """user 訂閱頻道的可列出影片；pulled 為 True 只含讀取時拉取的大頻道，False 只含 fan-out 寫入的頻道。"""
+    from interactions.models import Subscription  # 函式內 import，避免跨 app 的模組層級循環相依
+
+    channels = Subscription.objects.filter(subscriber=user)
+    big = Q(subscribed_to__profile__subscriber_count__gte=TIMELINE_PULL_THRESHOLD)
+    channels = channels.filter(big if pulled else ~big)
+    return Video.objects.listable().filter(uploader__in=channels.values("subscribed_to"))
+
+
+class TimelinePaginator:
+    """訂閱頁分頁器：fan-out 寫入的 timeline 與大頻道的資料庫查詢各取一頁後合併。
+
+    cursor 格式與 KeysetPaginator 相同；timeline 已被裁切而翻過保留範圍、或 Redis 不可用時，
+    整頁退回資料庫查詢所有訂閱頻道。
+    """
+
+    def __init__(self, user, per_page):
+        self.user = user
+        self.per_page = per_page
+        self.key = timeline_key(user.id)
+        self.fallback = KeysetPaginator(
+            Video.objects.listable().filter(uploader__subscribers__subscriber=user).select_related("uploader"),
+            per_page,
+        )
+
+    def cursor_for(self, obj):
+        return self.fallback.cursor_for(obj)
+
+    def get_page(self, after=None, before=None):
+        try:
+            page = self._get_timeline_page(after, before)
+        except redis.RedisError:
+            logger.warning("讀取 timeline %s 失敗，改查資料庫", self.key, exc_info=True)
+            page = None
+        if page is None:
+            return self.fallback.get_page(after=after, before=before)
+        return page
+
+    def _timeline_entries(self, client, key, forward):
+        """從 timeline 取 cursor 之後（forward）或之前的 per_page + 1 筆 (score, id)，依翻頁方向排序。"""
+        limit = self.per_page + 1
+        if key is None:
+            members = client.zrevrange(self.key, 0, limit - 1, withscores=True)
+        else:
+            micros = to_epoch_micros(key[0])
+            # 同一微秒的成員要在 Python 端以 id 比較，多取這些筆才不會漏
+            ties = client.zcount(self.key, micros, micros)
+            if forward:
+                members = client.zrevrangebyscore(self.key, micros, "-inf", start=0, num=limit + ties, withscores=True)
+            else:
+                members = client.zrangebyscore(self.key, micros, "+inf", start=0, num=limit + ties, withscores=True)
+        entries = [(int(score), int(member)) for member, score in members if member != _SENTINEL]
+        if key is not None:
+            cursor = (to_epoch_micros(key[0]), key[1])
+            entries = [entry for entry in entries if (entry < cursor) == forward and entry != cursor]
+        return entries[:limit]
+
+    def _pulled_entries(self, key, forward):
+        """大頻道的影片直接查資料庫（只有少數頻道，走 uploader + upload_date 索引）。"""
+        queryset = subscribed_videos(self.user, pulled=True)
+        if key is not None:
+            queryset = queryset.filter(self.fallback._beyond(key, forward=forward))
+        rows = queryset.order_by(*self.fallback._ordering(forward)).values_list("upload_date", "id")
+        return [(to_epoch_micros(upload_date), video_id) for upload_date, video_id in rows[: self.per_page + 1]]
+
+    def _get_timeline_page(self, after, before):
+        client = get_redis()
+        size = client.zcard(self.key)
+        if size == 0:
+            rebuild_feed(self.key, subscribed_videos(self.user, pulled=False), TIMELINE_MAX_LENGTH, TIMELINE_TTL)
+            size = client.zcard(self.key)
+        truncated = size - 1 >= TIMELINE_MAX_LENGTH
+
+        after_key, before_key = decode_cursor(after), decode_cursor(before)
+        forward = not (before_key and not after_key)
+        key = after_key if forward else before_key
+
+        timeline = self._timeline_entries(client, key, forward)
+        if forward and truncated and len(timeline) <= self.per_page:
+            return None
+        # 頻道跨過門檻前寫入的影片可能同時出現在兩邊，以 id 去重
+        merged = sorted(set(timeline) | set(self._pulled_entries(key, forward)), reverse=forward)
+        video_ids = [video_id for _, video_id in merged[: self.per_page]]
+        has_more = len(merged) > self.per_page
+
+        videos = [card for card in get_video_cards(video_ids) if card.is_listable]
+        if forward:
+            return KeysetPage(videos, self, has_next=has_more, has_previous=after_key is not None)
+        return KeysetPage(videos[::-1], self, has_next=True, has_previous=has_more)
@@ -0,0 +1,19 @@
+# Generated by Django 6.0.6 on 2026-10-19 04:06
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("taggit", "0006_rename_taggeditem_content_type_object_id_taggit_tagg_content_8fc721_idx"),
+        ("videos", "0009_video_video_title_trgm_idx_video_video_desc_trgm_idx"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="video",
+            index=models.Index(fields=["uploader", "-upload_date"], name="video_uploader_upload_idx"),
+        ),
+    ]
@@ -0,0 +1,115 @@
+# Generated by Django 6.0.6 on 2026-10-19 04:09
+
+import re
+import unicodedata
+from functools import reduce
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+import django.db.models.deletion
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations, models
+from django.db.models import Value
+
+BACKFILL_BATCH_SIZE = 1000
+
+# 以下為建立此 migration 當時 videos.search 的斷詞與文件組合，凍結在這裡：
+# 之後調整斷詞或文件格式時，這個歷史 migration 仍照原樣執行（新格式由重建任務另外套用）。
+_CJK_RANGES = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af"
+_TOKEN_RE = re.compile(rf"([{_CJK_RANGES}]+)|((?:(?![{_CJK_RANGES}])[^\W_])+)")
+
+
+def _document_tokens(text):
+    tokens = []
+    for cjk, word in _TOKEN_RE.findall(unicodedata.normalize("NFKC", text or "").lower()):
+        if word:
+            tokens.append(word)
+            continue
+        tokens.extend(cjk)
+        tokens.extend(cjk[i : i + 2] for i in range(len(cjk) - 1))
+    return tokens
+
+
+def _build_document(title, tags, category, uploader, description):
+    parts = (
+        (title, "A"),
+        (" ".join([*tags, category]), "B"),
+        (uploader, "C"),
+        (description, "D"),
+    )
+    return reduce(
+        lambda left, right: left + right,
+        (
+            SearchVector(Value(" ".join(_document_tokens(text))), config="simple", weight=weight)
+            for text, weight in parts
+        ),
+    )
+
+
+def backfill_search_documents(apps, schema_editor):
+    """為既有影片建立搜尋文件；之後由 signal 維護。"""
+    Video = apps.get_model("videos", "Video")
+    VideoSearchDocument = apps.get_model("videos", "VideoSearchDocument")
+    TaggedItem = apps.get_model("taggit", "TaggedItem")
+    ContentType = apps.get_model("contenttypes", "ContentType")
+
+    content_type = ContentType.objects.filter(app_label="videos", model="video").first()
+    rows = Video.objects.order_by("pk").values_list(
+        "id", "title", "description", "category__name", "uploader__username"
+    )
+    last_id = 0
+    while batch := list(rows.filter(pk__gt=last_id)[:BACKFILL_BATCH_SIZE]):
+        last_id = batch[-1][0]
+        tags = {}
+        if content_type:
+            for object_id, name in TaggedItem.objects.filter(
+                content_type=content_type, object_id__in=[row[0] for row in batch]
+            ).values_list("object_id", "tag__name"):
+                tags.setdefault(object_id, []).append(name)
+        VideoSearchDocument.objects.bulk_create(
+            [
+                VideoSearchDocument(
+                    video_id=video_id,
+                    document=_build_document(
+                        title, tags.get(video_id, ()), category or "", uploader or "", description
+                    ),
+                )
+                for video_id, title, description, category, uploader in batch
+            ],
+            update_conflicts=True,
+            unique_fields=["video"],
+            update_fields=["document"],
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("videos", "0010_video_uploader_upload_idx"),
+        ("taggit", "0006_rename_taggeditem_content_type_object_id_taggit_tagg_content_8fc721_idx"),
+        ("contenttypes", "0002_remove_content_type_name"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="VideoSearchDocument",
+            fields=[
+                (
+                    "video",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="search_document",
+                        serialize=False,
+                        to="videos.video",
+                    ),
+                ),
+                ("document", django.contrib.postgres.search.SearchVectorField()),
+            ],
+            options={
+                "indexes": [
+                    django.contrib.postgres.indexes.GinIndex(fields=["document"], name="video_search_doc_gin_idx")
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_search_documents, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 6.0.6 on 2026-10-19 04:30
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("videos", "0011_videosearchdocument"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="video",
+            name="video_title_trgm_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="video",
+            name="video_desc_trgm_idx",
+        ),
+    ]
@@ -1,8 +1,8 @@
 from django.conf import settings
 from django.contrib.auth.models import User
-from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
-from django.db.models.functions import Upper
 from django.utils import timezone
 from django.utils.encoding import filepath_to_uri
 from django.utils.text import slugify
@@ -85,15 +85,37 @@ class Video(models.Model):
         # 複合索引讓分頁查詢直接走索引；visibility 低基數單欄索引由此取代
         indexes = [
             models.Index(fields=["visibility", "-upload_date"], name="video_vis_upload_idx"),
-            # 搜尋/自動完成走 icontains，Postgres 編譯為 UPPER(col) LIKE，
-            # 故 trigram 索引必須建在 Upper() expression 上，建在欄位本身不會被使用
-            GinIndex(OpClass(Upper("title"), name="gin_trgm_ops"), name="video_title_trgm_idx"),
-            GinIndex(OpClass(Upper("description"), name="gin_trgm_ops"), name="video_desc_trgm_idx"),
+            # 頻道頁與訂閱頁拉取大頻道影片：WHERE uploader_id = ... ORDER BY upload_date DESC
+            models.Index(fields=["uploader", "-upload_date"], name="video_uploader_upload_idx"),
         ]
 
     def __str__(self):
         return self.title
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # 載入時的欄位值（attname -> 值）；signal 據此判斷換了哪個分類、是否剛轉為公開（見 videos/signals.py）
+        instance._saved_values = dict(zip(field_names, values, strict=True))
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._saved_values = {
+            field.attname: self.__dict__[field.attname]
+            for field in self._meta.concrete_fields
+            if field.attname in self.__dict__
+        }
+
+    def saved_value(self, attname, default=None):
+        """上次從資料庫載入或 save 時的欄位值；此實例沒有紀錄（如手動建構後直接 save）時回傳 default。"""
+        return getattr(self, "_saved_values", {}).get(attname, default)
+
+    @property
+    def is_listable(self):
+        """單筆版的 VideoQuerySet.listable()，兩者定義須一致。"""
+        return self.visibility == "public"
+
     def is_accessible_by(self, user):
         """單筆影片的存取規則：private 僅上傳者本人；public/unlisted 任何人（含匿名）可看。
 
@@ -121,3 +143,16 @@ class Video(models.Model):
             likes=models.Count("pk", filter=models.Q(type="like")),
             dislikes=models.Count("pk", filter=models.Q(type="dislike")),
         )
+
+
+class VideoSearchDocument(models.Model):
+    """影片的全文搜尋文件（斷詞與權重見 videos/search.py），由 signal 隨影片、標籤、上傳者、分類變更維護。"""
+
+    video = models.OneToOneField(Video, on_delete=models.CASCADE, primary_key=True, related_name="search_document")
+    document = SearchVectorField()
+
+    class Meta:
+        indexes = [GinIndex(fields=["document"], name="video_search_doc_gin_idx")]
+
+    def __str__(self):
+        return f"Search document for video {self.video_id}"
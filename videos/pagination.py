@@ -0,0 +1,224 @@
+"""列表頁分頁：keyset（cursor）分頁與快取總數。
+
+Django Paginator 每次載入都要 COUNT(*) 全部結果，再以 OFFSET 跳過前面的列，
+頁數越深越慢。keyset 分頁改以上一頁最後一筆的 (排序欄位, id) 當 cursor，
+查詢變成 WHERE (upload_date, id) < cursor ORDER BY ... LIMIT n，
+直接沿 video_vis_upload_idx 索引往下掃，任何深度的頁面成本都一樣。
+
+仍需要總數的頁面（搜尋的「第 X / N 頁」、頻道影片數）改用 cached_count：
+總數存在 Redis，影片發布/刪除時整批失效；大表在 cache miss 時以 planner 估計值取代精確 COUNT。
+"""
+
+import hashlib
+import json
+import math
+import time
+from collections.abc import Sequence
+from datetime import UTC, datetime, timedelta
+from functools import cached_property
+
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import FloatField, Q
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=UTC)
+_MICROSECOND = timedelta(microseconds=1)
+
+# 總數快取；影片發布/刪除會換 generation 讓所有總數（與搜尋結果快取）一起失效，TTL 只是兜底
+COUNT_CACHE_TIMEOUT = 60 * 10
+LISTING_GENERATION_KEY = "videos:count:generation"
+# 影片表估計列數超過此值時，cache miss 改用 planner 估計值，不再跑精確 COUNT
+EXACT_COUNT_MAX_ROWS = 100_000
+
+
+def invalidate_cached_counts():
+    """換一個 generation，讓所有列表總數與搜尋結果快取失效（影片發布、可見度變更、刪除時呼叫）。"""
+    try:
+        cache.incr(LISTING_GENERATION_KEY)
+    except ValueError:
+        # key 不存在（首次或被 evict）：以時間為起點，避免與 evict 前的舊 generation 撞號
+        cache.set(LISTING_GENERATION_KEY, time.time_ns(), timeout=None)
+
+
+def listing_generation():
+    generation = cache.get(LISTING_GENERATION_KEY)
+    if generation is None:
+        generation = time.time_ns()
+        if not cache.add(LISTING_GENERATION_KEY, generation, timeout=None):
+            generation = cache.get(LISTING_GENERATION_KEY, generation)
+    return generation
+
+
+def _table_row_estimate(db_table):
+    """pg_class.reltuples：ANALYZE/autovacuum 維護的列數估計，查 catalog 不掃表。從未 analyze 時為 -1。"""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT reltuples FROM pg_class WHERE oid = %s::regclass", [db_table])
+        row = cursor.fetchone()
+    return row[0] if row else -1
+
+
+def _planner_row_estimate(queryset):
+    """以 EXPLAIN 取得 planner 對此查詢的估計列數（只規劃不執行）。"""
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def estimate_count(queryset):
+    """小表跑精確 COUNT；大表用 planner 估計，避免 COUNT 掃過整個索引。"""
+    if queryset.query.is_empty():
+        return 0
+    if _table_row_estimate(queryset.model._meta.db_table) > EXACT_COUNT_MAX_ROWS:
+        return _planner_row_estimate(queryset.order_by())
+    return queryset.count()
+
+
+def cached_count(queryset, key, timeout=COUNT_CACHE_TIMEOUT):
+    """取得 queryset 的（近似）總數；key 需能唯一描述查詢條件，如 "search:<query>"。"""
+    digest = hashlib.md5(key.encode(), usedforsecurity=False).hexdigest()
+    cache_key = f"videos:count:{listing_generation()}:{digest}"
+    count = cache.get(cache_key)
+    if count is None:
+        count = estimate_count(queryset)
+        cache.set(cache_key, count, timeout)
+    return count
+
+
+def to_epoch_micros(value):
+    """datetime 轉成整數微秒；cursor 與 feed score 共用，避免浮點誤差讓同一時間點的列被跳過。"""
+    return (value - _EPOCH) // _MICROSECOND
+
+
+def encode_cursor(value, pk):
+    """(datetime 或 float, id) 編成 URL 安全的 cursor；float 以 repr 保留完整精度。"""
+    if isinstance(value, datetime):
+        value = to_epoch_micros(value)
+    return f"{value!r}_{pk}"
+
+
+def decode_cursor(cursor, numeric=False):
+    """解析 cursor，格式不合法時回傳 None（視同第一頁，不拋錯給使用者）。
+
+    numeric=True 時排序值為 float（如留言熱門分數），否則為 datetime。
+    """
+    if not cursor:
+        return None
+    value, sep, pk = cursor.partition("_")
+    if not sep:
+        return None
+    try:
+        if numeric:
+            value = float(value)
+            return (value, int(pk)) if math.isfinite(value) else None
+        return _EPOCH + int(value) * _MICROSECOND, int(pk)
+    except (ValueError, OverflowError):
+        return None
+
+
+class KeysetPage(Sequence):
+    """單頁結果；介面對齊 django.core.paginator.Page，模板與既有 view 測試可直接沿用。"""
+
+    def __init__(self, object_list, paginator, *, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return f"<KeysetPage ({len(self.object_list)} items)>"
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        if not self._has_next or not self.object_list:
+            return None
+        return self.paginator.cursor_for(self.object_list[-1])
+
+    @property
+    def previous_cursor(self):
+        if not self._has_previous or not self.object_list:
+            return None
+        return self.paginator.cursor_for(self.object_list[0])
+
+
+class KeysetPaginator:
+    """以 (field, id) 為 key 的 cursor 分頁器。
+
+    queryset 不需事先排序，排序由分頁器依 field/descending 決定（id 作為同時間點的 tie-breaker）。
+    count 為 lazy：只有模板真的需要總數（如頻道頁的影片數）時才會查詢；
+    給定 count_key 時改走 cached_count。
+    """
+
+    def __init__(self, queryset, per_page, *, field="upload_date", descending=True, count_key=None):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.field = field
+        self.descending = descending
+        self.count_key = count_key
+
+    @cached_property
+    def count(self):
+        if self.count_key:
+            return cached_count(self.queryset, self.count_key)
+        return self.queryset.count()
+
+    def cursor_for(self, obj):
+        return encode_cursor(getattr(obj, self.field), obj.pk)
+
+    def _ordering(self, descending):
+        prefix = "-" if descending else ""
+        return [f"{prefix}{self.field}", f"{prefix}id"]
+
+    def _beyond(self, key, forward):
+        """cursor 之後（forward）或之前的列；方向與排序方向組合出嚴格大於或小於。
+
+        OR 條件本身無法當成索引範圍，另外 AND 上 field <= / >= value 的界線，
+        讓 planner 從 cursor 位置開始掃索引，而不是從頭掃再逐列過濾掉 cursor 之前的部分。
+        """
+        value, pk = key
+        op = "lt" if forward == self.descending else "gt"
+        bound = Q(**{f"{self.field}__{op}e": value})
+        return bound & (Q(**{f"{self.field}__{op}": value}) | Q(**{self.field: value, f"id__{op}": pk}))
+
+    def get_page(self, after=None, before=None):
+        """after 取 cursor 之後的一頁，before 取 cursor 之前的一頁；皆無（或不合法）時為第一頁。
+
+        多取一筆判斷是否還有下一頁，不需要 COUNT。
+        """
+        numeric = isinstance(self.queryset.model._meta.get_field(self.field), FloatField)
+        after_key, before_key = decode_cursor(after, numeric), decode_cursor(before, numeric)
+
+        if before_key and not after_key:
+            rows = list(
+                self.queryset.filter(self._beyond(before_key, forward=False)).order_by(
+                    *self._ordering(not self.descending)
+                )[: self.per_page + 1]
+            )
+            has_previous = len(rows) > self.per_page
+            object_list = rows[: self.per_page][::-1]
+            return KeysetPage(object_list, self, has_next=True, has_previous=has_previous)
+
+        queryset = self.queryset
+        if after_key:
+            queryset = queryset.filter(self._beyond(after_key, forward=True))
+        rows = list(queryset.order_by(*self._ordering(self.descending))[: self.per_page + 1])
+        has_next = len(rows) > self.per_page
+        return KeysetPage(rows[: self.per_page], self, has_next=has_next, has_previous=after_key is not None)
@@ -0,0 +1,168 @@
+"""觀看頁「接下來播放」的相關影片推薦：背景批次預先計算，請求時一次 Redis 查詢取回。
+
+每部可列出的影片以稀疏特徵向量表示（標籤、分類、上傳者、共同互動的使用者），
+特徵權重為類型權重 × IDF（越多影片共有的特徵越不具鑑別力），兩兩以 cosine 相似度排序。
+計算走倒排索引：只有至少共有一個特徵的影片才會被比對，不做全表兩兩比較。
+
+結果存成 Redis list related:<video_id>，每算完 RELATED_WRITE_BATCH 部就寫入一次，
+批次中途被 time limit 中止時已算好的部分仍然保留；影片改為非公開或刪除後，顯示前以卡片快取的
+visibility 過濾。尚未計算過的影片（剛發布）退回「最新公開影片」。
+"""
+
+import logging
+import math
+from collections import defaultdict
+from heapq import nlargest
+from itertools import batched
+
+import redis
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from taggit.models import TaggedItem
+
+from youtube_service.redis_client import get_redis
+
+from .cards import get_video_cards
+from .models import Video
+
+logger = logging.getLogger(__name__)
+
+RELATED_LIMIT = 8
+# 多存幾筆，讓顯示前濾掉非公開/已刪除影片後仍填得滿
+RELATED_STORED = RELATED_LIMIT * 2
+# 兩次批次計算之間新發布的影片不在任何清單中；過期前一定會被下一次批次覆寫
+RELATED_TTL = 60 * 60 * 24 * 2
+
+# 特徵類型權重：共同標籤最能代表主題，共同互動者（按讚/留言）代表「看過 A 的人也看 B」
+FEATURE_WEIGHTS = {"tag": 3.0, "engaged": 2.0, "uploader": 1.5, "category": 1.0}
+# 每個特徵只保留最新的這麼多部影片作為候選，熱門分類/標籤不會讓計算量平方成長
+MAX_POSTING_LENGTH = 500
+# 每部影片只取最近互動的這麼多位使用者當特徵：單部影片的計算量上限約為
+# (標籤數 + 2 + MAX_ENGAGED_PER_VIDEO) × MAX_POSTING_LENGTH，不隨熱門影片的互動數成長
+MAX_ENGAGED_PER_VIDEO = 100
+# 每算完這麼多部影片寫入 Redis 一次
+RELATED_WRITE_BATCH = 500
+
+
+def related_key(video_id):
+    return f"related:{video_id}"
+
+
+def _load_features():
+    """讀出所有可列出影片的特徵集合；回傳 ({video_id: {feature, ...}}, 依上傳時間新到舊的 id list)。"""
+    from interactions.models import Comment, LikeDislike  # 函式內 import，避免跨 app 的模組層級循環相依
+
+    features = {}
+    for video_id, category_id, uploader_id in (
+        Video.objects.listable().order_by("-upload_date", "-id").values_list("id", "category_id", "uploader_id")
+    ):
+        video_features = {("uploader", uploader_id)}
+        if category_id:
+            video_features.add(("category", category_id))
+        features[video_id] = video_features
+
+    tag_rows = TaggedItem.objects.filter(content_type=ContentType.objects.get_for_model(Video)).values_list(
+        "object_id", "tag_id"
+    )
+    for video_id, tag_id in tag_rows.iterator():
+        if video_id in features:
+            features[video_id].add(("tag", tag_id))
+    for video_id, user_id in _recent_engagement(LikeDislike, Comment):
+        if video_id in features:
+            features[video_id].add(("engaged", user_id))
+    return features, list(features)
+
+
+def _recent_engagement(like_model, comment_model):
+    """每部影片最近互動（按讚或留言）的至多 MAX_ENGAGED_PER_VIDEO 位使用者：(video_id, user_id)。
+
+    在資料庫內以 row_number() 截斷，熱門影片的大量互動不必全部載入 Python。
+    """
+    quote = connection.ops.quote_name
+    sql = f"""
+        SELECT video_id, user_id FROM (
+            SELECT video_id, user_id,
+                   row_number() OVER (PARTITION BY video_id ORDER BY max(timestamp) DESC, user_id) AS recency
+            FROM (
+                SELECT video_id, user_id, timestamp FROM {quote(like_model._meta.db_table)} WHERE type = %s
+                UNION ALL
+                SELECT video_id, user_id, timestamp FROM {quote(comment_model._meta.db_table)}
+            ) AS engagement
+            GROUP BY video_id, user_id
+        ) AS ranked
+        WHERE recency <= %s
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [like_model.LIKE, MAX_ENGAGED_PER_VIDEO])
+        yield from cursor
+
+
+def compute_related(features, ordered_ids, video_ids=None, limit=RELATED_STORED):
+    """以倒排索引計算 cosine 相似度最高的 limit 部影片；同分時新影片優先。
+
+    逐部產生 (video_id, [related_id, ...])；video_ids 為 None 時計算全部影片。
+    """
+    postings = defaultdict(list)
+    for video_id in ordered_ids:
+        for feature in features[video_id]:
+            postings[feature].append(video_id)
+
+    total = len(ordered_ids)
+    weights = {
+        feature: FEATURE_WEIGHTS[feature[0]] * math.log(1 + total / len(posting))
+        for feature, posting in postings.items()
+    }
+    norms = {
+        video_id: math.sqrt(sum(weights[f] ** 2 for f in video_features))
+        for video_id, video_features in features.items()
+    }
+    recency = {video_id: rank for rank, video_id in enumerate(ordered_ids)}
+
+    for video_id in ordered_ids if video_ids is None else [v for v in video_ids if v in features]:
+        dots = defaultdict(float)
+        for feature in features[video_id]:
+            # 特徵為二元值，兩向量在此維度的乘積即權重平方
+            weight_sq = weights[feature] ** 2
+            for other_id in postings[feature][:MAX_POSTING_LENGTH]:
+                if other_id != video_id:
+                    dots[other_id] += weight_sq
+        norm = norms[video_id] or 1.0
+        yield (
+            video_id,
+            nlargest(
+                limit,
+                dots,
+                key=lambda other_id: (dots[other_id] / (norm * (norms[other_id] or 1.0)), -recency[other_id]),
+            ),
+        )
+
+
+def refresh_related_videos(video_ids=None):
+    """重新計算並分批寫入 Redis；回傳寫入的影片數。"""
+    features, ordered_ids = _load_features()
+    count = 0
+    for batch in batched(compute_related(features, ordered_ids, video_ids), RELATED_WRITE_BATCH, strict=False):
+        pipe = get_redis().pipeline(transaction=False)
+        for video_id, related_ids in batch:
+            key = related_key(video_id)
+            pipe.delete(key)
+            if related_ids:
+                pipe.rpush(key, *related_ids)
+                pipe.expire(key, RELATED_TTL)
+        pipe.execute()
+        count += len(batch)
+    return count
+
+
+def get_related_videos(video, limit=RELATED_LIMIT):
+    """取得觀看頁的相關影片（Video instance list）；一次 Redis 查詢加一次卡片快取 get_many。"""
+    try:
+        related_ids = [int(video_id) for video_id in get_redis().lrange(related_key(video.id), 0, -1)]
+    except redis.RedisError:
+        logger.warning("讀取影片 %s 的相關影片失敗，改用最新影片", video.id, exc_info=True)
+        related_ids = []
+    if not related_ids:
+        return list(
+            Video.objects.listable().exclude(pk=video.pk).select_related("uploader").order_by("-upload_date")[:limit]
+        )
+    return [card for card in get_video_cards(related_ids) if card.is_listable][:limit]
@@ -0,0 +1,297 @@
+"""影片全文搜尋：自行斷詞的 tsvector 搜尋文件。
+
+PostgreSQL 內建的 text search config 不斷中文詞，整段中文會變成單一 lexeme，
+子字串幾乎無法命中。這裡在 Python 端先斷詞再交給 'simple' config（只轉小寫、不做 stemming）：
+- 拉丁字母/數字：以非文字字元切成單字，查詢時做前綴比對（"gui" 命中 "guitar"）。
+- CJK：連續的中日韓字元同時產生單字（unigram）與相鄰兩字（bigram），
+  查詢時兩字以上的片段改以 bigram AND 比對，效果接近子字串搜尋。
+
+每部影片一筆 VideoSearchDocument，以權重 A/B/C/D 區分標題、標籤與分類、上傳者、描述，
+由 signal 維護；搜尋走 GIN 索引的 @@ 比對，成本與影片總數無關，只與命中數有關。
+
+搜尋頁的結果（排序後的前 SEARCH_RESULT_CACHE_SIZE 個 id、總數與分類/標籤 facet）以正規化後的
+查詢為 key 快取，熱門查詢翻頁、篩選只需一次快取查詢，影片再由卡片快取還原；影片發布、可見度變更時
+與列表總數共用 generation 一起失效，標籤/名稱變更造成的排序差異由短 TTL 吸收。
+"""
+
+import hashlib
+import re
+import unicodedata
+from functools import reduce
+from itertools import batched
+from operator import and_
+
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.postgres.search import Lexeme, SearchQuery, SearchRank, SearchVector
+from django.core.cache import cache
+from django.db.models import F, Value
+from django.utils.functional import cached_property
+from taggit.models import TaggedItem
+
+from .cards import get_video_cards
+from .models import Video, VideoSearchDocument
+from .pagination import LISTING_GENERATION_KEY, cached_count, listing_generation
+
+# 平假名/片假名、CJK 擴充 A、CJK 統一漢字、相容漢字、韓文音節
+_CJK_RANGES = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af"
+# CJK 片段優先；其餘以「非 CJK 的文字字元」組成單字（底線視為分隔）
+_TOKEN_RE = re.compile(rf"([{_CJK_RANGES}]+)|((?:(?![{_CJK_RANGES}])[^\W_])+)")
+
+SEARCH_CONFIG = "simple"
+# ts_rank 的 [D, C, B, A] 權重：標題命中遠高於僅描述命中
+SEARCH_RANK_WEIGHTS = [0.1, 0.2, 0.4, 1.0]
+# 快取最相關的前 1000 筆（約 80 頁）：足夠涵蓋實際會翻到的頁面，也是 facet 計數的範圍
+SEARCH_RESULT_CACHE_SIZE = 1000
+SEARCH_RESULT_CACHE_TIMEOUT = 60
+# 快取內容格式變更時加一，舊格式的項目自然過期
+SEARCH_RESULT_CACHE_VERSION = 2
+# 每個 facet 顯示的選項數
+SEARCH_FACET_LIMIT = 10
+
+
+def normalize_text(text):
+    """全形轉半形、統一大小寫，文件與查詢必須經過同一套正規化。"""
+    return unicodedata.normalize("NFKC", text or "").lower()
+
+
+def document_tokens(text):
+    """文件斷詞：拉丁單字，以及 CJK 片段的 unigram + bigram。"""
+    tokens = []
+    for cjk, word in _TOKEN_RE.findall(normalize_text(text)):
+        if word:
+            tokens.append(word)
+            continue
+        tokens.extend(cjk)
+        tokens.extend(cjk[i : i + 2] for i in range(len(cjk) - 1))
+    return tokens
+
+
+def token_offsets(normalized):
+    """已正規化文字中每個可作為搜尋起點的位置：拉丁單字的開頭與每個 CJK 字元。"""
+    offsets = []
+    for match in _TOKEN_RE.finditer(normalized):
+        if match.group(1):
+            offsets.extend(range(match.start(), match.end()))
+        else:
+            offsets.append(match.start())
+    return offsets
+
+
+def query_tokens(query):
+    """查詢斷詞：回傳 [(token, prefix), ...]；CJK 單字片段比 unigram，兩字以上比 bigram。"""
+    tokens = []
+    for cjk, word in _TOKEN_RE.findall(normalize_text(query)):
+        if word:
+            tokens.append((word, True))
+        elif len(cjk) == 1:
+            tokens.append((cjk, False))
+        else:
+            tokens.extend((cjk[i : i + 2], False) for i in range(len(cjk) - 1))
+    # 去重但保留順序，避免「哈哈哈」產生重複的 AND 條件
+    return list(dict.fromkeys(tokens))
+
+
+def normalize_query(query):
+    """查詢的正規形式（斷詞結果），供總數與結果快取當 key：大小寫、全半形、空白不同的查詢共用快取。"""
+    return " ".join(token for token, _ in query_tokens(query))
+
+
+def build_document(title="", tags=(), category="", uploader="", description=""):
+    """組出加權的 tsvector expression（A 標題、B 標籤與分類、C 上傳者、D 描述）。"""
+    parts = (
+        (title, "A"),
+        (" ".join([*tags, category or ""]), "B"),
+        (uploader, "C"),
+        (description, "D"),
+    )
+    return reduce(
+        lambda left, right: left + right,
+        (
+            SearchVector(Value(" ".join(document_tokens(text))), config=SEARCH_CONFIG, weight=weight)
+            for text, weight in parts
+        ),
+    )
+
+
+def build_query(query):
+    """查詢字串轉為 tsquery（所有 token AND）；沒有可搜尋的 token 時回傳 None。"""
+    tokens = query_tokens(query)
+    if not tokens:
+        return None
+    lexemes = reduce(and_, (Lexeme(token, prefix=prefix) for token, prefix in tokens))
+    return SearchQuery(lexemes, config=SEARCH_CONFIG)
+
+
+def search_queryset(queryset, query):
+    """在 queryset（需為 Video）內搜尋並依相關度、上傳時間排序；查詢無 token 時回傳空 queryset。"""
+    search_query = build_query(query)
+    if search_query is None:
+        return queryset.none()
+    document = F("search_document__document")
+    return (
+        queryset.filter(search_document__document=search_query)
+        .annotate(rank=SearchRank(document, search_query, weights=SEARCH_RANK_WEIGHTS))
+        .order_by("-rank", "-upload_date", "-id")
+    )
+
+
+def _bit_positions(mask):
+    """依序（由低到高）列出 bitset 中為 1 的位置。"""
+    while mask:
+        lowest = mask & -mask
+        yield lowest.bit_length() - 1
+        mask ^= lowest
+
+
+class SearchResults:
+    """搜尋結果的 lazy sequence，交給 Django Paginator 分頁；可依分類/標籤 slug 篩選。
+
+    依相關度排序的前 SEARCH_RESULT_CACHE_SIZE 筆 id、總數與 facet bitset 一起快取：
+    每個分類/標籤一個 Python int，第 i 個 bit 代表第 i 筆結果是否屬於它，
+    篩選是 bitset AND、facet 計數是 bit_count()，都不再查資料庫。
+    結果超過快取筆數時，facet 計數只涵蓋最相關的前 SEARCH_RESULT_CACHE_SIZE 筆，
+    超出範圍的頁面才以 OFFSET 查資料庫。
+    """
+
+    def __init__(self, queryset, query, category=None, tag=None):
+        self.queryset = search_queryset(queryset, query)
+        self.normalized_query = normalize_query(query)
+        self.filters = {"category": category or None, "tag": tag or None}
+
+    @cached_property
+    def _cached(self):
+        if not self.normalized_query:
+            return {"ids": [], "count": 0, "facets": {"category": {}, "tag": {}}}
+        digest = hashlib.md5(self.normalized_query.encode(), usedforsecurity=False).hexdigest()
+        cache_key = f"videos:search:v{SEARCH_RESULT_CACHE_VERSION}:{digest}"
+        # generation 與結果在同一次 get_many 取回，暖快取只有一次往返
+        values = cache.get_many([LISTING_GENERATION_KEY, cache_key])
+        generation = values.get(LISTING_GENERATION_KEY) or listing_generation()
+        entry = values.get(cache_key)
+        if entry is not None and entry["generation"] == generation:
+            return entry
+
+        rows = list(self.queryset.values_list("id", "category__slug", "category__name")[: SEARCH_RESULT_CACHE_SIZE + 1])
+        if len(rows) <= SEARCH_RESULT_CACHE_SIZE:
+            count = len(rows)
+        else:
+            rows = rows[:SEARCH_RESULT_CACHE_SIZE]
+            count = cached_count(self.queryset, f"search:{self.normalized_query}")
+        ids = [video_id for video_id, _, _ in rows]
+        entry = {"generation": generation, "ids": ids, "count": count, "facets": _facet_bitsets(rows)}
+        cache.set(cache_key, entry, SEARCH_RESULT_CACHE_TIMEOUT)
+        return entry
+
+    @property
+    def _complete(self):
+        """快取的 id 是否涵蓋全部結果。"""
+        return len(self._cached["ids"]) == self._cached["count"]
+
+    def _mask(self, exclude=None):
+        """套用篩選後的結果 bitset；exclude 指定的 facet 不套用（計算該 facet 其他選項的數量）。"""
+        mask = (1 << len(self._cached["ids"])) - 1
+        for facet, slug in self.filters.items():
+            if slug and facet != exclude:
+                mask &= self._cached["facets"][facet].get(slug, (None, 0))[1]
+        return mask
+
+    @cached_property
+    def _ids(self):
+        ids = self._cached["ids"]
+        if not any(self.filters.values()):
+            return ids
+        return [ids[position] for position in _bit_positions(self._mask())]
+
+    @cached_property
+    def _filtered_queryset(self):
+        queryset = self.queryset
+        if self.filters["category"]:
+            queryset = queryset.filter(category__slug=self.filters["category"])
+        if self.filters["tag"]:
+            queryset = queryset.filter(tags__slug=self.filters["tag"])
+        return queryset
+
+    def facets(self, limit=SEARCH_FACET_LIMIT):
+        """各 facet 的選項與數量 {"category": [(slug, name, count), ...], "tag": [...]}，數量多者在前。
+
+        每個 facet 的數量套用其他 facet 的篩選、不套用自己的，切換同一 facet 的選項時數量不變。
+        """
+        facets = {}
+        for facet, options in self._cached["facets"].items():
+            mask = self._mask(exclude=facet)
+            counts = [(slug, name, (bitset & mask).bit_count()) for slug, (name, bitset) in options.items()]
+            counts = [option for option in counts if option[2]]
+            facets[facet] = sorted(counts, key=lambda option: (-option[2], option[1]))[:limit]
+        return facets
+
+    def count(self):
+        if not any(self.filters.values()):
+            return self._cached["count"]
+        if self._complete:
+            return len(self._ids)
+        key = f"search:{self.normalized_query}:category={self.filters['category']}:tag={self.filters['tag']}"
+        return cached_count(self._filtered_queryset, key)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index : index + 1][0]
+        start, stop = index.start or 0, index.stop
+        if (stop is not None and stop <= len(self._ids)) or self._complete:
+            # 快取後才轉為非公開或刪除的影片：卡片快取仍有 visibility，顯示前濾掉
+            return [video for video in get_video_cards(self._ids[start:stop]) if video.is_listable]
+        return list(self._filtered_queryset.select_related("uploader")[start:stop])
+
+
+def _facet_bitsets(rows):
+    """由排序後的 (id, 分類 slug, 分類名稱) 建出各分類/標籤的結果 bitset：{facet: {slug: (名稱, bitset)}}。"""
+    positions = {video_id: position for position, (video_id, _, _) in enumerate(rows)}
+    tag_rows = TaggedItem.objects.filter(
+        content_type=ContentType.objects.get_for_model(Video), object_id__in=positions
+    ).values_list("object_id", "tag__slug", "tag__name")
+
+    names = {"category": {}, "tag": {}}
+    bits = {"category": {}, "tag": {}}
+    for facet, facet_rows in (("category", rows), ("tag", tag_rows)):
+        for video_id, slug, name in facet_rows:
+            if slug:
+                names[facet][slug] = name
+                bits[facet][slug] = bits[facet].get(slug, 0) | 1 << positions[video_id]
+    return {facet: {slug: (names[facet][slug], bitset) for slug, bitset in bits[facet].items()} for facet in bits}
+
+
+def document_for_video(video):
+    return build_document(
+        title=video.title,
+        tags=[tag.name for tag in video.tags.all()],
+        category=video.category.name if video.category_id else "",
+        uploader=video.uploader.username,
+        description=video.description,
+    )
+
+
+def upsert_search_documents(model, documents):
+    """以單一 INSERT ... ON CONFLICT 寫入一批 (video_id, tsvector expression)。"""
+    model.objects.bulk_create(
+        [model(video_id=video_id, document=document) for video_id, document in documents],
+        update_conflicts=True,
+        unique_fields=["video"],
+        update_fields=["document"],
+    )
+
+
+def refresh_search_document(video):
+    """重建單部影片的搜尋文件（新增或更新）。"""
+    upsert_search_documents(VideoSearchDocument, [(video.id, document_for_video(video))])
+
+
+def refresh_search_documents(queryset, batch_size=500):
+    """重建 queryset 內所有影片的搜尋文件（上傳者改名、分類改名時由背景任務呼叫）；回傳處理筆數。"""
+    videos = queryset.select_related("uploader", "category").prefetch_related("tags").order_by("pk")
+    count = 0
+    for batch in batched(videos.iterator(chunk_size=batch_size), batch_size, strict=False):
+        upsert_search_documents(VideoSearchDocument, [(video.id, document_for_video(video)) for video in batch])
+        count += len(batch)
+    return count
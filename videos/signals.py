@@ -2,14 +2,165 @@ import logging
 import os
 import shutil
 
+import redis
 from django.conf import settings
-from django.db.models.signals import post_delete
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
 from django.dispatch import receiver
 
-from .models import Video
+from . import feeds, search, suggest
+from .cards import invalidate_cards
+from .context_processors import invalidate_nav_categories
+from .models import Category, Video
+from .pagination import invalidate_cached_counts
+from .tasks import push_to_subscriber_timelines, rebuild_search_documents
 
 logger = logging.getLogger(__name__)
 
+# 會改變「影片出現在哪些列表/搜尋結果」的欄位；只更新其他欄位（如轉檔狀態）的 save 不需失效列表快取
+LISTING_FIELDS = frozenset({"visibility", "category", "upload_date", "title", "description"})
+
+
+# 搜尋文件中來自 Video 本身的欄位（標籤、上傳者名稱、分類名稱另有 receiver）
+SEARCH_DOCUMENT_FIELDS = frozenset({"title", "description", "category"})
+
+
+def _affects_listings(created, update_fields):
+    return created or update_fields is None or not LISTING_FIELDS.isdisjoint(update_fields)
+
+
+@receiver(post_save, sender=Video)
+def invalidate_listing_caches_on_save(sender, instance, created, update_fields, **kwargs):
+    """發布、可見度或列表相關欄位變更時，失效列表總數快取。"""
+    if _affects_listings(created, update_fields):
+        invalidate_cached_counts()
+
+
+_UNKNOWN = object()
+
+
+@receiver(post_save, sender=Video)
+def sync_feeds_on_save(sender, instance, created, update_fields, **kwargs):
+    """卡片欄位（縮圖、標題等）任何變更都刪卡片快取；影響列表的變更才在 commit 後同步 feed。
+
+    只需從儲存前的分類 feed 移除（換分類時）；實例沒有載入時的分類紀錄時才退回檢查所有分類。
+    """
+    invalidate_cards([instance.id])
+    if not _affects_listings(created, update_fields):
+        return
+    previous = instance.saved_value("category_id", _UNKNOWN)
+    if created:
+        category_ids = ()
+    elif previous is _UNKNOWN:
+        category_ids = list(Category.objects.values_list("id", flat=True))
+    else:
+        category_ids = [previous] if previous else []
+    transaction.on_commit(lambda: _sync_feeds(instance, category_ids))
+
+
+def _sync_feeds(video, category_ids):
+    try:
+        feeds.sync_video(video, category_ids)
+    except redis.RedisError:
+        logger.exception("同步影片 %s 的 feed 失敗", video.id)
+
+
+@receiver(post_save, sender=Video)
+def push_to_timelines_on_publish(sender, instance, created, update_fields, **kwargs):
+    """已處理完成的影片從 private/unlisted 轉為公開時，commit 後寫入訂閱者的 timeline。
+
+    新影片不在此處理：轉檔完成時由通知 fan-out 寫入。實例沒有儲存前的可見度紀錄時視同變更（寫入為冪等）。
+    """
+    if created or not instance.is_listable or instance.processing_status != "completed":
+        return
+    if update_fields is not None and "visibility" not in update_fields:
+        return
+    if instance.saved_value("visibility") == "public":
+        return
+    transaction.on_commit(lambda: push_to_subscriber_timelines.delay(instance.id))
+
+
+@receiver(post_save, sender=Video)
+def record_suggest_change_on_save(sender, instance, created, update_fields, **kwargs):
+    """發布、改標題、可見度變更寫入自動完成的變更紀錄；各 process 的前綴索引據此增量更新。"""
+    if _affects_listings(created, update_fields):
+        suggest.record_change(instance)
+
+
+@receiver(post_delete, sender=Video)
+def invalidate_listing_caches_on_delete(sender, instance, **kwargs):
+    """post_delete 仍在刪除的 transaction 內：feed 與自動完成的移除留到 commit 後，rollback 時影片不會從中消失。"""
+    invalidate_cached_counts()
+    invalidate_cards([instance.id])
+    video_id, category_id = instance.id, instance.category_id
+    transaction.on_commit(lambda: _remove_from_listings(video_id, category_id))
+
+
+def _remove_from_listings(video_id, category_id):
+    suggest.record_removal(video_id)
+    try:
+        feeds.remove_video(video_id, category_id)
+    except redis.RedisError:
+        logger.exception("從 feed 移除影片 %s 失敗", video_id)
+
+
+@receiver(post_save, sender=User)
+def invalidate_cards_on_username_change(sender, instance, update_fields, **kwargs):
+    """卡片上顯示上傳者名稱；帳號資料可能改名時刪除其所有影片的卡片快取。"""
+    if update_fields is None or "username" in update_fields:
+        invalidate_cards(Video.objects.filter(uploader=instance).values_list("id", flat=True))
+
+
+@receiver(post_save, sender=Video)
+def refresh_search_document_on_save(sender, instance, created, update_fields, **kwargs):
+    if created or update_fields is None or not SEARCH_DOCUMENT_FIELDS.isdisjoint(update_fields):
+        search.refresh_search_document(instance)
+
+
+@receiver(m2m_changed, sender=Video.tags.through)
+def refresh_search_document_on_tags_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """taggit 的 add/remove/set/clear 都會送 m2m_changed；reverse 時 instance 是 Tag、pk_set 是影片 id。"""
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        search.refresh_search_document(instance)
+    elif pk_set:
+        search.refresh_search_documents(Video.objects.filter(pk__in=pk_set))
+
+
+@receiver(post_save, sender=User)
+def rebuild_search_documents_on_username_change(sender, instance, created, update_fields, **kwargs):
+    """上傳者名稱在搜尋文件中；影片可能很多，交給背景任務重建。"""
+    if created or (update_fields is not None and "username" not in update_fields):
+        return
+    transaction.on_commit(lambda: rebuild_search_documents.delay(uploader_id=instance.id))
+
+
+@receiver(post_save, sender=Category)
+def rebuild_search_documents_on_category_rename(sender, instance, created, **kwargs):
+    if created:
+        return
+    transaction.on_commit(lambda: rebuild_search_documents.delay(category_id=instance.id))
+
+
+@receiver(pre_delete, sender=Category)
+def rebuild_search_documents_on_category_delete(sender, instance, **kwargs):
+    """分類刪除後影片的 category 被 SET_NULL（不經 signal），刪除前先記下受影響的影片。"""
+    video_ids = list(instance.videos.values_list("id", flat=True))
+    if video_ids:
+        transaction.on_commit(lambda: rebuild_search_documents.delay(video_ids=video_ids))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_nav_categories_on_change(sender, **kwargs):
+    """add_category、delete_category、admin 與 create_category 指令都經由 save/delete，在此統一失效。
+
+    commit 後才失效：transaction 內失效的話，同時渲染的請求可能讀到舊清單並寫回 Redis。
+    """
+    transaction.on_commit(invalidate_nav_categories)
+
 
 @receiver(post_delete, sender=Video)
 def cleanup_video_files(sender, instance, **kwargs):
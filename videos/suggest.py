@@ -0,0 +1,273 @@
+"""搜尋框自動完成：每個 process 一份記憶體內的前綴索引，請求路徑不查資料庫。
+
+索引是排序過的平行陣列 (後綴 key, 影片 id)：每個標題在每個可作為搜尋起點的位置
+（拉丁單字開頭、每個 CJK 字元，見 search.token_offsets）取一段後綴，查詢以 bisect 找出
+前綴相同的範圍，再依熱門度（觀看數）取前幾名不重複的標題。
+
+索引每 SUGGEST_REBUILD_INTERVAL 於背景執行緒從資料庫重建一次；兩次重建之間的發布、改標題、
+下架由 signal 寫入 Redis stream，各 process 每 SUGGEST_SYNC_INTERVAL 讀一次增量套用。
+stream 被裁掉（process 長時間閒置）而漏掉的變更，由下一次重建補上。
+"""
+
+import bisect
+import logging
+import threading
+import time
+from heapq import nlargest
+
+import redis
+from django.db import connections
+
+from youtube_service.redis_client import get_redis
+
+from .models import Video
+from .search import normalize_text, token_offsets
+
+logger = logging.getLogger(__name__)
+
+SUGGEST_LIMIT = 5
+SUGGEST_MIN_QUERY_LENGTH = 2
+# 只收最熱門的這麼多個標題：每個標題約產生標題長度個後綴，記憶體與重建時間都與此成正比
+SUGGEST_MAX_TITLES = 20_000
+# 後綴截斷長度；更長的查詢以截斷後的前綴找範圍，再比對完整標題
+SUGGEST_KEY_LENGTH = 16
+SUGGEST_REBUILD_INTERVAL = 60 * 10
+SUGGEST_SYNC_INTERVAL = 2
+SUGGEST_CHANGES_KEY = "suggest:changes"
+SUGGEST_CHANGES_MAXLEN = 10_000
+# 前綴範圍超過這麼多筆就在建索引時預先排好候選，查詢成本不隨標題數成長
+SUGGEST_SCAN_LIMIT = 256
+SUGGEST_HEAD_SIZE = SUGGEST_LIMIT * 4
+# 自動完成的查詢高度重複（逐字輸入的前綴）；結果在索引有變動前都可重用
+_MEMO_SIZE = 1024
+
+
+def _suffix_keys(normalized):
+    return {normalized[offset : offset + SUGGEST_KEY_LENGTH] for offset in token_offsets(normalized)}
+
+
+class SuggestIndex:
+    """前綴索引本體；寫入（增量套用）與查詢以同一把 lock 保護，讀到的兩個陣列一定對齊。"""
+
+    def __init__(self, rows=(), last_change_id="0-0"):
+        # video_id -> (標題, 正規化標題, 熱門度)
+        self.titles = {}
+        pairs = []
+        for video_id, title, popularity in rows:
+            normalized = normalize_text(title)
+            self.titles[video_id] = (title, normalized, popularity)
+            pairs.extend((key, video_id) for key in _suffix_keys(normalized))
+        pairs.sort()
+        self.keys = [key for key, _ in pairs]
+        self.video_ids = [video_id for _, video_id in pairs]
+        # 熱門前綴（範圍超過 SUGGEST_SCAN_LIMIT）-> 預先排好的候選 id；短查詢不必掃過整段範圍
+        self.heads = {}
+        self._build_heads(0, len(self.keys), SUGGEST_MIN_QUERY_LENGTH)
+        self.last_change_id = last_change_id
+        self.next_sync = 0.0
+        self._memo = {}
+        self._lock = threading.Lock()
+
+    def _popularity(self, video_id):
+        return self.titles[video_id][2], video_id
+
+    def _build_heads(self, start, end, length):
+        """把 [start, end) 依前 length 字分組；範圍過大的組記下候選，並往更長的前綴遞迴。"""
+        if length > SUGGEST_KEY_LENGTH:
+            return
+        while start < end:
+            prefix = self.keys[start][:length]
+            if len(prefix) < length:
+                # 比 length 短的 key（標題結尾）只跳過與它完全相同的幾筆
+                start = bisect.bisect_right(self.keys, prefix, lo=start, hi=end)
+                continue
+            group_end = bisect.bisect_right(self.keys, prefix + "\U0010ffff", lo=start, hi=end)
+            if group_end - start > SUGGEST_SCAN_LIMIT:
+                self.heads[prefix] = self._top_ids(set(self.video_ids[start:group_end]))
+                self._build_heads(start, group_end, length + 1)
+            start = group_end
+
+    def _top_ids(self, video_ids):
+        """熱門度最高、標題不重複的 SUGGEST_HEAD_SIZE 個 id。"""
+        head, seen = [], set()
+        for video_id in sorted(video_ids, key=self._popularity, reverse=True):
+            title = self.titles[video_id][0]
+            if title not in seen:
+                seen.add(title)
+                head.append(video_id)
+                if len(head) == SUGGEST_HEAD_SIZE:
+                    break
+        return head
+
+    def add(self, video_id, title, popularity=0):
+        """新增或更新標題；重複套用同一筆變更不會產生重複的後綴。"""
+        normalized = normalize_text(title)
+        with self._lock:
+            previous = self.titles.get(video_id)
+            self.titles[video_id] = (title, normalized, popularity)
+            # 舊標題的後綴留在陣列裡，查詢時以目前標題過濾掉，下一次重建才真正移除
+            if previous is None or previous[1] != normalized:
+                for key in _suffix_keys(normalized):
+                    position = bisect.bisect_left(self.keys, key)
+                    self.keys.insert(position, key)
+                    self.video_ids.insert(position, video_id)
+                    for length in range(SUGGEST_MIN_QUERY_LENGTH, len(key) + 1):
+                        head = self.heads.get(key[:length])
+                        if head is None:
+                            break
+                        if video_id not in head:
+                            head.append(video_id)
+                        head.sort(key=self._popularity, reverse=True)
+                        del head[SUGGEST_HEAD_SIZE:]
+            self._memo.clear()
+
+    def remove(self, video_id):
+        with self._lock:
+            if self.titles.pop(video_id, None) is not None:
+                self._memo.clear()
+
+    def _rank(self, video_ids, normalized, limit):
+        best = {}
+        for video_id in video_ids:
+            entry = self.titles.get(video_id)
+            if entry is None or normalized not in entry[1]:
+                continue
+            title, _, popularity = entry
+            best[title] = max(best.get(title, (popularity, video_id)), (popularity, video_id))
+        return nlargest(limit, best, key=best.__getitem__)
+
+    def search(self, query, limit=SUGGEST_LIMIT):
+        """回傳包含 query（從單字開頭或任一 CJK 字元起算）且最熱門的 limit 個不重複標題。"""
+        normalized = normalize_text(query).strip()
+        if len(normalized) < SUGGEST_MIN_QUERY_LENGTH:
+            return []
+        with self._lock:
+            suggestions = self._memo.get(normalized)
+            if suggestions is not None:
+                return suggestions
+            prefix = normalized[:SUGGEST_KEY_LENGTH]
+            head = self.heads.get(prefix)
+            if head is not None and limit <= SUGGEST_HEAD_SIZE:
+                suggestions = self._rank(head, normalized, limit)
+            if head is None or limit > SUGGEST_HEAD_SIZE or len(suggestions) < min(limit, len(head)):
+                # 非熱門前綴範圍很小，直接掃；熱門前綴的候選被下架/改名或更長的查詢濾掉太多時也退回掃描
+                start = bisect.bisect_left(self.keys, prefix)
+                end = bisect.bisect_right(self.keys, prefix + "\U0010ffff", lo=start)
+                suggestions = self._rank(set(self.video_ids[start:end]), normalized, limit)
+            if len(self._memo) >= _MEMO_SIZE:
+                self._memo.clear()
+            self._memo[normalized] = suggestions
+            return suggestions
+
+    def apply(self, fields):
+        """套用一筆變更紀錄：有 title 為新增/更新，只有 id 為移除。"""
+        video_id = int(fields["id"])
+        if "title" in fields:
+            self.add(video_id, fields["title"], int(fields["popularity"]))
+        else:
+            self.remove(video_id)
+
+
+_index = None
+_built_at = 0.0
+_rebuild_lock = threading.Lock()
+
+
+def _latest_change_id():
+    try:
+        latest = get_redis().xrevrange(SUGGEST_CHANGES_KEY, count=1)
+    except redis.RedisError:
+        logger.warning("讀取自動完成變更紀錄失敗", exc_info=True)
+        return "0-0"
+    return latest[0][0] if latest else "0-0"
+
+
+def build_index():
+    """從資料庫載入最熱門的可列出影片標題。
+
+    載入前先記下變更紀錄的位置：載入期間寫入的變更之後會再套用一次，add/remove 可重複套用。
+    """
+    last_change_id = _latest_change_id()
+    rows = (
+        Video.objects.listable()
+        .order_by("-views_count", "-upload_date")
+        .values_list("id", "title", "views_count")[:SUGGEST_MAX_TITLES]
+    )
+    return SuggestIndex(rows, last_change_id)
+
+
+def _rebuild_in_background():
+    global _index
+    try:
+        _index = build_index()
+    except Exception:
+        logger.exception("重建自動完成索引失敗，沿用舊索引")
+    finally:
+        # 背景執行緒不經過 request_finished，連線要自己關
+        connections.close_all()
+        _rebuild_lock.release()
+
+
+def _sync(index, now):
+    """每 SUGGEST_SYNC_INTERVAL 套用一次其他 process 寫入的變更；Redis 失敗時沿用現有索引。"""
+    if now < index.next_sync:
+        return
+    index.next_sync = now + SUGGEST_SYNC_INTERVAL
+    try:
+        changes = get_redis().xrange(SUGGEST_CHANGES_KEY, min=f"({index.last_change_id}")
+    except redis.RedisError:
+        logger.warning("同步自動完成變更紀錄失敗", exc_info=True)
+        return
+    for change_id, fields in changes:
+        index.apply(fields)
+        index.last_change_id = change_id
+
+
+def get_index():
+    """取得本 process 的索引：第一次使用時同步建立，之後過期改由背景執行緒重建，期間沿用舊索引。"""
+    global _index, _built_at
+    now = time.monotonic()
+    if _index is None:
+        with _rebuild_lock:
+            if _index is None:
+                _index = build_index()
+                _built_at = now
+    elif now - _built_at >= SUGGEST_REBUILD_INTERVAL and _rebuild_lock.acquire(blocking=False):
+        _built_at = now
+        threading.Thread(target=_rebuild_in_background, daemon=True).start()
+    index = _index
+    _sync(index, now)
+    return index
+
+
+def suggest(query, limit=SUGGEST_LIMIT):
+    return get_index().search(query, limit)
+
+
+def record_change(video):
+    """影片發布、改標題或轉為不可列出時寫入變更紀錄；本 process 的索引立即套用，其他 process 於同步時套用。"""
+    if video.is_listable:
+        fields = {"id": video.id, "title": video.title, "popularity": video.views_count}
+    else:
+        fields = {"id": video.id}
+    _record(video.id, fields)
+
+
+def record_removal(video_id):
+    _record(video_id, {"id": video_id})
+
+
+def _record(video_id, fields):
+    if _index is not None:
+        _index.apply(fields)
+    try:
+        get_redis().xadd(SUGGEST_CHANGES_KEY, fields, maxlen=SUGGEST_CHANGES_MAXLEN, approximate=True)
+    except redis.RedisError:
+        logger.warning("寫入影片 %s 的自動完成變更失敗", video_id, exc_info=True)
+
+
+def reset_index():
+    """丟棄本 process 的索引，下次查詢時重建（測試之間使用）。"""
+    global _index, _built_at
+    _index = None
+    _built_at = 0.0
@@ -2,6 +2,7 @@
 import logging
 import os
 import time
+from itertools import batched
 
 # 第三方庫 imports
 import ffmpeg
@@ -18,6 +19,9 @@ from .models import Video
 
 logger = logging.getLogger(__name__)
 
+# 轉為公開的影片寫入訂閱者 timeline 時，每個 Redis pipeline 的訂閱者數
+TIMELINE_PUSH_BATCH_SIZE = 500
+
 
 def _get_exception_message(e):
     """從異常中提取錯誤訊息；ffmpeg.Error 的 stderr 為 bytes，優先取用。"""
@@ -399,3 +403,84 @@ def generate_hls_files(self, video_id, input_file_path, file_name_without_ext):
             # 重試已耗盡，暫存副本不再需要（admin 重新生成走 storage 中的影片檔）
             _remove_hls_input_copy(input_file_path)
             return False
+
+
+@shared_task
+def compute_related_videos():
+    """定期重新計算所有影片的相關影片推薦（由 CELERY_BEAT_SCHEDULE 排程；整批計算，走 transcode queue 不占即時通知的 worker）。"""
+    from .related import refresh_related_videos
+
+    count = refresh_related_videos()
+    logger.info("相關影片推薦已更新，共 %s 部影片", count)
+    return count
+
+
+@shared_task
+def apply_trending_scores():
+    """衰減熱門排行並套用累積的互動增量（由 CELERY_BEAT_SCHEDULE 每分鐘排程）。"""
+    from .trending import apply_trending_deltas
+
+    return apply_trending_deltas()
+
+
+@shared_task
+def rebuild_search_documents(uploader_id=None, category_id=None, video_ids=None):
+    """重建某上傳者、某分類或指定影片的搜尋文件（改名/刪除分類後由 signal 於 commit 後排入）。"""
+    from .search import refresh_search_documents
+
+    videos = Video.objects.all()
+    if uploader_id is not None:
+        videos = videos.filter(uploader_id=uploader_id)
+    if category_id is not None:
+        videos = videos.filter(category_id=category_id)
+    if video_ids is not None:
+        videos = videos.filter(id__in=video_ids)
+    return refresh_search_documents(videos)
+
+
+@shared_task
+def push_to_subscriber_timelines(video_id):
+    """影片轉為公開時寫入訂閱者的 timeline（由 signal 於 commit 後排入）。
+
+    新影片在轉檔完成時由通知 fan-out 一併寫入（見 interactions.tasks.notify_subscriber_range），
+    之後才從 private/unlisted 轉為公開的影片走這裡；大頻道同樣不寫入，讀取時再拉。
+    """
+    from interactions.models import Subscription  # 函式內 import，避免跨 app 的模組層級循環相依
+
+    from . import feeds
+
+    video = Video.objects.select_related("uploader__profile").filter(id=video_id).first()
+    if video is None or not video.is_listable:
+        return 0
+    profile = getattr(video.uploader, "profile", None)
+    if profile is not None and profile.subscriber_count >= feeds.TIMELINE_PULL_THRESHOLD:
+        return 0
+    subscriber_ids = (
+        Subscription.objects.filter(subscribed_to_id=video.uploader_id)
+        .values_list("subscriber_id", flat=True)
+        .iterator(chunk_size=TIMELINE_PUSH_BATCH_SIZE)
+    )
+    count = 0
+    for batch in batched(subscriber_ids, TIMELINE_PUSH_BATCH_SIZE, strict=False):
+        feeds.push_to_timelines(video, batch)
+        count += len(batch)
+    return count
+
+
+@shared_task
+def invalidate_subscriber_timelines(channel_id):
+    """頻道訂閱數跌破 TIMELINE_PULL_THRESHOLD 時刪除其訂閱者的 timeline（見 feeds.py）；回傳處理的訂閱者數。"""
+    from interactions.models import Subscription  # 函式內 import，避免跨 app 的模組層級循環相依
+
+    from . import feeds
+
+    subscriber_ids = (
+        Subscription.objects.filter(subscribed_to_id=channel_id)
+        .values_list("subscriber_id", flat=True)
+        .iterator(chunk_size=TIMELINE_PUSH_BATCH_SIZE)
+    )
+    count = 0
+    for batch in batched(subscriber_ids, TIMELINE_PUSH_BATCH_SIZE, strict=False):
+        feeds.invalidate_timelines(batch)
+        count += len(batch)
+    return count
@@ -0,0 +1,11 @@
+from django import template
+
+from videos.cards import render_video_cards
+
+register = template.Library()
+
+
+@register.simple_tag
+def video_cards(videos, variant="grid"):
+    """{% video_cards videos "grid" %}：以片段快取渲染整頁影片卡片（樣式見 cards.FRAGMENT_VARIANTS）。"""
+    return render_video_cards(videos, variant)
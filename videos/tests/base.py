@@ -1,10 +1,39 @@
 """共用測試基礎：測試常量與 BaseVideoTestCase。"""
 
+from contextlib import contextmanager
+
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import TestCase
 
+from videos.context_processors import invalidate_nav_categories
 from videos.models import Category, Video
+from videos.suggest import reset_index
+from youtube_service.celery import app as celery_app
+from youtube_service.redis_client import get_redis
+
+
+def clear_redis_state():
+    """清空快取、Redis 資料結構（feed 等）與 process 內的索引：測試資料庫每個測試都會 rollback，Redis 內容卻會殘留到下一個測試。"""
+    cache.clear()
+    get_redis().flushdb()
+    invalidate_nav_categories()
+    reset_index()
+
+
+@contextmanager
+def eager_celery_tasks():
+    """讓 .delay() 與 Celery group 分派的任務就地同步執行，離開時還原。
+
+    Celery 設定在 app 載入時就從 Django settings 讀入，override_settings(CELERY_TASK_ALWAYS_EAGER=True) 不會生效。
+    """
+    previous = celery_app.conf.task_always_eager
+    celery_app.conf.task_always_eager = True
+    try:
+        yield
+    finally:
+        celery_app.conf.task_always_eager = previous
 
 
 class TestConstants:
@@ -0,0 +1,360 @@
+"""feed 測試：首頁/分類 feed 與訂閱 timeline 的增量維護、分頁，以及卡片資料與 HTML 片段快取。"""
+
+from unittest.mock import patch
+
+import redis
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from interactions.models import Subscription
+from interactions.tasks import notify_subscribers_of_new_video
+from videos import feeds
+from videos.cards import get_video_cards, render_video_cards
+from videos.feeds import (
+    LATEST_FEED_KEY,
+    TIMELINE_PULL_THRESHOLD,
+    FeedPaginator,
+    TimelinePaginator,
+    category_feed_key,
+    timeline_key,
+)
+from videos.models import Video
+from videos.tasks import invalidate_subscriber_timelines, push_to_subscriber_timelines
+from youtube_service.redis_client import get_redis
+
+from .base import BaseVideoTestCase, clear_redis_state, eager_celery_tasks
+
+
+class FeedTestCase(BaseVideoTestCase):
+    def setUp(self):
+        clear_redis_state()
+        self.user = self.create_test_user()
+        self.category = self.create_test_category()
+
+    def latest_page(self, **kwargs):
+        return FeedPaginator(LATEST_FEED_KEY, Video.objects.listable(), 3).get_page(**kwargs)
+
+    def feed_ids(self, key):
+        return [int(member) for member in get_redis().zrevrange(key, 0, -1) if member != "_"]
+
+
+class FeedPaginatorTests(FeedTestCase):
+    """feed 分頁與重建"""
+
+    def setUp(self):
+        super().setUp()
+        now = timezone.now()
+        self.videos = [
+            self.create_test_video(title=f"Feed Video {i}", uploader=self.user, upload_date=now - timezone.timedelta(i))
+            for i in range(5)
+        ]
+
+    def test_cold_feed_is_rebuilt_from_database(self):
+        page = self.latest_page()
+        self.assertEqual(list(page), self.videos[:3])
+        self.assertEqual(self.feed_ids(LATEST_FEED_KEY), [v.id for v in self.videos])
+
+    def test_warm_feed_page_skips_database(self):
+        """feed 與卡片快取都暖好後，翻頁完全不查資料庫"""
+        first = self.latest_page()
+        self.latest_page(after=first.next_cursor)
+        with self.assertNumQueries(0):
+            second = self.latest_page(after=first.next_cursor)
+        self.assertEqual(list(second), self.videos[3:])
+        self.assertFalse(second.has_next())
+
+    def test_previous_page(self):
+        second = self.latest_page(after=self.latest_page().next_cursor)
+        previous = self.latest_page(before=second.previous_cursor)
+        self.assertEqual(list(previous), self.videos[:3])
+        self.assertFalse(previous.has_previous())
+
+    def test_truncated_feed_falls_back_to_database(self):
+        """超過 feed 保留長度的深頁改由資料庫 keyset 分頁服務"""
+        with patch("videos.feeds.FEED_MAX_LENGTH", 4):
+            first = self.latest_page()
+            self.assertEqual(len(self.feed_ids(LATEST_FEED_KEY)), 4)
+            second = self.latest_page(after=first.next_cursor)
+        self.assertEqual(list(second), self.videos[3:])
+
+    def test_redis_failure_falls_back_to_database(self):
+        with patch("videos.feeds.get_redis", side_effect=redis.ConnectionError):
+            page = self.latest_page()
+        self.assertEqual(list(page), self.videos[:3])
+
+    def test_home_view_uses_feed(self):
+        self.client.get(reverse("videos:home"))
+        self.assertEqual(self.feed_ids(LATEST_FEED_KEY), [v.id for v in self.videos])
+
+
+class FeedMaintenanceTests(FeedTestCase):
+    """signal 增量維護 feed"""
+
+    def setUp(self):
+        super().setUp()
+        self.video = self.create_test_video(uploader=self.user, category=self.category)
+        feeds.rebuild_feed(LATEST_FEED_KEY, Video.objects.listable())
+        feeds.rebuild_feed(category_feed_key(self.category.id), Video.objects.listable().filter(category=self.category))
+
+    def test_new_public_video_is_added(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            newer = self.create_test_video(title="Newer", uploader=self.user, category=self.category)
+        self.assertEqual(self.feed_ids(LATEST_FEED_KEY), [newer.id, self.video.id])
+        self.assertEqual(self.feed_ids(category_feed_key(self.category.id)), [newer.id, self.video.id])
+
+    def test_private_video_is_not_added(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_test_video(title="Private", uploader=self.user, visibility="private")
+        self.assertEqual(self.feed_ids(LATEST_FEED_KEY), [self.video.id])
+
+    def test_visibility_change_removes_video(self):
+        self.video.visibility = "unlisted"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.video.save()
+        self.assertEqual(self.feed_ids(LATEST_FEED_KEY), [])
+        self.assertEqual(self.feed_ids(category_feed_key(self.category.id)), [])
+
+    def test_category_change_moves_video(self):
+        other = self.create_test_category(name="Other Category")
+        feeds.rebuild_feed(category_feed_key(other.id), Video.objects.listable().filter(category=other))
+        video = Video.objects.get(id=self.video.id)
+        video.category = other
+        # 只從原本的分類 feed 移除，不查詢所有分類
+        with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as queries:
+            video.save()
+        self.assertFalse(any("videos_category" in query["sql"] for query in queries))
+        self.assertEqual(self.feed_ids(category_feed_key(self.category.id)), [])
+        self.assertEqual(self.feed_ids(category_feed_key(other.id)), [self.video.id])
+
+    def test_rolled_back_save_leaves_feeds_untouched(self):
+        self.video.visibility = "private"
+        with self.captureOnCommitCallbacks(execute=True), self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                self.video.save()
+                raise RuntimeError
+        self.assertEqual(self.feed_ids(LATEST_FEED_KEY), [self.video.id])
+
+    def test_delete_removes_video(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.video.delete()
+        self.assertEqual(self.feed_ids(LATEST_FEED_KEY), [])
+        self.assertEqual(self.feed_ids(category_feed_key(self.category.id)), [])
+
+    def test_rolled_back_delete_keeps_video_in_feeds(self):
+        video_id = self.video.id
+        with self.captureOnCommitCallbacks(execute=True), self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                self.video.delete()
+                raise RuntimeError
+        self.assertEqual(self.feed_ids(LATEST_FEED_KEY), [video_id])
+
+    def test_missing_feed_is_not_created_by_incremental_update(self):
+        """feed 尚未建立時新影片不寫入，留給讀取時整份重建"""
+        get_redis().delete(LATEST_FEED_KEY)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_test_video(title="Newer", uploader=self.user)
+        self.assertFalse(get_redis().exists(LATEST_FEED_KEY))
+
+    def test_feed_is_trimmed(self):
+        with patch("videos.feeds.FEED_MAX_LENGTH", 1), self.captureOnCommitCallbacks(execute=True):
+            newer = self.create_test_video(title="Newer", uploader=self.user)
+        self.assertEqual(self.feed_ids(LATEST_FEED_KEY), [newer.id])
+
+
+class VideoCardCacheTests(FeedTestCase):
+    """影片卡片快取"""
+
+    def setUp(self):
+        super().setUp()
+        self.video = self.create_test_video(uploader=self.user)
+
+    def test_cards_hydrate_in_order_and_skip_missing(self):
+        other = self.create_test_video(title="Other", uploader=self.user)
+        cards = get_video_cards([other.id, 999999, self.video.id])
+        self.assertEqual(cards, [other, self.video])
+        self.assertEqual(cards[1].uploader.username, self.user.username)
+
+    def test_cached_card_fields_match_database(self):
+        self.video.category = self.category
+        self.video.views_count = 7
+        self.video.save()
+        get_video_cards([self.video.id])
+        card = get_video_cards([self.video.id])[0]
+        for field in ("title", "visibility", "category_id", "uploader_id", "views_count", "upload_date"):
+            self.assertEqual(getattr(card, field), getattr(self.video, field), field)
+        self.assertTrue(card.is_listable)
+
+    def test_warm_cards_skip_database(self):
+        get_video_cards([self.video.id])
+        with self.assertNumQueries(0):
+            card = get_video_cards([self.video.id])[0]
+            self.assertEqual(card.title, self.video.title)
+
+    def test_video_save_invalidates_card(self):
+        get_video_cards([self.video.id])
+        self.video.title = "Renamed"
+        self.video.save()
+        self.assertEqual(get_video_cards([self.video.id])[0].title, "Renamed")
+
+    def test_username_change_invalidates_card(self):
+        get_video_cards([self.video.id])
+        self.user.username = "renamed_user"
+        self.user.save()
+        self.assertEqual(get_video_cards([self.video.id])[0].uploader.username, "renamed_user")
+
+
+class VideoCardFragmentTests(FeedTestCase):
+    """影片卡片 HTML 片段快取"""
+
+    def setUp(self):
+        super().setUp()
+        self.video = self.create_test_video(uploader=self.user)
+
+    def test_warm_fragments_skip_rendering(self):
+        render_video_cards([self.video])
+        with patch("videos.cards.render_to_string") as render_mock, self.assertNumQueries(0):
+            html = render_video_cards([self.video])
+        render_mock.assert_not_called()
+        self.assertIn(self.video.title, html)
+
+    def test_age_is_rendered_live(self):
+        html = render_video_cards([self.video])
+        self.assertNotIn("<!--", html)
+        self.assertIn(" ago", html)
+
+    def test_variants_are_cached_separately(self):
+        self.assertIn(self.user.username, render_video_cards([self.video], "grid"))
+        self.assertNotIn(self.user.username, render_video_cards([self.video], "channel"))
+
+    def test_video_save_invalidates_fragment(self):
+        render_video_cards([self.video])
+        self.video.title = "Renamed Title"
+        self.video.save()
+        self.assertIn("Renamed Title", render_video_cards([self.video]))
+
+    def test_home_renders_cached_fragment(self):
+        render_video_cards(get_video_cards([self.video.id]))
+        with patch("videos.cards.render_to_string") as render_mock:
+            response = self.client.get(reverse("videos:home"))
+        render_mock.assert_not_called()
+        self.assertContains(response, self.video.title)
+
+
+class SubscriptionTimelineTests(FeedTestCase):
+    """訂閱頁 timeline：fan-out 寫入與大頻道讀取時合併"""
+
+    def setUp(self):
+        super().setUp()
+        self.viewer = self.create_test_user(username="viewer")
+        self.channel = self.create_test_user(username="small_channel")
+        self.big_channel = self.create_test_user(username="big_channel")
+        self.big_channel.profile.subscriber_count = TIMELINE_PULL_THRESHOLD
+        self.big_channel.profile.save()
+        Subscription.objects.create(subscriber=self.viewer, subscribed_to=self.channel)
+        Subscription.objects.create(subscriber=self.viewer, subscribed_to=self.big_channel)
+        now = timezone.now()
+        self.videos = [
+            self.create_test_video(
+                title=f"Sub Video {i}",
+                uploader=self.big_channel if i % 2 else self.channel,
+                upload_date=now - timezone.timedelta(hours=i),
+            )
+            for i in range(5)
+        ]
+        self.create_test_video(title="Not Subscribed", uploader=self.user)
+        self.client.force_login(self.viewer)
+
+    def get_page(self, **params):
+        return self.client.get(reverse("videos:subscriptions"), params).context["page_obj"]
+
+    def test_merges_timeline_and_big_channels(self):
+        first = self.get_page()
+        self.assertEqual(self.feed_ids(timeline_key(self.viewer.id)), [v.id for v in self.videos[::2]])
+        self.assertEqual(list(first), self.videos)
+        self.assertFalse(first.has_next())
+
+    def test_cursor_paging_across_sources(self):
+        paginator = TimelinePaginator(self.viewer, 2)
+        first = paginator.get_page()
+        second = paginator.get_page(after=first.next_cursor)
+        third = paginator.get_page(after=second.next_cursor)
+        self.assertEqual([*first, *second, *third], self.videos)
+        self.assertFalse(third.has_next())
+        previous = paginator.get_page(before=second.previous_cursor)
+        self.assertEqual(list(previous), self.videos[:2])
+        self.assertFalse(previous.has_previous())
+
+    def test_fan_out_pushes_only_small_channels(self):
+        self.get_page()
+        # fan-out 子任務以 Celery group 分派，測試中就地執行
+        with eager_celery_tasks(), patch("interactions.tasks.get_channel_layer"):
+            small = self.create_test_video(title="Fresh Small", uploader=self.channel)
+            notify_subscribers_of_new_video(small.id)
+            big = self.create_test_video(title="Fresh Big", uploader=self.big_channel)
+            notify_subscribers_of_new_video(big.id)
+        timeline = self.feed_ids(timeline_key(self.viewer.id))
+        self.assertEqual(timeline[0], small.id)
+        self.assertNotIn(big.id, timeline)
+        self.assertEqual(list(self.get_page())[:2], [big, small])
+
+    def test_video_made_public_reaches_timelines(self):
+        self.get_page()
+        hidden = self.create_test_video(
+            title="Later Public", uploader=self.channel, visibility="private", processing_status="completed"
+        )
+        big = self.create_test_video(
+            title="Later Public Big", uploader=self.big_channel, visibility="private", processing_status="completed"
+        )
+        for video in (hidden, big):
+            video = Video.objects.get(id=video.id)
+            video.visibility = "public"
+            with patch("videos.signals.push_to_subscriber_timelines.delay") as push:
+                with self.captureOnCommitCallbacks(execute=True):
+                    video.save()
+            push.assert_called_once_with(video.id)
+            push_to_subscriber_timelines(video.id)
+        timeline = self.feed_ids(timeline_key(self.viewer.id))
+        self.assertEqual(timeline[0], hidden.id)
+        self.assertNotIn(big.id, timeline)
+
+        # 已公開影片的其他編輯不再寫入
+        with patch("videos.signals.push_to_subscriber_timelines.delay") as push:
+            with self.captureOnCommitCallbacks(execute=True):
+                video.title = "Renamed"
+                video.save()
+        push.assert_not_called()
+
+    def test_channel_dropping_below_threshold_rebuilds_timelines(self):
+        """大頻道跌回門檻以下：當大頻道期間的影片不在 timeline 中，訂閱者的 timeline 要重建"""
+        self.get_page()
+        self.assertTrue(get_redis().exists(timeline_key(self.viewer.id)))
+        with patch("videos.tasks.invalidate_subscriber_timelines.delay") as invalidate:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.big_channel.profile.refresh_subscriber_count()
+        invalidate.assert_called_once_with(self.big_channel.id)
+        invalidate_subscriber_timelines(self.big_channel.id)
+        self.assertFalse(get_redis().exists(timeline_key(self.viewer.id)))
+        self.assertEqual(list(self.get_page()), self.videos)
+
+        # 仍在門檻以下的變動不再處理
+        with patch("videos.tasks.invalidate_subscriber_timelines.delay") as invalidate:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.big_channel.profile.refresh_subscriber_count()
+        invalidate.assert_not_called()
+
+    def test_subscription_change_rebuilds_timeline(self):
+        self.get_page()
+        Subscription.objects.create(subscriber=self.viewer, subscribed_to=self.user)
+        self.assertFalse(get_redis().exists(timeline_key(self.viewer.id)))
+        self.assertIn("Not Subscribed", [video.title for video in self.get_page()])
+
+    def test_redis_failure_falls_back_to_database(self):
+        with patch("videos.feeds.get_redis", side_effect=redis.ConnectionError):
+            self.assertEqual(list(self.get_page()), self.videos)
+
+    def test_requires_login(self):
+        self.client.logout()
+        response = self.client.get(reverse("videos:subscriptions"))
+        self.assertEqual(response.status_code, 302)
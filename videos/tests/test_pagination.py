@@ -0,0 +1,188 @@
+"""分頁測試：keyset（cursor）分頁器、列表總數快取與使用它們的列表頁。"""
+
+from unittest.mock import patch
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from videos.models import Video
+from videos.pagination import (
+    EXACT_COUNT_MAX_ROWS,
+    KeysetPaginator,
+    cached_count,
+    decode_cursor,
+    encode_cursor,
+)
+
+from .base import BaseVideoTestCase, clear_redis_state
+
+
+class CursorEncodingTests(BaseVideoTestCase):
+    """cursor 編解碼測試"""
+
+    def test_round_trip_keeps_microseconds(self):
+        """編碼再解碼應還原同一個 (時間, id)，微秒不可因浮點誤差遺失"""
+        moment = timezone.now().replace(microsecond=123457)
+        self.assertEqual(decode_cursor(encode_cursor(moment, 42)), (moment, 42))
+
+    def test_numeric_round_trip(self):
+        """float 排序值（留言熱門分數）原樣還原"""
+        score = 1712345678.123456789
+        self.assertEqual(decode_cursor(encode_cursor(score, 7), numeric=True), (score, 7))
+        self.assertIsNone(decode_cursor("nan_7", numeric=True))
+
+    def test_invalid_cursor_returns_none(self):
+        """格式錯誤的 cursor 視同第一頁"""
+        for cursor in (None, "", "abc", "123", "x_1", "1_y", "9" * 40 + "_1"):
+            self.assertIsNone(decode_cursor(cursor), cursor)
+
+
+class KeysetPaginatorTests(BaseVideoTestCase):
+    """keyset 分頁器測試"""
+
+    def setUp(self):
+        self.user = self.create_test_user()
+        now = timezone.now()
+        # 兩兩同一時間點，驗證 id 作為 tie-breaker 時不會跳過或重複
+        self.videos = [
+            self.create_test_video(
+                title=f"Video {i}", uploader=self.user, upload_date=now - timezone.timedelta(hours=i // 2)
+            )
+            for i in range(7)
+        ]
+        self.expected = list(Video.objects.order_by("-upload_date", "-id"))
+
+    def _walk_forward(self, paginator):
+        page = paginator.get_page()
+        seen = list(page)
+        while page.has_next():
+            page = paginator.get_page(after=page.next_cursor)
+            seen.extend(page)
+        return seen
+
+    def test_first_page(self):
+        page = KeysetPaginator(Video.objects.all(), 3).get_page()
+        self.assertEqual(list(page), self.expected[:3])
+        self.assertTrue(page.has_next())
+        self.assertFalse(page.has_previous())
+
+    def test_walk_forward_visits_every_row_once(self):
+        self.assertEqual(self._walk_forward(KeysetPaginator(Video.objects.all(), 3)), self.expected)
+
+    def test_walk_backward_returns_previous_page(self):
+        paginator = KeysetPaginator(Video.objects.all(), 3)
+        second = paginator.get_page(after=paginator.get_page().next_cursor)
+        previous = paginator.get_page(before=second.previous_cursor)
+        self.assertEqual(list(previous), self.expected[:3])
+        self.assertFalse(previous.has_previous())
+        self.assertTrue(previous.has_next())
+
+    def test_last_page_has_no_next(self):
+        paginator = KeysetPaginator(Video.objects.all(), 3)
+        page = paginator.get_page(after=paginator.cursor_for(self.expected[5]))
+        self.assertEqual(list(page), self.expected[6:])
+        self.assertFalse(page.has_next())
+        self.assertIsNone(page.next_cursor)
+
+    def test_ascending_order(self):
+        paginator = KeysetPaginator(Video.objects.all(), 3, descending=False)
+        self.assertEqual(self._walk_forward(paginator), self.expected[::-1])
+
+    def test_invalid_cursor_falls_back_to_first_page(self):
+        page = KeysetPaginator(Video.objects.all(), 3).get_page(after="garbage")
+        self.assertEqual(list(page), self.expected[:3])
+
+    def test_pages_do_not_count(self):
+        """翻頁不應執行 COUNT；只多取一筆判斷是否有下一頁"""
+        paginator = KeysetPaginator(Video.objects.all(), 3)
+        with self.assertNumQueries(1):
+            page = paginator.get_page()
+        with self.assertNumQueries(1):
+            paginator.get_page(after=page.next_cursor)
+
+    def test_cursor_filter_has_index_bound(self):
+        """cursor 條件除了 OR 之外要有單獨的 upload_date 上界，planner 才能從 cursor 位置掃索引"""
+        paginator = KeysetPaginator(Video.objects.all(), 3)
+        cursor = paginator.cursor_for(self.expected[2])
+        with CaptureQueriesContext(connection) as queries:
+            paginator.get_page(after=cursor)
+        self.assertIn('"upload_date" <= ', queries[0]["sql"])
+
+
+class ListingPaginationViewTests(BaseVideoTestCase):
+    """列表頁以 cursor 翻頁"""
+
+    def setUp(self):
+        clear_redis_state()
+
+    def test_home_next_page_via_cursor(self):
+        user = self.create_test_user()
+        for i in range(13):
+            self.create_test_video(title=f"Home Video {i}", uploader=user)
+
+        response = self.client.get(reverse("videos:home"))
+        page_obj = response.context["page_obj"]
+        self.assertEqual(len(page_obj), 12)
+        self.assertContains(response, f"?after={page_obj.next_cursor}")
+
+        response = self.client.get(reverse("videos:home"), {"after": page_obj.next_cursor})
+        self.assertEqual(len(response.context["videos"]), 1)
+        self.assertContains(response, "?before=")
+
+
+class CachedCountTests(BaseVideoTestCase):
+    """列表總數快取測試"""
+
+    def setUp(self):
+        clear_redis_state()
+        self.user = self.create_test_user()
+        for i in range(3):
+            self.create_test_video(title=f"Counted Video {i}", uploader=self.user)
+
+    def test_second_lookup_hits_cache(self):
+        self.assertEqual(cached_count(Video.objects.listable(), "home"), 3)
+        with self.assertNumQueries(0):
+            self.assertEqual(cached_count(Video.objects.listable(), "home"), 3)
+
+    def test_publish_invalidates_count(self):
+        cached_count(Video.objects.listable(), "home")
+        self.create_test_video(title="Newly Published", uploader=self.user)
+        self.assertEqual(cached_count(Video.objects.listable(), "home"), 4)
+
+    def test_delete_invalidates_count(self):
+        cached_count(Video.objects.listable(), "home")
+        Video.objects.first().delete()
+        self.assertEqual(cached_count(Video.objects.listable(), "home"), 2)
+
+    def test_processing_status_save_keeps_count(self):
+        """只更新轉檔狀態的 save 不影響列表，不應讓快取失效"""
+        cached_count(Video.objects.listable(), "home")
+        video = Video.objects.first()
+        video.processing_status = "completed"
+        video.save(update_fields=["processing_status"])
+        with self.assertNumQueries(0):
+            cached_count(Video.objects.listable(), "home")
+
+    def test_large_table_uses_planner_estimate(self):
+        """大表改用 EXPLAIN 估計列數，不執行 COUNT"""
+        with (
+            patch("videos.pagination._table_row_estimate", return_value=EXACT_COUNT_MAX_ROWS + 1),
+            CaptureQueriesContext(connection) as ctx,
+        ):
+            estimate = cached_count(Video.objects.listable(), "home")
+        self.assertIsInstance(estimate, int)
+        self.assertTrue(any(q["sql"].startswith("EXPLAIN") for q in ctx.captured_queries))
+        self.assertFalse(any("COUNT(" in q["sql"] for q in ctx.captured_queries))
+
+    def test_empty_queryset_skips_database(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(cached_count(Video.objects.none(), "search:"), 0)
+
+    def test_search_page_count_is_cached(self):
+        response = self.client.get(reverse("videos:search_videos"), {"query": "Counted"})
+        self.assertEqual(response.context["page_obj"].paginator.count, 3)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse("videos:search_videos"), {"query": "counted"})
+        self.assertFalse(any("COUNT(" in q["sql"] for q in ctx.captured_queries))
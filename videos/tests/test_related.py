@@ -0,0 +1,95 @@
+"""相關影片推薦測試：特徵相似度排序、Redis 預先計算結果與觀看頁讀取。"""
+
+from unittest.mock import patch
+
+from django.urls import reverse
+
+from interactions.models import Comment, LikeDislike
+from videos.models import Video
+from videos.related import _load_features, get_related_videos, refresh_related_videos, related_key
+from videos.tasks import compute_related_videos
+from youtube_service.redis_client import get_redis
+
+from .base import BaseVideoTestCase, clear_redis_state
+
+
+class RelatedVideosTests(BaseVideoTestCase):
+    def setUp(self):
+        clear_redis_state()
+        self.user = self.create_test_user()
+        self.other_uploader = self.create_test_user(username="other_uploader")
+        self.music = self.create_test_category(name="Music")
+        self.gaming = self.create_test_category(name="Gaming")
+
+        self.video = self.create_test_video(title="Guitar Lesson", uploader=self.user, category=self.music)
+        self.video.tags.add("guitar", "lesson")
+        self.same_tags = self.create_test_video(title="Guitar Chords", uploader=self.other_uploader)
+        self.same_tags.tags.add("guitar", "lesson")
+        self.same_category = self.create_test_video(title="Piano", uploader=self.other_uploader, category=self.music)
+        # 最新上傳但毫無關聯：舊版「最新影片」會把它排第一
+        self.unrelated = self.create_test_video(title="Speedrun", uploader=self.other_uploader, category=self.gaming)
+
+    def test_shared_features_rank_above_newer_unrelated_videos(self):
+        refresh_related_videos()
+        related = get_related_videos(self.video)
+        self.assertEqual(related[:2], [self.same_tags, self.same_category])
+        self.assertNotIn(self.unrelated, related)
+
+    def test_co_engagement_links_videos(self):
+        """同一批使用者按讚的影片彼此相關"""
+        fan = self.create_test_user(username="fan")
+        LikeDislike.objects.create(video=self.same_category, user=fan, type=LikeDislike.LIKE)
+        LikeDislike.objects.create(video=self.unrelated, user=fan, type=LikeDislike.LIKE)
+        refresh_related_videos()
+        self.assertEqual(get_related_videos(self.unrelated)[0], self.same_category)
+
+    def test_engaged_features_keep_most_recent_users(self):
+        fans = [self.create_test_user(username=f"engaged_fan_{i}") for i in range(3)]
+        LikeDislike.objects.create(video=self.video, user=fans[0], type=LikeDislike.LIKE)
+        LikeDislike.objects.create(video=self.video, user=fans[1], type=LikeDislike.DISLIKE)
+        Comment.objects.create(video=self.video, user=fans[1], content="Nice")
+        Comment.objects.create(video=self.video, user=fans[2], content="Later")
+        with patch("videos.related.MAX_ENGAGED_PER_VIDEO", 2):
+            features, _ = _load_features()
+        engaged = {value for kind, value in features[self.video.id] if kind == "engaged"}
+        self.assertEqual(engaged, {fans[1].id, fans[2].id})
+
+    def test_results_are_written_in_batches(self):
+        """每批算完就寫入：中途失敗時前面批次的結果已保留"""
+        with patch("videos.related.RELATED_WRITE_BATCH", 1):
+            self.assertEqual(refresh_related_videos(), Video.objects.listable().count())
+        get_redis().delete(*[related_key(video.id) for video in Video.objects.all()])
+
+        def fail_after_first(features, ordered_ids, video_ids=None):
+            yield self.video.id, [self.same_tags.id]
+            raise TimeoutError
+
+        with patch("videos.related.RELATED_WRITE_BATCH", 1), patch("videos.related.compute_related", fail_after_first):
+            with self.assertRaises(TimeoutError):
+                refresh_related_videos()
+        self.assertEqual(get_related_videos(self.video), [self.same_tags])
+
+    def test_not_yet_computed_falls_back_to_latest(self):
+        self.assertEqual(get_related_videos(self.video), [self.unrelated, self.same_category, self.same_tags])
+
+    def test_video_made_private_after_compute_is_hidden(self):
+        refresh_related_videos()
+        self.same_tags.visibility = "private"
+        self.same_tags.save()
+        self.assertNotIn(self.same_tags, get_related_videos(self.video))
+
+    def test_warm_lookup_skips_database(self):
+        refresh_related_videos()
+        get_related_videos(self.video)
+        with self.assertNumQueries(0):
+            get_related_videos(self.video)
+
+    def test_periodic_task_covers_every_listable_video(self):
+        self.create_test_video(title="Hidden", uploader=self.user, visibility="private")
+        self.assertEqual(compute_related_videos(), Video.objects.listable().count())
+
+    def test_watch_page_shows_precomputed_videos(self):
+        refresh_related_videos()
+        response = self.client.get(reverse("videos:video_detail", args=[self.video.id]))
+        self.assertEqual(response.context["related_videos"][0], self.same_tags)
+        self.assertContains(response, "Guitar Chords")
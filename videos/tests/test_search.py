@@ -0,0 +1,216 @@
+"""全文搜尋測試：斷詞、加權搜尋文件與 signal 維護、結果快取，以及自動完成的前綴索引。"""
+
+from unittest.mock import patch
+
+from django.core.paginator import Paginator
+from django.test import SimpleTestCase
+from django.urls import reverse
+
+from videos.models import Video, VideoSearchDocument
+from videos.search import SearchResults, document_tokens, normalize_query, query_tokens, search_queryset
+from videos.suggest import SUGGEST_CHANGES_KEY, SuggestIndex, get_index, suggest
+from videos.tasks import rebuild_search_documents
+from youtube_service.redis_client import get_redis
+
+from .base import BaseVideoTestCase, clear_redis_state
+
+
+class TokenizerTests(SimpleTestCase):
+    def test_cjk_unigrams_and_bigrams(self):
+        self.assertEqual(document_tokens("貓咪日常"), ["貓", "咪", "日", "常", "貓咪", "咪日", "日常"])
+
+    def test_mixed_text_splits_words_and_cjk_runs(self):
+        self.assertEqual(document_tokens("Python教學 v3_x"), ["python", "教", "學", "教學", "v3", "x"])
+
+    def test_query_uses_bigrams_for_multi_char_runs(self):
+        self.assertEqual(query_tokens("機器學習"), [("機器", False), ("器學", False), ("學習", False)])
+        self.assertEqual(query_tokens("貓 gui"), [("貓", False), ("gui", True)])
+
+    def test_fullwidth_and_case_normalize(self):
+        self.assertEqual(normalize_query("  ＰＹＴＨＯＮ  貓咪 "), normalize_query("python 貓咪"))
+        self.assertEqual(normalize_query("?!"), "")
+
+
+class SearchDocumentTests(BaseVideoTestCase):
+    def setUp(self):
+        self.user = self.create_test_user(username="小明")
+        self.category = self.create_test_category(name="音樂")
+        self.video = self.create_test_video(title="Guitar Lesson", uploader=self.user, category=self.category)
+
+    def search(self, query):
+        return list(search_queryset(Video.objects.listable(), query))
+
+    def test_document_created_on_save(self):
+        self.assertTrue(VideoSearchDocument.objects.filter(video=self.video).exists())
+        self.assertEqual(self.search("gui"), [self.video])
+
+    def test_matches_uploader_and_category(self):
+        self.assertEqual(self.search("小明"), [self.video])
+        self.assertEqual(self.search("音樂 lesson"), [self.video])
+
+    def test_tag_changes_update_document(self):
+        self.video.tags.add("吉他")
+        self.assertEqual(self.search("吉他"), [self.video])
+        self.video.tags.clear()
+        self.assertEqual(self.search("吉他"), [])
+
+    def test_title_outranks_description(self):
+        described = self.create_test_video(title="Other", uploader=self.user, description="guitar")
+        self.assertEqual(self.search("guitar"), [self.video, described])
+
+    @patch("videos.tasks.rebuild_search_documents.delay", side_effect=rebuild_search_documents)
+    def test_uploader_rename_rebuilds_documents(self, mock_delay):
+        self.user.username = "阿華"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        mock_delay.assert_called_once_with(uploader_id=self.user.id)
+        self.assertEqual(self.search("阿華"), [self.video])
+        self.assertEqual(self.search("小明"), [])
+
+    @patch("videos.tasks.rebuild_search_documents.delay", side_effect=rebuild_search_documents)
+    def test_category_rename_and_delete_rebuild_documents(self, mock_delay):
+        self.category.name = "樂器"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.save()
+        self.assertEqual(self.search("樂器"), [self.video])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.delete()
+        self.assertEqual(self.search("樂器"), [])
+
+
+class SearchResultCacheTests(BaseVideoTestCase):
+    def setUp(self):
+        clear_redis_state()
+        self.user = self.create_test_user()
+        self.videos = [self.create_test_video(title=f"Guitar Lesson {i}", uploader=self.user) for i in range(3)]
+
+    def page(self, query, number=1, per_page=12):
+        return list(Paginator(SearchResults(Video.objects.listable(), query), per_page).page(number))
+
+    def test_hot_query_skips_database(self):
+        first = self.page("guitar")
+        with self.assertNumQueries(0):
+            self.assertEqual(self.page("  GUITAR "), first)
+        self.assertEqual(len(first), 3)
+
+    def test_publish_invalidates_cached_results(self):
+        self.page("guitar")
+        fresh = self.create_test_video(title="Guitar Lesson New", uploader=self.user)
+        self.assertIn(fresh, self.page("guitar"))
+
+    def test_video_made_private_is_hidden(self):
+        self.page("guitar")
+        self.videos[0].visibility = "private"
+        self.videos[0].save()
+        self.assertNotIn(self.videos[0], self.page("guitar"))
+
+    @patch("videos.search.SEARCH_RESULT_CACHE_SIZE", 2)
+    def test_pages_beyond_cached_ids_query_database(self):
+        results = [self.page("guitar", number, per_page=1)[0] for number in (1, 2, 3)]
+        self.assertCountEqual(results, self.videos)
+        self.assertEqual(Paginator(SearchResults(Video.objects.listable(), "guitar"), 1).count, 3)
+
+
+class SearchFacetTests(BaseVideoTestCase):
+    def setUp(self):
+        clear_redis_state()
+        self.user = self.create_test_user()
+        self.music = self.create_test_category(name="Music")
+        self.gaming = self.create_test_category(name="Gaming")
+        self.lesson = self.create_test_video(title="Guitar Lesson", uploader=self.user, category=self.music)
+        self.lesson.tags.add("acoustic")
+        self.cover = self.create_test_video(title="Guitar Cover", uploader=self.user, category=self.music)
+        self.cover.tags.add("acoustic", "cover")
+        self.game = self.create_test_video(title="Guitar Hero Run", uploader=self.user, category=self.gaming)
+
+    def results(self, **filters):
+        return SearchResults(Video.objects.listable(), "guitar", **filters)
+
+    def test_facet_counts(self):
+        facets = self.results().facets()
+        self.assertEqual(facets["category"], [("music", "Music", 2), ("gaming", "Gaming", 1)])
+        self.assertEqual(facets["tag"], [("acoustic", "acoustic", 2), ("cover", "cover", 1)])
+
+    def test_filters_narrow_results_without_queries(self):
+        list(Paginator(self.results(), 12).page(1))
+        with self.assertNumQueries(0):
+            results = self.results(category="music", tag="cover")
+            self.assertEqual(list(Paginator(results, 12).page(1)), [self.cover])
+            facets = results.facets()
+        # 各 facet 的數量不套用自己的篩選，可直接切換到同 facet 的其他選項
+        self.assertEqual(facets["category"], [("music", "Music", 1)])
+        self.assertEqual(facets["tag"], [("acoustic", "acoustic", 2), ("cover", "cover", 1)])
+        self.assertEqual(self.results(tag="missing").count(), 0)
+
+    @patch("videos.search.SEARCH_RESULT_CACHE_SIZE", 1)
+    def test_filters_beyond_cached_ids_query_database(self):
+        results = self.results(category="music")
+        self.assertEqual(results.count(), 2)
+        self.assertEqual(len(list(Paginator(results, 1).page(2))), 1)
+
+    def test_search_page_renders_facets_and_keeps_filters(self):
+        response = self.client.get(reverse("videos:search_videos"), {"query": "guitar", "category": "music"})
+        self.assertEqual(list(response.context["videos"]), [self.cover, self.lesson])
+        self.assertContains(response, "chip chip--selected")
+        self.assertEqual(response.context["page_params"], "category=music")
+
+
+class SuggestIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.index = SuggestIndex([(1, "Guitar Lesson 吉他入門", 10), (2, "Bass Guitar", 50), (3, "Guitarist Life", 5)])
+
+    def test_matches_word_starts_and_any_cjk_position(self):
+        self.assertEqual(self.index.search("gui"), ["Bass Guitar", "Guitar Lesson 吉他入門", "Guitarist Life"])
+        self.assertEqual(self.index.search("他入"), ["Guitar Lesson 吉他入門"])
+        self.assertEqual(self.index.search("uitar"), [])
+
+    def test_query_longer_than_key_length(self):
+        index = SuggestIndex([(1, "An Extremely Long Video Title About Guitars", 0)])
+        self.assertEqual(index.search("an extremely long video title"), ["An Extremely Long Video Title About Guitars"])
+        self.assertEqual(index.search("an extremely long video titles"), [])
+
+    @patch("videos.suggest.SUGGEST_SCAN_LIMIT", 1)
+    def test_hot_prefixes_use_precomputed_candidates(self):
+        index = SuggestIndex([(1, "Guitar Lesson 吉他入門", 10), (2, "Bass Guitar", 50), (3, "Guitarist Life", 5)])
+        self.assertEqual(index.heads["gui"], [2, 1, 3])
+        index.add(4, "Guitar Hero", 100)
+        self.assertEqual(index.heads["gui"][0], 4)
+        index.remove(4)
+        self.assertEqual(index.search("guitar", limit=2), ["Bass Guitar", "Guitar Lesson 吉他入門"])
+
+    def test_incremental_updates(self):
+        self.index.add(4, "Guitar Hero", 100)
+        self.assertEqual(self.index.search("gui", limit=1), ["Guitar Hero"])
+        self.index.add(4, "Piano Hero", 100)
+        self.assertEqual(self.index.search("gui", limit=1), ["Bass Guitar"])
+        self.index.remove(2)
+        self.assertEqual(self.index.search("bass"), [])
+
+
+class SuggestSyncTests(BaseVideoTestCase):
+    def setUp(self):
+        clear_redis_state()
+        self.user = self.create_test_user()
+        self.video = self.create_test_video(title="Guitar Lesson", uploader=self.user)
+
+    def test_warm_lookup_skips_database(self):
+        self.assertEqual(suggest("gui"), ["Guitar Lesson"])
+        with self.assertNumQueries(0):
+            self.assertEqual(suggest("guitar l"), ["Guitar Lesson"])
+
+    def test_publish_and_unpublish_update_index(self):
+        suggest("gui")
+        published = self.create_test_video(title="Guitar Chords", uploader=self.user)
+        self.assertIn("Guitar Chords", suggest("gui"))
+        published.visibility = "private"
+        published.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.video.delete()
+        self.assertEqual(suggest("gui"), [])
+
+    def test_changes_from_other_processes_are_synced(self):
+        index = get_index()
+        get_redis().xadd(SUGGEST_CHANGES_KEY, {"id": 999, "title": "Guitar Remote", "popularity": 0})
+        index.next_sync = 0.0
+        self.assertIn("Guitar Remote", suggest("gui"))
@@ -0,0 +1,106 @@
+"""熱門排行測試：事件記錄、週期衰減與排行頁/API。"""
+
+import time
+
+from django.urls import reverse
+
+from interactions.models import Comment, LikeDislike
+from videos.tasks import apply_trending_scores
+from videos.trending import (
+    GLOBAL_TRENDING_KEY,
+    TRENDING_HALF_LIFE,
+    apply_trending_deltas,
+    category_trending_key,
+    get_trending,
+    record_event,
+)
+from youtube_service.redis_client import get_redis
+
+from .base import BaseVideoTestCase, clear_redis_state
+
+
+class TrendingTests(BaseVideoTestCase):
+    def setUp(self):
+        clear_redis_state()
+        self.user = self.create_test_user()
+        self.fan = self.create_test_user(username="fan")
+        self.category = self.create_test_category()
+        self.hot = self.create_test_video(title="Hot Video", uploader=self.user, category=self.category)
+        self.warm = self.create_test_video(title="Warm Video", uploader=self.user)
+
+    def score(self, video, key=GLOBAL_TRENDING_KEY):
+        return get_redis().zscore(key, video.id)
+
+    def test_weighted_events_rank_videos(self):
+        LikeDislike.objects.create(video=self.hot, user=self.fan, type=LikeDislike.LIKE)
+        Comment.objects.create(video=self.hot, user=self.fan, content="Nice")
+        record_event(self.warm.id, "view")
+        apply_trending_scores()
+        self.assertEqual([video for video, _ in get_trending()], [self.hot, self.warm])
+        self.assertEqual(self.score(self.hot), 8.0)
+        self.assertEqual([video for video, _ in get_trending(self.category.id)], [self.hot])
+
+    def test_scores_decay_by_half_life(self):
+        now = time.time()
+        record_event(self.hot.id, "like")
+        apply_trending_deltas(now)
+        record_event(self.warm.id, "like")
+        apply_trending_deltas(now + TRENDING_HALF_LIFE)
+        self.assertAlmostEqual(self.score(self.hot), 2.5)
+        self.assertAlmostEqual(self.score(self.hot, category_trending_key(self.category.id)), 2.5)
+        self.assertEqual(self.score(self.warm), 5.0)
+
+    def test_cold_videos_are_pruned(self):
+        now = time.time()
+        record_event(self.hot.id, "view")
+        apply_trending_deltas(now)
+        apply_trending_deltas(now + TRENDING_HALF_LIFE * 10)
+        self.assertIsNone(self.score(self.hot))
+
+    def test_withdrawn_like_cancels_out(self):
+        vote = LikeDislike.objects.create(video=self.hot, user=self.fan, type=LikeDislike.LIKE)
+        vote.delete()
+        record_event(self.warm.id, "view")
+        apply_trending_deltas()
+        self.assertIsNone(self.score(self.hot))
+
+    def test_private_videos_are_not_ranked(self):
+        hidden = self.create_test_video(title="Hidden", uploader=self.user, visibility="private")
+        record_event(hidden.id, "like")
+        apply_trending_deltas()
+        self.assertIsNone(self.score(hidden))
+
+    def test_first_view_is_recorded(self):
+        self.client.get(reverse("videos:video_detail", args=[self.hot.id]))
+        self.client.get(reverse("videos:video_detail", args=[self.hot.id]))
+        apply_trending_deltas()
+        self.assertEqual(self.score(self.hot), 1.0)
+
+    def test_warm_read_skips_database(self):
+        record_event(self.hot.id, "view")
+        apply_trending_deltas()
+        get_trending()
+        with self.assertNumQueries(0):
+            get_trending()
+
+    def test_trending_page(self):
+        record_event(self.hot.id, "like")
+        apply_trending_deltas()
+        response = self.client.get(reverse("videos:trending"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["videos"], [self.hot])
+        self.assertContains(response, "Hot Video")
+
+        response = self.client.get(reverse("videos:trending"), {"category": "missing"})
+        self.assertEqual(response.status_code, 404)
+
+    def test_trending_api(self):
+        record_event(self.hot.id, "like")
+        record_event(self.warm.id, "view")
+        apply_trending_deltas()
+        data = self.client.get(reverse("videos:trending_api"), {"limit": "1"}).json()
+        self.assertEqual([video["id"] for video in data["videos"]], [self.hot.id])
+        self.assertEqual(data["videos"][0]["score"], 5.0)
+
+        data = self.client.get(reverse("videos:trending_api"), {"category": self.category.slug, "limit": "x"}).json()
+        self.assertEqual([video["id"] for video in data["videos"]], [self.hot.id])
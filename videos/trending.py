@@ -0,0 +1,98 @@
+"""熱門影片排行：觀看、按讚、留言以時間衰減分數累計在 Redis sorted set。
+
+請求路徑只做一次 HINCRBY 把事件權重記進 pending hash（record_event），
+週期任務 apply_trending_deltas 每分鐘取走累積的增量：先把所有排行的既有分數依經過時間
+乘上衰減係數（半衰期 TRENDING_HALF_LIFE），再加上新增量，最後裁掉低分與超出長度的成員。
+讀取排行只查 Redis 與卡片快取，任何時候都不對資料庫做全表彙總。
+"""
+
+import logging
+import time
+
+import redis
+
+from youtube_service.redis_client import get_redis
+
+from .cards import get_video_cards
+from .models import Video
+
+logger = logging.getLogger(__name__)
+
+# 事件權重：按讚、留言比單純觀看更能代表熱度；取消讚以負權重抵銷，避免反覆按讚灌分
+EVENT_WEIGHTS = {"view": 1.0, "like": 5.0, "unlike": -5.0, "comment": 3.0}
+TRENDING_HALF_LIFE = 60 * 60 * 6
+TRENDING_MAX_LENGTH = 500
+# 衰減到此分數以下的影片移出排行，排行不會無限累積冷門影片
+TRENDING_MIN_SCORE = 0.05
+
+GLOBAL_TRENDING_KEY = "trending:global"
+_PENDING_KEY = "trending:pending"
+_LAST_APPLIED_KEY = "trending:last_applied"
+# 目前存在的所有排行 key，衰減時逐一處理
+_KEYS_REGISTRY = "trending:keys"
+
+
+def category_trending_key(category_id):
+    return f"trending:category:{category_id}"
+
+
+def record_event(video_id, kind):
+    """記錄一次互動；Redis 失敗只記 log，不影響觀看/按讚/留言本身。"""
+    try:
+        get_redis().hincrbyfloat(_PENDING_KEY, str(video_id), EVENT_WEIGHTS[kind])
+    except redis.RedisError:
+        logger.warning("記錄影片 %s 的熱門事件失敗", video_id, exc_info=True)
+
+
+def apply_trending_deltas(now=None):
+    """衰減既有分數並套用累積增量；回傳本次有增量的影片數。"""
+    client = get_redis()
+    now = time.time() if now is None else now
+
+    # 取走與刪除在同一個 MULTI 內，這段期間新進的事件留給下一輪
+    pipe = client.pipeline()
+    pipe.hgetall(_PENDING_KEY)
+    pipe.delete(_PENDING_KEY)
+    pipe.set(_LAST_APPLIED_KEY, now, get=True)
+    pipe.smembers(_KEYS_REGISTRY)
+    deltas, _, last_applied, keys = pipe.execute()
+
+    factor = 0.5 ** (max(0.0, now - float(last_applied)) / TRENDING_HALF_LIFE) if last_applied else 1.0
+    # 只有可列出的影片進排行；分類在此批次查一次，不在請求路徑上查
+    rows = (
+        Video.objects.listable().filter(id__in=[int(video_id) for video_id in deltas]).values_list("id", "category_id")
+    )
+
+    pipe = client.pipeline(transaction=False)
+    if factor < 1.0:
+        for key in keys:
+            pipe.zunionstore(key, {key: factor})
+    for video_id, category_id in rows:
+        delta = float(deltas[str(video_id)])
+        target_keys = [GLOBAL_TRENDING_KEY]
+        if category_id:
+            target_keys.append(category_trending_key(category_id))
+        for key in target_keys:
+            pipe.zincrby(key, delta, video_id)
+            keys.add(key)
+    if keys:
+        pipe.sadd(_KEYS_REGISTRY, *keys)
+    for key in keys:
+        pipe.zremrangebyscore(key, "-inf", f"({TRENDING_MIN_SCORE}")
+        pipe.zremrangebyrank(key, 0, -(TRENDING_MAX_LENGTH + 1))
+    pipe.execute()
+    return len(rows)
+
+
+def get_trending(category_id=None, limit=50):
+    """取得熱門影片 [(Video, score), ...]；Redis 不可用時回傳空 list。"""
+    key = category_trending_key(category_id) if category_id else GLOBAL_TRENDING_KEY
+    try:
+        # 多取一些，讓排行更新前已轉為非公開/刪除的影片被濾掉後仍填得滿
+        entries = get_redis().zrevrange(key, 0, limit * 2 - 1, withscores=True)
+    except redis.RedisError:
+        logger.warning("讀取熱門排行 %s 失敗", key, exc_info=True)
+        return []
+    scores = {int(video_id): score for video_id, score in entries}
+    videos = [card for card in get_video_cards(list(scores)) if card.is_listable]
+    return [(video, scores[video.id]) for video in videos[:limit]]
@@ -12,6 +12,9 @@ urlpatterns = [
     # Assuming you want the home page of videos app to be distinct,
     # or it could be the root of the site later.
     path("", views.home, name="home"),  # Changed name to 'home'
+    path("subscriptions/", views.subscriptions, name="subscriptions"),
+    path("trending/", views.trending_videos, name="trending"),
+    path("api/trending/", views.trending_api, name="trending_api"),
     path("search/", views.search_videos, name="search_videos"),
     path("search/suggest/", views.search_suggest, name="search_suggest"),
     path("category/add/", views.add_category, name="add_category"),  # Moved up
@@ -4,26 +4,29 @@ import logging
 # Django imports
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.contrib.postgres.search import TrigramWordSimilarity
 from django.core.paginator import Paginator
-from django.db.models import Count, F, Q
+from django.db.models import F
 from django.http import Http404, HttpResponse, HttpResponseForbidden, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse
-from django.utils.http import url_has_allowed_host_and_scheme
+from django.utils.http import url_has_allowed_host_and_scheme, urlencode
 from django.views.decorators.http import require_safe
 
 # 第三方庫 imports
 from django_ratelimit.decorators import ratelimit
 from taggit.models import Tag
 
+from interactions.comment_pages import annotate_viewer_likes, get_comment_page
 from interactions.forms import CommentForm
 from interactions.models import Comment, LikeDislike, Subscription
-from interactions.views import COMMENTS_PER_PAGE
 
 # 本地應用 imports
+from . import search, suggest, trending
+from .feeds import LATEST_FEED_KEY, FeedPaginator, TimelinePaginator, category_feed_key
 from .forms import CategoryForm, VideoEditForm, VideoUploadForm
 from .models import Category, Video
+from .pagination import KeysetPaginator
+from .related import get_related_videos
 from .tasks import process_video
 
 logger = logging.getLogger(__name__)
@@ -73,28 +76,25 @@ def video_detail(request, video_id):
     if not video.is_accessible_by(request.user):
         raise Http404("影片不存在或無權限訪問")
 
-    top_level_comments = (
-        Comment.objects.filter(video=video, parent_comment__isnull=True)
-        .select_related("user")
-        .annotate(num_replies=Count("replies"))
-        .order_by("-timestamp")
-    )
-
     # 通知深連結：?comment=<id> 將該留言串釘選在列表最上方並預先展開回覆，
     # 確保留言分頁後 #comment-<id> anchor 仍然有效
     pinned_comment = None
     pinned_id = request.GET.get("comment")
     if pinned_id and pinned_id.isdigit():
-        pinned = (
-            Comment.objects.filter(video=video, pk=pinned_id).select_related("user", "parent_comment__user").first()
-        )
+        # 釘選的留言串不走快取，讚按鈕狀態直接標在 queryset 上
+        comments = annotate_viewer_likes(Comment.objects.filter(video=video).select_related("user"), request.user)
+        pinned = comments.filter(pk=pinned_id).first()
         if pinned:
-            pinned_comment = pinned.parent_comment or pinned
-            pinned_comment.preloaded_replies = list(pinned_comment.replies.select_related("user").order_by("timestamp"))
-            pinned_comment.num_replies = len(pinned_comment.preloaded_replies)
-            top_level_comments = top_level_comments.exclude(pk=pinned_comment.pk)
-
-    comments_page = Paginator(top_level_comments, COMMENTS_PER_PAGE).get_page(1)
+            pinned_comment = comments.get(pk=pinned.parent_comment_id) if pinned.parent_comment_id else pinned
+            pinned_comment.preloaded_replies = list(
+                comments.filter(parent_comment=pinned_comment).order_by("timestamp")
+            )
+
+    # 第一頁留言走快取（見 interactions/comment_pages.py）；有釘選留言時排除它，直接查詢
+    comment_sort = "top" if request.GET.get("sort") == "top" else "newest"
+    comments_page = get_comment_page(
+        video, request, exclude=pinned_comment.pk if pinned_comment else None, sort=comment_sort
+    )
     comments_count = video.comments.count()
     comment_form = CommentForm()
 
@@ -102,6 +102,7 @@ def video_detail(request, video_id):
     if not request.session.get(viewed_video_session_key, False):
         Video.objects.filter(pk=video.pk).update(views_count=F("views_count") + 1)
         video.refresh_from_db(fields=["views_count"])
+        trending.record_event(video.id, "view")
         request.session[viewed_video_session_key] = True
 
     vote_counts = video.vote_counts()
@@ -119,13 +120,12 @@ def video_detail(request, video_id):
     if request.user.is_authenticated and request.user != video.uploader:
         is_subscribed = Subscription.objects.filter(subscriber=request.user, subscribed_to=video.uploader).exists()
 
-    related_videos = (
-        Video.objects.listable().exclude(pk=video.pk).select_related("uploader").order_by("-upload_date")[:8]
-    )
+    related_videos = get_related_videos(video)
 
     context = {
         "video": video,
         "comments_page": comments_page,
+        "comment_sort": comment_sort,
         "comments_count": comments_count,
         "pinned_comment": pinned_comment,
         "comment_form": comment_form,
@@ -150,9 +150,9 @@ def home(request):
     Returns:
         HttpResponse: 渲染的首頁
     """
-    videos = Video.objects.listable().select_related("uploader").order_by("-upload_date")
-    paginator = Paginator(videos, 12)
-    page_obj = paginator.get_page(request.GET.get("page"))
+    videos = Video.objects.listable().select_related("uploader")
+    paginator = FeedPaginator(LATEST_FEED_KEY, videos, 12)
+    page_obj = paginator.get_page(after=request.GET.get("after"), before=request.GET.get("before"))
     return render(request, "videos/home.html", {"videos": page_obj, "page_obj": page_obj})
 
 
@@ -167,43 +167,78 @@ def search_videos(request):
         HttpResponse: 渲染的搜尋結果頁面
     """
     query = request.GET.get("query", "")
-    videos = Video.objects.none()
-    # 子字串匹配（icontains + trigram 索引）而非 tsvector 全文搜尋：
-    # 內建 text search config 不斷中文詞，tsvector 對中文內容幾乎無法命中。
-    # 空白分隔的關鍵字各自匹配再 AND，沿用原 SearchQuery(plain) 的多關鍵字語意。
-    terms = query.split()
-    if terms:
-        condition = Q()
-        for term in terms:
-            condition &= Q(title__icontains=term) | Q(description__icontains=term)
-        videos = (
-            Video.objects.listable()
-            .filter(condition)
-            # 排序用 word similarity：以「查詢與標題中最相似片段」計分，
-            # 避免短查詢對長標題被整串長度稀釋；title 命中者自然排在僅 description 命中者之前
-            .annotate(similarity=TrigramWordSimilarity(query, "title"))
-            .select_related("uploader")
-            .order_by("-similarity", "-upload_date")
-        )
-
-    paginator = Paginator(videos, 12)
+    category = request.GET.get("category", "")
+    tag = request.GET.get("tag", "")
+    # 搜尋文件以自行斷詞的 tsvector + GIN 索引比對（中文以 unigram/bigram 斷詞，見 videos/search.py）；
+    # 空白分隔的關鍵字各自匹配再 AND，標題命中的權重高於標籤、上傳者與描述。
+    # 排序結果、總數與分類/標籤 facet 依正規化查詢快取，熱門查詢翻頁與篩選不必重跑全文比對與 COUNT
+    results = search.SearchResults(Video.objects.listable(), query, category=category, tag=tag)
+    paginator = Paginator(results, 12)
     page_obj = paginator.get_page(request.GET.get("page"))
-    return render(request, "videos/search_results.html", {"videos": page_obj, "page_obj": page_obj, "query": query})
+    context = {
+        "videos": page_obj,
+        "page_obj": page_obj,
+        "query": query,
+        "facets": results.facets(),
+        "selected_category": category,
+        "selected_tag": tag,
+        # 分頁連結需保留目前的篩選條件
+        "page_params": urlencode({key: value for key, value in (("category", category), ("tag", tag)) if value}),
+    }
+    return render(request, "videos/search_results.html", context)
+
 
+@login_required
+def subscriptions(request):
+    """訂閱頻道的最新影片（timeline 見 videos.feeds.TimelinePaginator）。"""
+    paginator = TimelinePaginator(request.user, 12)
+    page_obj = paginator.get_page(after=request.GET.get("after"), before=request.GET.get("before"))
+    return render(request, "videos/subscriptions.html", {"videos": page_obj, "page_obj": page_obj})
 
-@ratelimit(key="ip", rate="30/m", method="GET", block=True)
+
+def trending_videos(request):
+    """熱門影片頁；?category=<slug> 顯示單一分類的排行。"""
+    category = None
+    category_slug = request.GET.get("category")
+    if category_slug:
+        category = get_object_or_404(Category, slug=category_slug)
+    entries = trending.get_trending(category.id if category else None)
+    context = {"videos": [video for video, _ in entries], "category": category}
+    return render(request, "videos/trending.html", context)
+
+
+@require_safe
+def trending_api(request):
+    """熱門影片 JSON API：?category=<slug>&limit=<1-50>。"""
+    category_id = None
+    category_slug = request.GET.get("category")
+    if category_slug:
+        category_id = get_object_or_404(Category, slug=category_slug).id
+    try:
+        limit = min(max(int(request.GET.get("limit", 20)), 1), 50)
+    except ValueError:
+        limit = 20
+    videos = [
+        {
+            "id": video.id,
+            "title": video.title,
+            "url": reverse("videos:video_detail", args=[video.id]),
+            "thumbnail_url": video.thumbnail.url if video.thumbnail else None,
+            "uploader": video.uploader.username,
+            "views_count": video.views_count,
+            "upload_date": video.upload_date.isoformat(),
+            "score": round(score, 3),
+        }
+        for video, score in trending.get_trending(category_id, limit)
+    ]
+    return JsonResponse({"videos": videos})
+
+
+# 建議由 process 內的前綴索引回答、不查資料庫，逐字輸入的請求量不再需要嚴格限流
+@ratelimit(key="ip", rate="120/m", method="GET", block=True)
 def search_suggest(request):
-    """回傳搜尋建議（最多 5 筆影片標題）。使用 icontains 而非全文搜尋，因為自動完成需要匹配部分輸入。"""
-    query = request.GET.get("q", "").strip()
-    if len(query) < 2:
-        return JsonResponse({"suggestions": []})
-    titles = list(
-        Video.objects.listable()
-        .filter(title__icontains=query)
-        .values_list("title", flat=True)
-        .order_by("-upload_date")[:5]
-    )
-    return JsonResponse({"suggestions": titles})
+    """回傳搜尋建議（最多 5 筆熱門影片標題）；中文可從任一字、英文可從任一單字開頭比對，見 videos/suggest.py。"""
+    return JsonResponse({"suggestions": suggest.suggest(request.GET.get("q", ""))})
 
 
 @login_required
@@ -230,9 +265,9 @@ def edit_video(request, video_id):
 
 def videos_by_category(request, category_slug):
     category = get_object_or_404(Category, slug=category_slug)
-    videos = Video.objects.listable().filter(category=category).select_related("uploader").order_by("-upload_date")
-    paginator = Paginator(videos, 12)
-    page_obj = paginator.get_page(request.GET.get("page"))
+    videos = Video.objects.listable().filter(category=category).select_related("uploader")
+    paginator = FeedPaginator(category_feed_key(category.id), videos, 12)
+    page_obj = paginator.get_page(after=request.GET.get("after"), before=request.GET.get("before"))
     context = {
         "category": category,
         "videos": page_obj,
@@ -243,9 +278,8 @@ def videos_by_category(request, category_slug):
 
 def videos_by_tag(request, tag_slug):
     tag = get_object_or_404(Tag, slug=tag_slug)
-    videos = Video.objects.listable().filter(tags__slug=tag_slug).select_related("uploader").order_by("-upload_date")
-    paginator = Paginator(videos, 12)
-    page_obj = paginator.get_page(request.GET.get("page"))
+    videos = Video.objects.listable().filter(tags__slug=tag_slug).select_related("uploader")
+    page_obj = KeysetPaginator(videos, 12).get_page(after=request.GET.get("after"), before=request.GET.get("before"))
     context = {
         "tag": tag,
         "videos": page_obj,
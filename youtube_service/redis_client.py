@@ -0,0 +1,32 @@
+"""原生 Redis 連線：首頁 feed 等需要 sorted set 等資料結構的功能使用。
+
+一般 key-value 快取請用 django.core.cache；這裡只給需要 Redis 原生指令的場合，
+資料放在獨立的 db（settings.REDIS_DATA_URL），內容皆可由資料庫重建。
+"""
+
+import asyncio
+import weakref
+from functools import cache
+
+import redis
+import redis.asyncio
+from django.conf import settings
+
+
+@cache
+def get_redis():
+    """per-process 共用的 client；redis-py 內建連線池且 thread-safe，可跨 thread 共用。"""
+    return redis.Redis.from_url(settings.REDIS_DATA_URL, decode_responses=True)
+
+
+# event loop -> async client；redis.asyncio 的連線綁定建立它的 loop，不能跨 loop 共用
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_redis():
+    """目前 event loop 共用的 async client（WebSocket consumer 等 async 程式碼使用），loop 結束後自動釋放。"""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = _async_clients[loop] = redis.asyncio.Redis.from_url(settings.REDIS_DATA_URL, decode_responses=True)
+    return client
@@ -268,6 +268,9 @@ CACHES = {
     }
 }
 
+# 首頁 feed 等 Redis 資料結構（sorted set 等，見 youtube_service/redis_client.py）；內容皆可由 DB 重建
+REDIS_DATA_URL = f"redis://{_REDIS_HOST}:6379/4"
+
 # Session (use cache-backed sessions)
 SESSION_ENGINE = "django.contrib.sessions.backends.cache"
 SESSION_CACHE_ALIAS = "default"
@@ -286,8 +289,25 @@ CELERY_TASK_TIME_LIMIT = 1800  # 30 分鐘硬限制
 CELERY_TASK_SOFT_TIME_LIMIT = 1500  # 25 分鐘軟限制
 # 轉檔等長任務走獨立 transcode queue，避免占滿 worker slot 卡住即時通知（見 docker-compose.yml worker-transcode）
 CELERY_TASK_ROUTES = {
+    # 每分鐘的熱門排行更新很輕量，走預設 queue，不排在長時間轉檔後面
+    "videos.tasks.apply_trending_scores": {"queue": "celery"},
     "videos.tasks.*": {"queue": "transcode"},
 }
+# 週期任務（docker-compose.yml 的 beat 服務負責觸發）
+CELERY_BEAT_SCHEDULE = {
+    "compute-related-videos": {
+        "task": "videos.tasks.compute_related_videos",
+        "schedule": 60 * 60,
+    },
+    "apply-trending-scores": {
+        "task": "videos.tasks.apply_trending_scores",
+        "schedule": 60,
+    },
+    "maintain-notification-partitions": {
+        "task": "interactions.tasks.maintain_notification_partitions",
+        "schedule": 60 * 60 * 24,
+    },
+}
 
 # OpenTelemetry (enabled when OTEL_EXPORTER_OTLP_ENDPOINT is set)
 from youtube_service.otel import configure_opentelemetry  # noqa: E402